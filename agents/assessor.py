@@ -0,0 +1,378 @@
+"""
+Текущая оценка кандидата (scorecard), которая копится по ходу интервью.
+
+После каждого хода submit_turn() отправляет его на оценку в фоновый пул:
+короткий запрос к LLM по одной паре вопрос/ответ, ответ которого не ждет
+ни кандидат, ни граф. Оценки ходов лежат в логе (log["assessments"]),
+из них детерминированно собирается log["scorecard"]: подтвержденные навыки,
+пробелы с правильными ответами, сигналы честности (алерты FactChecker),
+оценка грейда с уверенностью. При REPORT_MODE=scorecard итоговый отчет —
+форматирование scorecard (см. agents/reporter.py), без длинной генерации
+по всему логу. По умолчанию (REPORT_MODE=llm) оценка выключена.
+"""
+import asyncio
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote_plus
+
+from llm import LLMUnavailableError, get_llm
+from agents.resources import TOPIC_LINKS
+from agents.schemas import TurnAssessment
+
+
+ASSESS_PROMPT = """
+Ты — ассессор технического интервью. Оцени ОДИН ход: вопрос интервьюера и ответ кандидата.
+Заявленный грейд кандидата: {grade}. Стек: {stack}.
+
+Верни СТРОГО JSON:
+{{
+  "topic": "тема вопроса, 2-4 слова",
+  "verdict": "correct | partial | wrong | no_answer | off_topic",
+  "skill": "навык, который ответ подтверждает (или пустая строка)",
+  "gap": "чего кандидат не знает или где ошибся (или пустая строка)",
+  "correct_answer": "КРАТКИЙ правильный технический ответ для gap (или пустая строка)",
+  "grade_signal": "Junior | Middle | Senior — уровень, который демонстрирует ответ (или пустая строка)",
+  "clarity": 1-5,
+  "resource": "ключ из списка ниже, подходящий к gap (или пустая строка)"
+}}
+
+Ключи справочника ссылок: {resources}
+Если в мыслях есть ALERT от FactChecker — ответ содержит ложное утверждение, verdict не может быть correct.
+Никаких ``` и markdown.
+"""
+
+# Фоновая оценка нужна только отчету из scorecard: без него это лишние вызовы LLM
+ASSESSOR_ENABLED = os.getenv(
+    "ASSESSOR_ENABLED", "true" if os.getenv("REPORT_MODE", "llm").lower() == "scorecard" else "false"
+).lower() == "true"
+ASSESSOR_CONCURRENCY = int(os.getenv("ASSESSOR_CONCURRENCY", "2"))
+# Сколько ждать фоновые оценки при стоп-команде, прежде чем досчитать недостающие
+ASSESSOR_WAIT = float(os.getenv("ASSESSOR_WAIT", "10"))
+
+GRADES = ("Junior", "Middle", "Senior")
+VERDICT_WEIGHT = {"correct": 1.0, "partial": 0.6}
+MAX_ANSWER_CHARS = 1500
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Запись оценок в лог: фоновые потоки подменяют значения целиком
+_merge_lock = threading.Lock()
+# Незавершенные оценки по сессиям (thread_id -> turn_id -> future). Выполненные
+# записи вычищаются при каждой постановке: брошенные сессии не копятся
+_pending: Dict[str, Dict[str, Future]] = {}
+_pending_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=ASSESSOR_CONCURRENCY, thread_name_prefix="assessor")
+    return _pool
+
+
+def is_tracked(log: Dict[str, Any]) -> bool:
+    """Лог ведется с текущей оценкой (иначе отчет строится по полному логу)."""
+    return isinstance(log.get("assessments"), dict)
+
+
+def _thought_lines(turn: Dict[str, Any]) -> List[str]:
+    raw = turn.get("internal_thoughts") or []
+    if isinstance(raw, str):
+        return [line.strip() for line in raw.split("\n") if line.strip()]
+    return [f"[{t.get('from', 'System')}]: {t.get('content', '')}" for t in raw if isinstance(t, dict)]
+
+
+def _alerts(turn: Dict[str, Any]) -> List[str]:
+    return [line.split("]:", 1)[1].strip() for line in _thought_lines(turn) if line.startswith("[FactChecker")]
+
+
+def _assess_messages(turn: Dict[str, Any], candidate: Dict[str, Any]) -> List[Dict[str, str]]:
+    answer = str(turn.get("user_message", ""))[:MAX_ANSWER_CHARS]
+    alerts = _alerts(turn)
+    user = f"ВОПРОС: {turn.get('agent_visible_message', '')}\nОТВЕТ: {answer}"
+    if alerts:
+        user += "\nFACTCHECKER: " + " | ".join(alerts)
+    system = ASSESS_PROMPT.format(
+        grade=candidate.get("grade") or "не указан",
+        stack=", ".join(candidate.get("stack") or []) or "не указан",
+        resources=", ".join(TOPIC_LINKS),
+    )
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+def _parse_assessment(raw_json: Any) -> Dict[str, Any]:
+    try:
+        res = TurnAssessment(**raw_json).model_dump()
+    except Exception as e:
+        print(f"Ошибка валидации оценки хода: {e}")
+        return {"error": "invalid"}
+    res["verdict"] = res["verdict"].strip().lower()
+    grade = res["grade_signal"].strip().capitalize()
+    res["grade_signal"] = grade if grade in GRADES else ""
+    if res["resource"] not in TOPIC_LINKS:
+        res["resource"] = ""
+    return res
+
+
+def assess_turn(turn: Dict[str, Any], candidate: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        raw_json = get_llm().chat_json(_assess_messages(turn, candidate), agent="assessor")
+    except LLMUnavailableError as e:
+        print(f"Оценка хода без LLM: {e}")
+        return {"error": "unavailable"}
+    return _parse_assessment(raw_json)
+
+
+async def aassess_turn(turn: Dict[str, Any], candidate: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        raw_json = await get_llm().achat_json(_assess_messages(turn, candidate), agent="assessor")
+    except LLMUnavailableError as e:
+        print(f"Оценка хода без LLM: {e}")
+        return {"error": "unavailable"}
+    return _parse_assessment(raw_json)
+
+
+# --- Scorecard ---
+
+def _grade_index(grade: Optional[str]) -> Optional[int]:
+    grade = (grade or "").strip().capitalize()
+    return GRADES.index(grade) if grade in GRADES else None
+
+
+def build_scorecard(log: Dict[str, Any]) -> Dict[str, Any]:
+    """Сводка по оценкам ходов; не зависит от порядка, в котором они пришли."""
+    turns = log.get("turns", [])
+    assessments = log.get("assessments") or {}
+    candidate = log.get("candidate") or {}
+    skills: Dict[str, None] = {}
+    gaps: Dict[str, Dict[str, str]] = {}
+    verdicts: Dict[str, int] = {}
+    clarity: List[int] = []
+    votes = {g: 0.0 for g in GRADES}
+    alerts: List[str] = []
+    questions = 0
+
+    for turn in turns:
+        alerts.extend(_alerts(turn))
+        if "?" in str(turn.get("user_message", "")):
+            questions += 1
+        a = assessments.get(str(turn.get("turn_id")))
+        if not a or "error" in a:
+            continue
+        verdicts[a["verdict"]] = verdicts.get(a["verdict"], 0) + 1
+        clarity.append(a["clarity"])
+        if a["verdict"] in VERDICT_WEIGHT and a["skill"]:
+            skills.setdefault(a["skill"].strip(), None)
+        if a["verdict"] in ("wrong", "no_answer", "partial") and a["gap"]:
+            key = a["gap"].strip().lower()
+            gaps.setdefault(key, {"topic": a["gap"].strip(), "correct_answer": a["correct_answer"].strip(),
+                                  "resource": a["resource"] or a["topic"]})
+        if a["verdict"] in VERDICT_WEIGHT and a["grade_signal"]:
+            votes[a["grade_signal"]] += VERDICT_WEIGHT[a["verdict"]]
+        elif a["verdict"] in ("wrong", "no_answer"):
+            # Ошибка — голос на уровень ниже заявленного
+            claimed = _grade_index(candidate.get("grade"))
+            votes[GRADES[max(0, (claimed if claimed is not None else 1) - 1)]] += 0.5
+
+    assessed = sum(verdicts.values())
+    turn_ids = {str(t.get("turn_id")) for t in turns}
+    total_votes = sum(votes.values())
+    if total_votes:
+        estimate = max(GRADES, key=lambda g: (votes[g], -GRADES.index(g)))
+        agreement = votes[estimate] / total_votes
+        confidence = round(min(95, 30 + 10 * assessed) * agreement)
+    else:
+        estimate, confidence = candidate.get("grade") or "", 0
+    return {
+        "turns_total": len(turns),
+        "turns_assessed": len(turn_ids & set(assessments)),
+        "verdicts": verdicts,
+        "confirmed_skills": list(skills),
+        "gaps": list(gaps.values()),
+        "honesty": {"factcheck_alerts": len(alerts), "notes": alerts[:5]},
+        "clarity": round(sum(clarity) / len(clarity), 1) if clarity else None,
+        "candidate_questions": questions,
+        "grade": {"estimate": estimate, "confidence": confidence, "claimed": candidate.get("grade") or "",
+                  "votes": {g: round(v, 2) for g, v in votes.items()}},
+    }
+
+
+def _merge(log: Dict[str, Any], turn_id: Any, assessment: Dict[str, Any]) -> None:
+    with _merge_lock:
+        # Значения подменяются целиком: набор ключей лога не меняется, и его
+        # можно сериализовать из другого потока (хранилище сессий, журнал)
+        log["assessments"] = {**log["assessments"], str(turn_id): assessment}
+        log["scorecard"] = build_scorecard(log)
+
+
+def track(log: Dict[str, Any], profile: Optional[Dict[str, Any]] = None, thread_id: Optional[str] = None) -> None:
+    """Включает текущую оценку для лога (вызывается в основном потоке)."""
+    if not is_tracked(log):
+        log["assessments"] = {}
+        log["scorecard"] = {}
+    if thread_id:
+        log["thread_id"] = thread_id
+    elif not log.get("thread_id"):
+        log["thread_id"] = uuid.uuid4().hex
+    if profile and profile.get("name"):
+        log["candidate"] = {"grade": profile.get("grade") or "", "stack": list(profile.get("stack") or [])}
+
+
+def _prune_pending() -> None:
+    # Под _pending_lock: оценка выполненного future уже в логе
+    for thread_id in list(_pending):
+        running = {k: f for k, f in _pending[thread_id].items() if not f.done()}
+        if running:
+            _pending[thread_id] = running
+        else:
+            del _pending[thread_id]
+
+
+def submit_turn(
+    log: Dict[str, Any], profile: Optional[Dict[str, Any]] = None, thread_id: Optional[str] = None
+) -> Optional[Future]:
+    """Ставит последний ход лога на фоновую оценку; ход кандидата ее не ждет."""
+    if not ASSESSOR_ENABLED or not log.get("turns"):
+        return None
+    track(log, profile, thread_id)
+    turn = dict(log["turns"][-1])
+    candidate = dict(log.get("candidate") or {})
+    future = _get_pool().submit(lambda: _merge(log, turn["turn_id"], assess_turn(turn, candidate)))
+    with _pending_lock:
+        _prune_pending()
+        _pending.setdefault(log["thread_id"], {})[str(turn["turn_id"])] = future
+    return future
+
+
+def _take_pending(log: Dict[str, Any]) -> Dict[str, Future]:
+    with _pending_lock:
+        return _pending.pop(log.get("thread_id") or "", {})
+
+
+def _missing_turns(log: Dict[str, Any], running: Dict[str, Future]) -> List[Dict[str, Any]]:
+    # Ход, оценка которого еще идет в фоне, повторно не оценивается
+    done = log.get("assessments") or {}
+    return [
+        t for t in log.get("turns", [])
+        if str(t.get("turn_id")) not in done and str(t.get("turn_id")) not in running
+    ]
+
+
+def finalize(log: Dict[str, Any]) -> int:
+    """
+    Дожидается фоновых оценок сессии (не дольше ASSESSOR_WAIT) и досчитывает ходы,
+    которые не оценивались в этом процессе (сессию продолжили в другом процессе или
+    оценка упала). Ходы, чья оценка все еще идет, не дублируются.
+    Итог — в log["scorecard"], возвращается число досчитанных ходов.
+    """
+    futures = _take_pending(log)
+    if futures:
+        wait(list(futures.values()), timeout=ASSESSOR_WAIT)
+    running = {k: f for k, f in futures.items() if not f.done()}
+    missing = _missing_turns(log, running)
+    if missing:
+        candidate = dict(log.get("candidate") or {})
+        results = list(_get_pool().map(lambda t: (t["turn_id"], assess_turn(t, candidate)), missing))
+        for turn_id, assessment in results:
+            _merge(log, turn_id, assessment)
+    if not log.get("scorecard"):
+        log["scorecard"] = build_scorecard(log)
+    return len(missing)
+
+
+async def afinalize(log: Dict[str, Any]) -> int:
+    """Асинхронный вариант finalize."""
+    futures = _take_pending(log)
+    if futures:
+        await asyncio.wait([asyncio.wrap_future(f) for f in futures.values()], timeout=ASSESSOR_WAIT)
+    running = {k: f for k, f in futures.items() if not f.done()}
+    missing = _missing_turns(log, running)
+    if missing:
+        candidate = dict(log.get("candidate") or {})
+        sem = asyncio.Semaphore(ASSESSOR_CONCURRENCY)
+
+        async def one(turn: Dict[str, Any]) -> None:
+            async with sem:
+                assessment = await aassess_turn(turn, candidate)
+            _merge(log, turn["turn_id"], assessment)
+
+        await asyncio.gather(*(one(t) for t in missing))
+    if not log.get("scorecard"):
+        log["scorecard"] = build_scorecard(log)
+    return len(missing)
+
+
+# --- Отчет по scorecard ---
+
+def _recommendation(card: Dict[str, Any]) -> str:
+    grade = card["grade"]
+    estimate, claimed = _grade_index(grade["estimate"]), _grade_index(grade["claimed"])
+    verdicts = card["verdicts"]
+    assessed = sum(verdicts.values()) or 1
+    miss_rate = (verdicts.get("wrong", 0) + verdicts.get("no_answer", 0)) / assessed
+    if estimate is not None and claimed is not None and estimate > claimed:
+        return "Hire (Рассмотреть на грейд выше)"
+    if miss_rate >= 0.5 or (estimate is not None and claimed is not None and estimate < claimed and miss_rate >= 0.3):
+        return "No Hire"
+    rec = "Strong Hire" if miss_rate < 0.15 and verdicts.get("correct", 0) >= 3 else "Hire"
+    # Несколько ложных утверждений — на ступень ниже
+    if card["honesty"]["factcheck_alerts"] >= 2:
+        rec = {"Strong Hire": "Hire", "Hire": "No Hire"}.get(rec, rec)
+    return rec
+
+
+def _link(resource: str) -> str:
+    if resource in TOPIC_LINKS:
+        return f"[Документация]({TOPIC_LINKS[resource]})"
+    return f"[Поиск](https://www.google.com/search?q={quote_plus(resource)})"
+
+
+def format_report(card: Dict[str, Any]) -> str:
+    """Отчет в структуре REPORT_PROMPT (agents/reporter.py) без обращения к LLM."""
+    grade = card["grade"]
+    estimate = grade["estimate"] or "не определен"
+    if _grade_index(grade["estimate"]) is not None and _grade_index(grade["claimed"]) is not None \
+            and _grade_index(grade["estimate"]) > _grade_index(grade["claimed"]):
+        estimate = f"{estimate} (Overqualified)"
+    lines = [
+        "ВЕРДИКТ",
+        f"- Оцененный грейд: {estimate}",
+        f"- Рекомендация: {_recommendation(card)}",
+        f"- Уровень уверенности: {grade['confidence']}%",
+        "",
+        "ТЕХНИЧЕСКИЙ АНАЛИЗ (HARD SKILLS)",
+        "- Confirmed Skills:",
+    ]
+    lines += [f"  - {s}" for s in card["confirmed_skills"]] or ["  - не подтверждены"]
+    lines.append("- Knowledge Gaps:")
+    for gap in card["gaps"]:
+        answer = f" (Правильно: {gap['correct_answer']})" if gap["correct_answer"] else ""
+        lines.append(f"  - {gap['topic'].rstrip('.')}.{answer}")
+    if not card["gaps"]:
+        lines.append("  - существенных пробелов не выявлено")
+
+    honesty = card["honesty"]
+    lines += ["", "SOFT SKILLS & COMMUNICATION"]
+    if honesty["factcheck_alerts"]:
+        lines.append(f"- Честность: FactChecker зафиксировал сомнительные утверждения ({honesty['factcheck_alerts']}).")
+        lines += [f"  - {note}" for note in honesty["notes"]]
+    else:
+        lines.append("- Честность: попыток выдать ложные факты не обнаружено.")
+    if card["clarity"] is not None:
+        lines.append(f"- Ясность изложения: {card['clarity']} из 5.")
+    lines.append(
+        f"- Инициативность: кандидат задал вопросов: {card['candidate_questions']}."
+        if card["candidate_questions"] else "- Инициативность: вопросов о проекте не задавал."
+    )
+
+    lines += ["", "ROADMAP (ЧТО УЧИТЬ)"]
+    for gap in card["gaps"]:
+        lines.append(f"- {gap['topic'].rstrip('.')}. {_link(gap['resource'] or gap['topic'])}")
+    if not card["gaps"]:
+        lines.append("- Углублять текущий стек на задачах следующего грейда.")
+    return "\n".join(lines)
@@ -0,0 +1,304 @@
+"""
+Индекс уже проверенных утверждений для FactChecker.
+
+Утверждение сводится к списку терминов: технические слова и числа как есть,
+русские слова без окончаний, служебные слова отброшены, отрицание ("не", "not",
+приставки "не"/"без": "неизменяемые") приклеено к следующему термину.
+Вердикт берется из индекса без вызова LLM, только если набор терминов совпадает
+точно ("HashMap" и "ConcurrentHashMap", "CPU" и "IO", "изменяемые" и
+"неизменяемые" — разные утверждения), а порядок близок: сходство по словам
+и парам соседних слов ("list изменяемый, а tuple неизменяемый" с переставленными
+свойствами — другое утверждение). Кандидатов ищут MinHash и LSH-бакеты.
+Индекс ограничен по размеру (LRU) и хранится в SQLite.
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 64) - 1
+
+# Детерминированные коэффициенты перестановок: сигнатуры совместимы между рестартами
+_PERMS: List[Tuple[int, int]] = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _PRIME or 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _PRIME,
+    )
+    for i in range(NUM_PERM)
+]
+
+# Схема сигнатур; при ее смене сигнатуры в SQLite пересчитываются при открытии
+SIGNATURE_VERSION = 2
+_PUNCT_RE = re.compile(r"[^\w\s.]", re.UNICODE)
+_CYRILLIC_RE = re.compile(r"^[а-я]+$")
+# Отдельные слова-отрицания: относятся к следующему термину
+NEGATIONS = frozenset({"не", "нет", "ни", "без", "not", "never", "no", "without"})
+NEGATION_PREFIXES = ("не", "без")
+MIN_PREFIXED_WORD = 6
+STOP_WORDS = frozenset({
+    "в", "во", "на", "и", "а", "но", "с", "со", "к", "по", "из", "за", "о", "об", "от", "до", "для", "при",
+    "это", "что", "как", "же", "ли", "бы", "то", "там", "тут", "вот", "ну", "уже", "еще", "очень",
+    "the", "a", "an", "in", "on", "of", "to", "for", "and", "is", "are", "be", "it", "that",
+})
+# Окончания русских слов, от длинных к коротким: "строки"/"строка" -> "строк"
+_ENDINGS = sorted(
+    ("ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ая", "яя", "ое", "ее", "ые", "ие",
+     "ый", "ий", "ой", "ую", "юю", "ом", "ем", "ам", "ям", "ах", "ях", "ов", "ев", "ей", "ть", "ли",
+     "ла", "ло", "ет", "ут", "ют", "ит", "ат", "ят", "ы", "и", "а", "я", "о", "е", "у", "ю", "ь", "л"),
+    key=len, reverse=True,
+)
+MIN_STEM = 3
+NEG = "!"
+# Время последнего использования пишется в SQLite пачкой, а не на каждое попадание
+TOUCH_FLUSH_EVERY = 32
+
+
+def normalize_claim(text: str) -> str:
+    low = text.lower().replace("ё", "е")
+    low = _PUNCT_RE.sub(" ", low)
+    return " ".join(low.split()).strip(" .")
+
+
+def _stem(word: str) -> str:
+    if not _CYRILLIC_RE.match(word):
+        # Термины, числа и версии сравниваются как есть: "hashmap", "3.12"
+        return word
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def claim_terms(norm: str) -> List[str]:
+    """Термины утверждения по порядку; отрицание — префикс NEG у следующего термина."""
+    terms: List[str] = []
+    negated = False
+    for word in norm.split():
+        word = word.strip(".")
+        if not word:
+            continue
+        if word in NEGATIONS:
+            negated = not negated
+            continue
+        if word in STOP_WORDS:
+            continue
+        for prefix in NEGATION_PREFIXES:
+            if word.startswith(prefix) and len(word) >= MIN_PREFIXED_WORD and _CYRILLIC_RE.match(word):
+                word = word[len(prefix):]
+                negated = not negated
+                break
+        terms.append((NEG if negated else "") + _stem(word))
+        negated = False
+    if negated:
+        # Отрицание в конце фразы ("..., или нет") тоже меняет смысл
+        terms.append(NEG)
+    return terms
+
+
+def _shingles(norm: str) -> Set[str]:
+    # Термины и пары соседних терминов: перестановка целых фраз почти не мешает,
+    # а обмен свойствами между подлежащими ("list"/"tuple") меняет пары
+    terms = claim_terms(norm)
+    out = set(terms)
+    out.update(f"{a} {b}" for a, b in zip(terms, terms[1:]))
+    return out
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def minhash(norm: str) -> List[int]:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in _shingles(norm)
+    ]
+    return [min(((a * h + b) % _PRIME) & _MASK for h in hashes) for a, b in _PERMS]
+
+
+def _bands(sig: List[int]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(b, tuple(sig[b * ROWS:(b + 1) * ROWS])) for b in range(BANDS)]
+
+
+class ClaimIndex:
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.75, max_size: int = 10000) -> None:
+        self.threshold = threshold
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # norm -> (signature, result); порядок = LRU
+        self._items: "OrderedDict[str, Tuple[List[int], Dict[str, Any]]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        # Запись в SQLite — вне self._lock, чтобы поиск не ждал диска
+        self._db_lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        if path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims ("
+            " norm TEXT PRIMARY KEY, signature TEXT NOT NULL, result TEXT NOT NULL, used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        rows = self._conn.execute("SELECT norm, signature, result FROM claims ORDER BY used ASC").fetchall()
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version != SIGNATURE_VERSION:
+            # Сигнатуры прежней схемы в LSH несовместимы с новыми — пересчитываем
+            rows = [(norm, json.dumps(minhash(norm)), result) for norm, _, result in rows]
+            self._conn.executemany("UPDATE claims SET signature = ? WHERE norm = ?",
+                                   [(sig, norm) for norm, sig, _ in rows])
+            self._conn.execute(f"PRAGMA user_version = {SIGNATURE_VERSION}")
+            self._conn.commit()
+        for norm, sig, result in rows:
+            self._insert(norm, json.loads(sig), json.loads(result))
+
+    def _insert(self, norm: str, sig: List[int], result: Dict[str, Any]) -> None:
+        if norm in self._items:
+            self._items.move_to_end(norm)
+        self._items[norm] = (sig, result)
+        for band in _bands(sig):
+            self._buckets.setdefault(band, set()).add(norm)
+
+    def _remove(self, norm: str) -> None:
+        sig, _ = self._items.pop(norm)
+        for band in _bands(sig):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(norm)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _touch(self, norm: str) -> bool:
+        """Отмечает использование (под self._lock); True — пора сбросить отметки в SQLite."""
+        self._items.move_to_end(norm)
+        if self._conn is None:
+            return False
+        self._touched[norm] = time.time()
+        return len(self._touched) >= TOUCH_FLUSH_EVERY
+
+    def flush(self) -> None:
+        """Записывает накопленные отметки использования в SQLite."""
+        if self._conn is None:
+            return
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        with self._db_lock:
+            self._conn.executemany(
+                "UPDATE claims SET used = ? WHERE norm = ?", [(used, norm) for norm, used in touched.items()]
+            )
+            self._conn.commit()
+
+    def lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        """Вердикт для похожего утверждения или None."""
+        norm = normalize_claim(text)
+        if not norm:
+            return None
+        result, flush = self._lookup(norm)
+        if flush:
+            self.flush()
+        return result
+
+    def _lookup(self, norm: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        shingles = _shingles(norm)
+        terms = sorted(set(claim_terms(norm)))
+        sig = minhash(norm)
+
+        with self._lock:
+            if norm in self._items:
+                flush = self._touch(norm)
+                self._stats["hits"] += 1
+                return dict(self._items[norm][1]), flush
+
+            candidates: Set[str] = set()
+            for band in _bands(sig):
+                candidates |= self._buckets.get(band, set())
+
+            best, best_score = None, 0.0
+            for cand in candidates:
+                # Термины, числа и отрицания должны совпадать точно: "3.12" и "3.13",
+                # "HashMap" и "ConcurrentHashMap", "изменяемые" и "неизменяемые" — разные утверждения
+                if sorted(set(claim_terms(cand))) != terms:
+                    continue
+                # Точное сходство с учетом порядка слов (MinHash — только для поиска кандидатов)
+                score = _jaccard(shingles, _shingles(cand))
+                if score > best_score:
+                    best, best_score = cand, score
+
+            if best is None or best_score < self.threshold:
+                self._stats["misses"] += 1
+                return None, False
+            flush = self._touch(best)
+            self._stats["hits"] += 1
+            return dict(self._items[best][1]), flush
+
+    def add(self, text: str, result: Dict[str, Any]) -> None:
+        norm = normalize_claim(text)
+        if not norm:
+            return
+        sig = minhash(norm)
+        with self._lock:
+            self._insert(norm, sig, dict(result))
+            evicted = []
+            while len(self._items) > self.max_size:
+                oldest = next(iter(self._items))
+                self._remove(oldest)
+                evicted.append(oldest)
+            self._stats["evictions"] += len(evicted)
+            for n in evicted:
+                self._touched.pop(n, None)
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO claims (norm, signature, result, used) VALUES (?, ?, ?, ?)",
+                    (norm, json.dumps(sig), json.dumps(result, ensure_ascii=False), time.time()),
+                )
+                self._conn.executemany("DELETE FROM claims WHERE norm = ?", [(n,) for n in evicted])
+                self._conn.commit()
+            self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["size"] = len(self._items)
+        total = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / total if total else 0.0
+        return out
+
+
+_index: Optional[ClaimIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_claim_index() -> Optional[ClaimIndex]:
+    """Индекс из настроек окружения; None, если выключен (CLAIM_INDEX_ENABLED=false)."""
+    global _index
+    if os.getenv("CLAIM_INDEX_ENABLED", "true").lower() != "true":
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ClaimIndex(
+                    path=os.getenv("CLAIM_INDEX_PATH", "outputs/claim_index.sqlite3") or None,
+                    threshold=float(os.getenv("CLAIM_INDEX_THRESHOLD", "0.75")),
+                    max_size=int(os.getenv("CLAIM_INDEX_MAX_SIZE", "10000")),
+                )
+                # Недописанные отметки использования — при выходе процесса
+                atexit.register(_index.flush)
+    return _index
@@ -1,8 +1,9 @@
-from typing import Dict, Any
-from llm import get_llm
+from typing import Dict, Any, List, Optional
+from llm import get_llm, LLMUnavailableError
 from agents.schemas import FactCheckResponse
+from agents.prerouter import get_prerouter
+from agents.claim_index import get_claim_index
 
-llm = get_llm()
 
 
 def _is_stop(text: str) -> bool:
@@ -10,8 +11,8 @@ def _is_stop(text: str) -> bool:
     return t.startswith("стоп") or t.startswith("stop")
 
 
-def _should_factcheck_llm(user_message: str) -> Dict[str, Any]:
-    messages = [
+def _router_messages(user_message: str) -> List[Dict[str, str]]:
+    return [
         {
             "role": "system",
             "content": (
@@ -28,18 +29,44 @@ def _should_factcheck_llm(user_message: str) -> Dict[str, Any]:
         },
         {"role": "user", "content": user_message.strip()},
     ]
-    
-    res = llm.chat_json(messages)
-    if not isinstance(res, dict):
+
+
+def _parse_route(res: Any) -> Dict[str, Any]:
+    # chat_json при неразобранном ответе возвращает {"error": ...} — это не решение роутера
+    if isinstance(res, dict) and "error" in res:
+        return {"should_factcheck": False, "reason": "router_parse_error"}
+    if not isinstance(res, dict) or "should_factcheck" not in res:
         return {"should_factcheck": False, "reason": "invalid_router_response"}
-        
+
     should = bool(res.get("should_factcheck", False))
     reason = str(res.get("reason", "")).strip()
     return {"should_factcheck": should, "reason": reason}
 
 
-def _factcheck_llm(user_message: str) -> Dict[str, Any]:
-    messages = [
+# FactChecker не должен ронять ход интервью: при недоступной LLM проверка пропускается
+_UNAVAILABLE_ROUTE = {"should_factcheck": False, "reason": "llm_unavailable"}
+# Решения, которые не пишутся в обучающую выборку пре-роутера
+_UNRECORDED_REASONS = ("router_parse_error", "invalid_router_response", "llm_unavailable")
+
+
+def _should_factcheck_llm(user_message: str) -> Dict[str, Any]:
+    try:
+        return _parse_route(get_llm().chat_json(_router_messages(user_message), agent="factcheck_router"))
+    except LLMUnavailableError as e:
+        print(f"Router FactChecker без LLM: {e}")
+        return dict(_UNAVAILABLE_ROUTE)
+
+
+async def _ashould_factcheck_llm(user_message: str) -> Dict[str, Any]:
+    try:
+        return _parse_route(await get_llm().achat_json(_router_messages(user_message), agent="factcheck_router"))
+    except LLMUnavailableError as e:
+        print(f"Router FactChecker без LLM: {e}")
+        return dict(_UNAVAILABLE_ROUTE)
+
+
+def _factcheck_messages(user_message: str) -> List[Dict[str, str]]:
+    return [
         {
             "role": "system",
             "content": (
@@ -55,9 +82,9 @@ def _factcheck_llm(user_message: str) -> Dict[str, Any]:
         },
         {"role": "user", "content": user_message.strip()},
     ]
-    
-    raw_json = llm.chat_json(messages)
-    
+
+
+def _parse_factcheck(raw_json: Any) -> Dict[str, Any]:
     try:
         # Валидация pydantic
         res = FactCheckResponse(**raw_json)
@@ -76,15 +103,96 @@ def _factcheck_llm(user_message: str) -> Dict[str, Any]:
         return FactCheckResponse(alert=False, content="OK").model_dump()
 
 
+def _remember_verdict(user_message: str, raw_json: Any, result: Dict[str, Any]) -> None:
+    # Fallback после ошибки парсинга в индекс не попадает
+    index = get_claim_index()
+    if index is not None and isinstance(raw_json, dict) and "error" not in raw_json:
+        index.add(user_message, result)
+
+
+def _factcheck_llm(user_message: str) -> Dict[str, Any]:
+    try:
+        raw_json = get_llm().chat_json(_factcheck_messages(user_message), agent="factcheck")
+    except LLMUnavailableError as e:
+        print(f"FactChecker без LLM: {e}")
+        return FactCheckResponse(alert=False, content="OK").model_dump()
+    result = _parse_factcheck(raw_json)
+    _remember_verdict(user_message, raw_json, result)
+    return result
+
+
+async def _afactcheck_llm(user_message: str) -> Dict[str, Any]:
+    try:
+        raw_json = await get_llm().achat_json(_factcheck_messages(user_message), agent="factcheck")
+    except LLMUnavailableError as e:
+        print(f"FactChecker без LLM: {e}")
+        return FactCheckResponse(alert=False, content="OK").model_dump()
+    result = _parse_factcheck(raw_json)
+    _remember_verdict(user_message, raw_json, result)
+    return result
+
+
+def _known_verdict(text: str) -> Optional[Dict[str, Any]]:
+    """Вердикт по ранее проверенному похожему утверждению."""
+    index = get_claim_index()
+    return index.lookup(text) if index is not None else None
+
+
+def _is_trivial(text: str) -> bool:
+    return not text or _is_stop(text)
+
+
+def _route_locally(text: str) -> Optional[Dict[str, Any]]:
+    """Решение пре-роутера без LLM; None — случай неочевидный."""
+    prerouter = get_prerouter()
+    if prerouter is None:
+        return None
+    decision = prerouter.classify(text)
+    if decision is None:
+        return None
+    return {"should_factcheck": decision, "reason": "local_prerouter"}
+
+
+def _remember_route(text: str, route: Dict[str, Any]) -> None:
+    prerouter = get_prerouter()
+    if prerouter is not None and route.get("reason") not in _UNRECORDED_REASONS:
+        prerouter.record(text, route["should_factcheck"])
+
+
 def run_factcheck(user_message: str) -> Dict[str, Any]:
     text = (user_message or "").strip()
-    if not text:
+    if _is_trivial(text):
         return {"alert": False, "content": "OK"}
-    if _is_stop(text):
+
+    known = _known_verdict(text)
+    if known is not None:
+        return known
+
+    route = _route_locally(text)
+    if route is None:
+        route = _should_factcheck_llm(text)
+        _remember_route(text, route)
+    if not route.get("should_factcheck", False):
         return {"alert": False, "content": "OK"}
 
-    route = _should_factcheck_llm(text)
+    return _factcheck_llm(text)
+
+
+async def arun_factcheck(user_message: str) -> Dict[str, Any]:
+    """Асинхронный вариант run_factcheck."""
+    text = (user_message or "").strip()
+    if _is_trivial(text):
+        return {"alert": False, "content": "OK"}
+
+    known = _known_verdict(text)
+    if known is not None:
+        return known
+
+    route = _route_locally(text)
+    if route is None:
+        route = await _ashould_factcheck_llm(text)
+        _remember_route(text, route)
     if not route.get("should_factcheck", False):
         return {"alert": False, "content": "OK"}
 
-    return _factcheck_llm(text)
\ No newline at end of file
+    return await _afactcheck_llm(text)
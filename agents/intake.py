@@ -1,14 +1,48 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+import os
 import re
 
-from llm import get_llm
+from llm import get_llm, LLMUnavailableError
 from utils import normalize_stack, recompute_unknowns
 from agents.schemas import CandidateProfile
+from tech_matcher import LANGUAGES, display_name, get_matcher
 
-llm = get_llm()
+# Локальный профиль без LLM, если имя и все поля recompute_unknowns найдены уверенно
+INTAKE_FAST_PATH = os.getenv("INTAKE_FAST_PATH", "true").lower() == "true"
+INTAKE_MIN_CONFIDENCE = float(os.getenv("INTAKE_MIN_CONFIDENCE", "0.8"))
 
-def run_intake(raw_text: str) -> Dict[str, Any]:
-    messages = [
+GRADE_PATTERNS = [
+    ("Junior", re.compile(r"\b(?:junior|джун\w*|младш\w*)", re.IGNORECASE)),
+    ("Middle", re.compile(r"\b(?:middle|мидл\w*|миддл\w*)", re.IGNORECASE)),
+    ("Senior", re.compile(r"\b(?:senior|сеньор\w*|синьор\w*|сениор\w*|старш\w*)", re.IGNORECASE)),
+    ("Lead", re.compile(r"\b(?:team\s*lead|teamlead|lead|тимлид\w*|лид)\b", re.IGNORECASE)),
+]
+_YEARS_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*\+?\s*(?:год\w*|лет\b|years?\b|yrs?\b)", re.IGNORECASE)
+_HALF_YEARS_RE = re.compile(r"\bполтора\s+года\b", re.IGNORECASE)
+_ROLE_RE = re.compile(r"\b(?:developer|разработчик\w*|engineer|инженер\w*|программист\w*|dev)\b", re.IGNORECASE)
+_SPECIALIZATION_RE = re.compile(r"\b(backend|frontend|fullstack|full-stack|devops|qa|data)\b", re.IGNORECASE)
+# Имя — слово с заглавной буквы после явного представления (регистр имени важен)
+_NAME_RES = [
+    (0.9, re.compile(r"(?i:меня\s+зовут|my\s+name\s+is|имя\s*:?)\s+([A-ZА-ЯЁ][a-zа-яё]+)")),
+    # "Я — Анна": тире — явное представление
+    (0.8, re.compile(r"(?:^|[\s,.!])(?i:я)\s*[—–-]\s*([A-ZА-ЯЁ][a-zа-яё]+)(?=\s*(?:[,.!;]|$))")),
+    # "Я Анна" / "I am Alex" — ниже порога: "Я Москвич, ..." — не имя, решает LLM
+    (0.7, re.compile(r"(?:^|[\s,.!])(?i:я|i\s+am|i'm)\s*[—–-]?\s*([A-ZА-ЯЁ][a-zа-яё]+)")),
+    # "Иван, джун..." — первое слово может оказаться и не именем, поэтому ниже порога: решает LLM
+    (0.6, re.compile(r"^\s*([A-ZА-ЯЁ][a-zа-яё]+)\s*,")),
+]
+GREETINGS = {"привет", "здравствуйте", "добрый", "hello", "hi"}
+# Технологии после "хочу перейти в", "планирую изучить" — цель, а не текущий стек (до конца фразы)
+_ASPIRATION_RE = re.compile(
+    r"\b(?:хочу|хотел\w*|планиру\w*|собираюсь|мечтаю|перейти|изуча\w*|изучить|"
+    r"want\s+to|would\s+like|plan(?:ning)?\s+to|learning)\b[^,.;!?\n]*",
+    re.IGNORECASE,
+)
+MAX_YEARS = 50
+
+
+def _intake_messages(raw_text: str) -> List[Dict[str, str]]:
+    return [
         {
             "role": "system",
             "content": (
@@ -32,8 +66,8 @@ def run_intake(raw_text: str) -> Dict[str, Any]:
         {"role": "user", "content": raw_text},
     ]
 
-    json_data = llm.chat_json(messages)
 
+def _build_profile(json_data: Dict[str, Any], raw_text: str) -> Dict[str, Any]:
     try:
         profile = CandidateProfile(**json_data)
         data = profile.model_dump()
@@ -51,12 +85,11 @@ def run_intake(raw_text: str) -> Dict[str, Any]:
 
     # --- ЖЕСТКАЯ ПОДСТРАХОВКА (Решает вашу проблему) ---
     if not data.get("stack") or len(data["stack"]) == 0:
-        source_text = (str(data.get("target_role", "")) + " " + raw_text).lower()
-        # Список популярных языков для проверки
-        check_techs = ["java", "python", "javascript", "go", "rust", "c++", "c#", "php"]
-        for tech in check_techs:
-            if tech in source_text:
-                data["stack"] = [tech.capitalize() if tech != "java" else "Java"]
+        source_text = str(data.get("target_role") or "") + " " + raw_text
+        # Первый язык по словарю tech_matcher (по границам слова: "go" не найдется в "google")
+        for _, _, tech in current_matches(source_text):
+            if tech in LANGUAGES:
+                data["stack"] = [display_name(tech)]
                 break
 
     if not data.get("experience_text"):
@@ -66,4 +99,128 @@ def run_intake(raw_text: str) -> Dict[str, Any]:
     data["stack"] = normalize_stack(data.get("stack"), raw_text)
     data["unknowns"] = recompute_unknowns(data)
 
-    return data
\ No newline at end of file
+    return data
+
+
+def current_matches(text: str) -> List[Tuple[int, int, str]]:
+    """Совпадения tech_matcher без технологий, которые кандидат только хочет освоить."""
+    spans = [m.span() for m in _ASPIRATION_RE.finditer(text)]
+    return [m for m in get_matcher().find(text) if not any(s <= m[0] < e for s, e in spans)]
+
+
+def _grade(text: str) -> Tuple[Optional[str], float]:
+    found = {grade for grade, pattern in GRADE_PATTERNS if pattern.search(text)}
+    if len(found) != 1:
+        # Несколько грейдов ("был джуном, сейчас middle") — решает LLM
+        return None, 0.4 if found else 0.0
+    grade = found.pop()
+    # Lead не входит в шкалу Junior/Middle/Senior
+    return grade, 0.6 if grade == "Lead" else 0.9
+
+
+def _years(text: str) -> Tuple[Optional[int], float]:
+    values = set()
+    for m in _YEARS_RE.finditer(text):
+        value = float(m.group(1).replace(",", "."))
+        if value <= MAX_YEARS:
+            values.add(int(value))
+    if _HALF_YEARS_RE.search(text):
+        values.add(1)
+    if len(values) != 1:
+        # Стаж по разным технологиям ("3 года на Java, 2 на Go") суммирует LLM
+        return (max(values), 0.5) if values else (None, 0.0)
+    return values.pop(), 0.9
+
+
+def _name(text: str, skip: set) -> Tuple[Optional[str], float]:
+    for confidence, pattern in _NAME_RES:
+        m = pattern.search(text)
+        if m and m.group(1).lower() not in skip and not _ROLE_RE.fullmatch(m.group(1)):
+            return m.group(1), confidence
+    return None, 0.0
+
+
+def _role(text: str, matches: List[Tuple[int, int, str]]) -> Tuple[Optional[str], float]:
+    languages = [m for m in matches if m[2] in LANGUAGES]
+    role = _ROLE_RE.search(text)
+    if role:
+        # Язык прямо перед словом роли ("Java developer"), затем специализация, затем первый язык
+        before = [m for m in languages if m[1] <= role.start() and role.start() - m[1] <= 25]
+        if before:
+            return f"{display_name(before[-1][2])} Developer", 0.9
+        spec = _SPECIALIZATION_RE.search(text)
+        if spec:
+            return f"{spec.group(1).capitalize()} Developer", 0.8
+        if languages:
+            return f"{display_name(languages[0][2])} Developer", 0.8
+        return "Developer", 0.5
+    if languages:
+        return f"{display_name(languages[0][2])} Developer", 0.6
+    return None, 0.0
+
+
+def extract_profile(raw_text: str) -> Dict[str, Any]:
+    """
+    Профиль по тексту кандидата без LLM: технологии — автоматом tech_matcher
+    (кроме тех, что после "хочу перейти в" и т.п.), грейд, стаж, роль и имя — правилами. В "confidence" уверенность по полям (0..1).
+    """
+    matches = current_matches(raw_text)
+    stack = list(dict.fromkeys(m[2] for m in matches))
+    grade, grade_conf = _grade(raw_text)
+    years, years_conf = _years(raw_text)
+    role, role_conf = _role(raw_text, matches)
+    skip = {g.lower() for g, _ in GRADE_PATTERNS} | GREETINGS | {m[2] for m in get_matcher().find(raw_text)}
+    name, name_conf = _name(raw_text, skip)
+    return {
+        "name": name,
+        "target_role": role,
+        "grade": grade,
+        "years_experience": years,
+        "stack": stack,
+        "experience_text": raw_text,
+        "confidence": {
+            "name": name_conf,
+            "target_role": role_conf,
+            "grade": grade_conf,
+            "years_experience": years_conf,
+            "stack": 0.9 if stack else 0.0,
+        },
+    }
+
+
+def _local_profile(raw_text: str) -> Tuple[Dict[str, Any], bool]:
+    """Локальный профиль и признак, что LLM для него не нужна."""
+    local = extract_profile(raw_text)
+    confidence = local.pop("confidence")
+    # Без уверенного имени интервьюер обратится к "Кандидату" — имя тоже достает LLM
+    required = ("name", "years_experience", "stack", "target_role", "grade")
+    confident = all(confidence[f] >= INTAKE_MIN_CONFIDENCE for f in required)
+    return local, INTAKE_FAST_PATH and confident
+
+
+def run_intake(raw_text: str) -> Dict[str, Any]:
+    local, confident = _local_profile(raw_text)
+    if confident:
+        print("Intake: профиль собран локально, без LLM")
+        return _build_profile(local, raw_text)
+    try:
+        json_data = get_llm().chat_json(_intake_messages(raw_text), agent="intake")
+    except LLMUnavailableError as e:
+        # Профиль соберут локальные эвристики ниже
+        print(f"Intake без LLM: {e}")
+        json_data = local
+    return _build_profile(json_data, raw_text)
+
+
+async def arun_intake(raw_text: str) -> Dict[str, Any]:
+    """Асинхронный вариант run_intake."""
+    local, confident = _local_profile(raw_text)
+    if confident:
+        print("Intake: профиль собран локально, без LLM")
+        return _build_profile(local, raw_text)
+    try:
+        json_data = await get_llm().achat_json(_intake_messages(raw_text), agent="intake")
+    except LLMUnavailableError as e:
+        print(f"Intake без LLM: {e}")
+        json_data = local
+    return _build_profile(json_data, raw_text)
@@ -1,8 +1,9 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional
 from llm import get_llm
 from agents.schemas import InterviewerResponse
+from agents.memory import render_context
+from agents.question_bank import opening_turn, suggest
 
-llm = get_llm()
 
 SYSTEM_PROMPT = """
 Ты — профессиональный Технический Интервьюер. 
@@ -42,11 +43,12 @@ SYSTEM_PROMPT = """
 """
 
 
-def run_interviewer_turn(
-    user_text: str, 
-    history_context: List[Dict[str, str]], 
-    profile: Dict[str, Any]
-) -> Dict[str, str]:
+def _build_messages(
+    user_text: str,
+    history_context: List[Dict[str, str]],
+    profile: Dict[str, Any],
+    memory: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, str]]:
     
     # Подготовка переменных для промпта
     name = profile.get("name") or "Кандидат"
@@ -54,13 +56,15 @@ def run_interviewer_turn(
     grade = profile.get("grade") or "Не указан"
     stack = ", ".join(profile.get("stack") or ["Python"])
 
-    # Формируем читаемую историю для LLM
-    history_str = ""
-    for msg in history_context[-10:]:
-        role_label = "Кандидат" if msg["role"] == "user" else "Интервьюер"
-        history_str += f"{role_label}: {msg['content']}\n"
+    # Читаемая история для LLM: сводка старых реплик + свежие дословно, в пределах бюджета токенов
+    history_str = render_context(history_context, memory or {}, agent="interviewer")
+    # Проверенные вопросы банка как подсказка (QUESTION_BANK_SEED_TURNS)
+    seeds = suggest(profile, history_context)
+    seeds_str = "".join(f"- {q}\n" for q in seeds)
+    if seeds_str:
+        seeds_str = f"ПРОВЕРЕННЫЕ ВОПРОСЫ ИЗ БАНКА (можно взять следующий вопрос отсюда):\n{seeds_str}\n"
 
-    messages = [
+    return [
         {
             "role": "system", 
             "content": SYSTEM_PROMPT.format(name=name, role=role, grade=grade, stack=stack)
@@ -70,14 +74,14 @@ def run_interviewer_turn(
             "content": (
                 f"ИСТОРИЯ ДИАЛОГА:\n{history_str}\n"
                 f"ПОСЛЕДНИЙ ОТВЕТ КАНДИДАТА:\n{user_text}\n\n"
+                f"{seeds_str}"
                 "Твой ход (JSON):"
             )
         }
     ]
 
-    # Вызываем LLM с ожиданием JSON
-    raw_json = llm.chat_json(messages)
-    
+
+def _parse_response(raw_json: Dict[str, Any]) -> Dict[str, str]:
     try:
         # Валидация pydantic
         response = InterviewerResponse(**raw_json)
@@ -89,4 +93,60 @@ def run_interviewer_turn(
         return InterviewerResponse(
             thought=str(raw_json.get("thought", "Ошибка генерации мысли.")),
             message=str(raw_json.get("message", "Давай продолжим. Расскажи подробнее о твоем опыте."))
-        ).model_dump()
\ No newline at end of file
+        ).model_dump()
+
+
+def _opening_from_bank(
+    history_context: List[Dict[str, str]],
+    profile: Dict[str, Any],
+    on_message_delta: Optional[Callable[[str], None]],
+) -> Optional[Dict[str, str]]:
+    """Первый ход (в истории нет реплик интервьюера) берется из банка вопросов без LLM."""
+    if any(m.get("role") == "assistant" for m in history_context):
+        return None
+    resp = opening_turn(profile)
+    if resp is not None and on_message_delta is not None:
+        on_message_delta(resp["message"])
+    return resp
+
+
+def run_interviewer_turn(
+    user_text: str, 
+    history_context: List[Dict[str, str]], 
+    profile: Dict[str, Any],
+    on_message_delta: Optional[Callable[[str], None]] = None,
+    memory: Optional[Dict[str, Any]] = None
+) -> Dict[str, str]:
+    """
+    on_message_delta — колбэк для потоковой выдачи текста поля "message".
+    memory — состояние памяти диалога (сводка старых реплик), см. agents/memory.py.
+    """
+    opening = _opening_from_bank(history_context, profile, on_message_delta)
+    if opening is not None:
+        return opening
+    messages = _build_messages(user_text, history_context, profile, memory)
+    # Вызываем LLM с ожиданием JSON
+    if on_message_delta is None:
+        raw_json = get_llm().chat_json(messages, agent="interviewer")
+    else:
+        raw_json = get_llm().stream_json(messages, "message", on_message_delta, agent="interviewer")
+    return _parse_response(raw_json)
+
+
+async def arun_interviewer_turn(
+    user_text: str,
+    history_context: List[Dict[str, str]],
+    profile: Dict[str, Any],
+    on_message_delta: Optional[Callable[[str], None]] = None,
+    memory: Optional[Dict[str, Any]] = None
+) -> Dict[str, str]:
+    """Асинхронный вариант run_interviewer_turn."""
+    opening = _opening_from_bank(history_context, profile, on_message_delta)
+    if opening is not None:
+        return opening
+    messages = _build_messages(user_text, history_context, profile, memory)
+    if on_message_delta is None:
+        raw_json = await get_llm().achat_json(messages, agent="interviewer")
+    else:
+        raw_json = await get_llm().astream_json(messages, "message", on_message_delta, agent="interviewer")
+    return _parse_response(raw_json)
@@ -0,0 +1,124 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+from llm import get_llm, LLMUnavailableError
+from utils import estimate_tokens
+
+
+# Бюджет токенов на историю диалога в промпте агента (переопределяется MEMORY_BUDGET_<AGENT>)
+DEFAULT_BUDGETS = {"interviewer": 1500}
+# Сколько последних сообщений всегда идут дословно
+KEEP_RECENT = int(os.getenv("MEMORY_KEEP_RECENT", "6"))
+# Сводка обновляется раз в N ходов (ход = пара сообщений), а не на каждом ходу
+SUMMARY_EVERY = int(os.getenv("MEMORY_SUMMARY_EVERY", "4"))
+SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+
+SUMMARY_PROMPT = (
+    "Ты ведешь краткую сводку технического интервью для интервьюера. "
+    "Обнови сводку, добавив в нее новые реплики. Сохрани: какие темы уже спрашивали, "
+    "что кандидат ответил верно, где ошибся или не знал, алерты FactChecker. "
+    "Пиши сжато, списком, не более {max_words} слов. Верни только текст сводки."
+)
+
+Memory = Dict[str, Any]
+
+
+def get_budget(agent: str) -> int:
+    env = os.getenv(f"MEMORY_BUDGET_{agent.upper()}")
+    return int(env) if env else DEFAULT_BUDGETS.get(agent, 1500)
+
+
+def empty_memory() -> Memory:
+    return {"summary": "", "summarized": 0}
+
+
+def render_messages(messages: List[Dict[str, str]]) -> str:
+    lines = []
+    for msg in messages:
+        role_label = "Кандидат" if msg["role"] == "user" else "Интервьюер"
+        lines.append(f"{role_label}: {msg['content']}")
+    return "\n".join(lines)
+
+
+def select_context(
+    history: List[Dict[str, str]], memory: Memory, budget: int
+) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Сводка старых реплик + дословный хвост истории в пределах бюджета.
+    Если хвост не влезает, выбрасываются самые старые несведенные реплики.
+    """
+    summary = (memory or {}).get("summary", "")
+    start = min((memory or {}).get("summarized", 0), len(history))
+    left = budget - estimate_tokens(summary)
+
+    recent: List[Dict[str, str]] = []
+    for msg in reversed(history[start:]):
+        cost = estimate_tokens(msg["content"]) + 4
+        if cost > left:
+            if not recent:
+                # Последнюю реплику не выбрасываем, а обрезаем до бюджета
+                keep_chars = max(left, 0) * 3
+                recent.append({"role": msg["role"], "content": msg["content"][-keep_chars:] if keep_chars else ""})
+            break
+        recent.append(msg)
+        left -= cost
+    recent.reverse()
+    return summary, recent
+
+
+def render_context(history: List[Dict[str, str]], memory: Memory, agent: str = "interviewer") -> str:
+    summary, recent = select_context(history, memory, get_budget(agent))
+    parts = []
+    if summary:
+        parts.append(f"СВОДКА ПРЕДЫДУЩЕЙ ЧАСТИ ИНТЕРВЬЮ:\n{summary}\n")
+    parts.append(render_messages(recent))
+    return "\n".join(parts) + "\n"
+
+
+def needs_summary(history: List[Dict[str, str]], memory: Memory) -> bool:
+    """Пора ли сворачивать старые реплики: накопилось SUMMARY_EVERY ходов сверх дословного окна."""
+    unsummarized = len(history) - (memory or {}).get("summarized", 0)
+    return unsummarized >= KEEP_RECENT + 2 * SUMMARY_EVERY
+
+
+def _summary_messages(history: List[Dict[str, str]], memory: Memory) -> Tuple[List[Dict[str, str]], int]:
+    start = (memory or {}).get("summarized", 0)
+    upto = len(history) - KEEP_RECENT
+    previous = (memory or {}).get("summary", "") or "(пусто)"
+    messages = [
+        {"role": "system", "content": SUMMARY_PROMPT.format(max_words=SUMMARY_MAX_TOKENS // 2)},
+        {"role": "user", "content": (
+            f"ТЕКУЩАЯ СВОДКА:\n{previous}\n\n"
+            f"НОВЫЕ РЕПЛИКИ:\n{render_messages(history[start:upto])}"
+        )},
+    ]
+    return messages, upto
+
+
+def update_memory(history: List[Dict[str, str]], memory: Memory) -> Memory:
+    """Инкрементально дописывает сводку, если подошла ее очередь; иначе возвращает memory как есть."""
+    memory = memory or empty_memory()
+    if not needs_summary(history, memory):
+        return memory
+    messages, upto = _summary_messages(history, memory)
+    try:
+        summary = get_llm().chat(messages, agent="memory").strip()
+    except LLMUnavailableError as e:
+        # Не страшно: реплики останутся дословными до следующей попытки
+        print(f"Сводка истории не обновлена: {e}")
+        return memory
+    return {"summary": summary, "summarized": upto}
+
+
+async def aupdate_memory(history: List[Dict[str, str]], memory: Memory) -> Memory:
+    """Асинхронный вариант update_memory."""
+    memory = memory or empty_memory()
+    if not needs_summary(history, memory):
+        return memory
+    messages, upto = _summary_messages(history, memory)
+    try:
+        summary = (await get_llm().achat(messages, agent="memory")).strip()
+    except LLMUnavailableError as e:
+        print(f"Сводка истории не обновлена: {e}")
+        return memory
+    return {"summary": summary, "summarized": upto}
@@ -0,0 +1,225 @@
+"""
+Локальный пре-роутер FactChecker.
+
+Решает за микросекунды, нужна ли проверка фактов, и отдает в LLM-роутер
+только неуверенные случаи. Состоит из правил (очевидные "нет" и "да")
+и наивного байесовского классификатора, который дообучается на решениях
+LLM-роутера и переживает рестарт через JSONL-файл. Файл пишется в фоновом
+потоке (ход не ждет диска) и хранит только последние max_records решений.
+"""
+import json
+import math
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+# Однозначно тривиальные ответы (см. правила промпта роутера)
+TRIVIAL_ANSWERS = {
+    "да", "нет", "ок", "окей", "ok", "okay", "yes", "no", "ага", "угу", "неа",
+    "не знаю", "незнаю", "не помню", "хз", "понятно", "ясно", "хорошо", "спасибо",
+    "давай", "дальше", "следующий", "следующий вопрос", "пропустим", "пропусти",
+}
+NEGATIVE_PREFIXES = ("не знаю", "не помню", "затрудняюсь", "не уверен", "не сталкивался", "без понятия")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_VERSION_RE = re.compile(r"\b\d+\.\d+(?:\.\d+)?\b|\b(?:python|java|django|postgres\w*|jdk|php|node|react|spring)\s*\d+\b")
+_CLAIM_RE = re.compile(
+    r"\b(?:релиз\w*|выш(?:ел|ла|ло|ли)|стандарт\w*|pep\s*\d+|rfc\s*\d+|документаци\w*|"
+    r"deprecated|устарел\w*|убрал\w*|удалил\w*|добавил\w*|начиная\s+с|в\s+верси\w+)\b"
+)
+
+MIN_WORDS_FOR_CLAIM = 4
+# Файл переписывается с последними max_records строками, когда он вырос на эту долю
+COMPACT_SLACK = 0.25
+
+
+def _tokens(text: str) -> List[str]:
+    tokens = _WORD_RE.findall(text)
+    if any(ch.isdigit() for ch in text):
+        tokens.append("__digit__")
+    if _VERSION_RE.search(text):
+        tokens.append("__version__")
+    return tokens
+
+
+def rule_decision(text: str) -> Optional[bool]:
+    """Правила: True/False для очевидных случаев, None если правила не уверены."""
+    low = text.strip().lower()
+    clean = low.strip(" .,!?;:-—()\"'")
+    if not clean or clean in TRIVIAL_ANSWERS or clean.startswith(NEGATIVE_PREFIXES):
+        return False
+    if not _WORD_RE.search(clean):
+        # Только эмодзи/пунктуация
+        return False
+    if _VERSION_RE.search(low) or _CLAIM_RE.search(low):
+        return True
+    if len(clean.split()) < MIN_WORDS_FOR_CLAIM and not any(ch.isdigit() for ch in clean):
+        return False
+    return None
+
+
+class NaiveBayesRouter:
+    """Мультиномиальный наивный Байес с онлайн-обновлением по решениям роутера."""
+
+    def __init__(self) -> None:
+        self.doc_counts = [0, 0]
+        self.token_totals = [0, 0]
+        self.token_counts: List[Dict[str, int]] = [{}, {}]
+        self.vocab: set = set()
+
+    @property
+    def samples(self) -> int:
+        return self.doc_counts[0] + self.doc_counts[1]
+
+    def update(self, text: str, label: bool) -> None:
+        cls = int(label)
+        self.doc_counts[cls] += 1
+        counts = self.token_counts[cls]
+        for tok in _tokens(text.lower()):
+            counts[tok] = counts.get(tok, 0) + 1
+            self.token_totals[cls] += 1
+            self.vocab.add(tok)
+
+    def predict_proba(self, text: str) -> float:
+        """Вероятность того, что сообщение нужно проверять."""
+        vocab = len(self.vocab) or 1
+        log_p = []
+        for cls in (0, 1):
+            lp = math.log((self.doc_counts[cls] + 1) / (self.samples + 2))
+            denom = self.token_totals[cls] + vocab
+            counts = self.token_counts[cls]
+            for tok in _tokens(text.lower()):
+                lp += math.log((counts.get(tok, 0) + 1) / denom)
+            log_p.append(lp)
+        diff = max(min(log_p[0] - log_p[1], 50.0), -50.0)
+        return 1.0 / (1.0 + math.exp(diff))
+
+
+class PreRouter:
+    def __init__(
+        self,
+        pos_threshold: float = 0.9,
+        neg_threshold: float = 0.1,
+        data_path: Optional[str] = None,
+        min_samples: int = 20,
+        max_records: int = 5000,
+    ) -> None:
+        self.pos_threshold = pos_threshold
+        self.neg_threshold = neg_threshold
+        self.data_path = data_path
+        self.min_samples = min_samples
+        self.max_records = max_records
+        self.model = NaiveBayesRouter()
+        self._lock = threading.Lock()
+        self._records = 0
+        # Один поток: строки дописываются в файл по порядку
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prerouter")
+        self._stats = {"rule_positive": 0, "rule_negative": 0, "model_positive": 0,
+                       "model_negative": 0, "llm_fallback": 0}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.data_path or not os.path.exists(self.data_path):
+            return
+        with open(self.data_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        self._records = len(lines)
+        # После сжатия файла модель учится только на последних решениях
+        for line in lines[-self.max_records:] if self.max_records > 0 else lines:
+            try:
+                rec = json.loads(line)
+                self.model.update(str(rec["text"]), bool(rec["should_factcheck"]))
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def classify(self, text: str) -> Optional[bool]:
+        """True/False — решение принято локально, None — нужен LLM-роутер."""
+        decision = rule_decision(text)
+        if decision is not None:
+            self._count("rule_positive" if decision else "rule_negative")
+            return decision
+
+        if self.model.samples >= self.min_samples:
+            p = self.model.predict_proba(text)
+            if p >= self.pos_threshold:
+                self._count("model_positive")
+                return True
+            if p <= self.neg_threshold:
+                self._count("model_negative")
+                return False
+
+        self._count("llm_fallback")
+        return None
+
+    def record(self, text: str, should_factcheck: bool) -> Optional[Future]:
+        """Запоминает решение LLM-роутера для дообучения модели; запись в файл — в фоне."""
+        with self._lock:
+            self.model.update(text, should_factcheck)
+        if not self.data_path:
+            return None
+        line = json.dumps({"text": text, "should_factcheck": should_factcheck}, ensure_ascii=False) + "\n"
+        future = self._writer.submit(self._append, line)
+        future.add_done_callback(_log_write_error)
+        return future
+
+    def _append(self, line: str) -> None:
+        os.makedirs(os.path.dirname(self.data_path) or ".", exist_ok=True)
+        with open(self.data_path, "a", encoding="utf-8") as f:
+            f.write(line)
+        self._records += 1
+        if self.max_records > 0 and self._records > self.max_records * (1 + COMPACT_SLACK):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Оставляет в файле последние max_records решений (вызывается только из потока записи)."""
+        with open(self.data_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()[-self.max_records:]
+        tmp = self.data_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp, self.data_path)
+        self._records = len(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        local = out["rule_positive"] + out["rule_negative"] + out["model_positive"] + out["model_negative"]
+        total = local + out["llm_fallback"]
+        out["router_calls_avoided"] = local
+        out["avoided_ratio"] = local / total if total else 0.0
+        out["model_samples"] = self.model.samples
+        return out
+
+
+def _log_write_error(future: Future) -> None:
+    error = future.exception()
+    if error is not None:
+        print(f"Пре-роутер: не удалось записать решение: {error}")
+
+
+_prerouter: Optional[PreRouter] = None
+_prerouter_lock = threading.Lock()
+
+
+def get_prerouter() -> Optional[PreRouter]:
+    """Пре-роутер из настроек окружения; None, если он выключен (PREROUTER_ENABLED=false)."""
+    global _prerouter
+    if os.getenv("PREROUTER_ENABLED", "true").lower() != "true":
+        return None
+    if _prerouter is None:
+        with _prerouter_lock:
+            if _prerouter is None:
+                _prerouter = PreRouter(
+                    pos_threshold=float(os.getenv("PREROUTER_POS_THRESHOLD", "0.9")),
+                    neg_threshold=float(os.getenv("PREROUTER_NEG_THRESHOLD", "0.1")),
+                    data_path=os.getenv("PREROUTER_DATA_PATH", "outputs/router_decisions.jsonl"),
+                    min_samples=int(os.getenv("PREROUTER_MIN_SAMPLES", "20")),
+                    max_records=int(os.getenv("PREROUTER_MAX_RECORDS", "5000")),
+                )
+    return _prerouter
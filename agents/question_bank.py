@@ -0,0 +1,372 @@
+"""
+Банк проверенных вопросов по ключу (технология, грейд).
+
+Вопросы генерируются заранее пакетно (python -m agents.question_bank fill),
+проходят локальную проверку и хранятся в SQLite (QUESTION_BANK_PATH).
+Первый ход интервьюера после Intake — приветствие, формат и первый вопрос —
+собирается из банка без вызова LLM; на следующих ходах вопросы банка
+можно подсказывать интервьюеру (QUESTION_BANK_SEED_TURNS).
+
+Вопрос устаревает, если изменился промпт генерации (отпечаток в строке)
+или он старше QUESTION_BANK_MAX_AGE_DAYS.
+
+    python -m agents.question_bank fill --stack python,java --per-key 12
+    python -m agents.question_bank stats
+    python -m agents.question_bank stale
+    python -m agents.question_bank fill --stale-only
+    python -m agents.question_bank prune
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from llm import LLMUnavailableError, get_llm
+from tech_matcher import LANGUAGES, canonical_tech, display_name, find_techs
+
+QUESTION_PROMPT = """
+Ты — генератор банка вопросов для технического скрининга.
+Технология: {tech}. Грейд кандидата: {grade}.
+
+Составь {count} разных вопросов, каждый — ОДИН конкретный вопрос по {tech}
+сложности уровня {grade}, на который можно ответить устно за 1-3 минуты.
+Не упоминай другие языки программирования. Без вступлений и нумерации.
+
+Верни СТРОГО JSON:
+{{
+  "questions": [{{"topic": "тема, 2-4 слова", "question": "текст вопроса?"}}]
+}}
+"""
+
+OPENING_TEMPLATE = (
+    "Здравствуйте, {name}! Я ваш AI-интервьюер. Сегодня мы проведем технический скрининг "
+    "на позицию {role}. У нас запланировано около 10-15 вопросов по вашему основному стеку: "
+    "{stack}.\n\nПервый вопрос: {question}"
+)
+
+QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "true").lower() == "true"
+QUESTION_BANK_SEED_TURNS = os.getenv("QUESTION_BANK_SEED_TURNS", "false").lower() == "true"
+QUESTION_BANK_MAX_AGE_DAYS = float(os.getenv("QUESTION_BANK_MAX_AGE_DAYS", "90"))
+DEFAULT_QUESTION_BANK_PATH = os.path.join("outputs", "question_bank.sqlite3")
+
+GRADES = ("Junior", "Middle", "Senior")
+MIN_QUESTION_CHARS = 10
+MAX_QUESTION_CHARS = 400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tech TEXT NOT NULL,
+    grade TEXT NOT NULL,
+    topic TEXT,
+    question TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    served INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    UNIQUE (tech, grade, norm)
+);
+CREATE INDEX IF NOT EXISTS idx_questions_key ON questions(tech, grade);
+"""
+
+
+def bank_fingerprint() -> str:
+    """Отпечаток промпта генерации: при его изменении вопросы банка устаревают."""
+    return hashlib.sha256(QUESTION_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_grade(grade: Optional[str]) -> str:
+    low = str(grade or "").lower()
+    for g in GRADES:
+        if g.lower() in low:
+            return g
+    # Lead и неизвестный грейд: Lead ближе к Senior, остальное — к Middle
+    return "Senior" if "lead" in low else "Middle"
+
+
+def _normalize_question(text: str) -> str:
+    return re.sub(r"\W+", " ", text.lower()).strip()
+
+
+def vet_question(tech: str, question: str) -> Optional[str]:
+    """Причина отказа или None, если вопрос годится в банк."""
+    text = question.strip()
+    if not MIN_QUESTION_CHARS <= len(text) <= MAX_QUESTION_CHARS:
+        return "длина"
+    if not text.endswith("?"):
+        return "не вопрос"
+    # Правило интервьюера: никаких языков вне стека кандидата
+    foreign = [t for t in find_techs(text) if t in LANGUAGES and t != tech]
+    if foreign:
+        return f"чужой язык: {', '.join(foreign)}"
+    return None
+
+
+def primary_tech(profile: Dict[str, Any]) -> Optional[str]:
+    """Основная технология: из роли ("Java Developer"), иначе первый язык стека."""
+    stack = [canonical_tech(s) for s in profile.get("stack") or []]
+    for tech in find_techs(str(profile.get("target_role") or "")):
+        if tech in stack or not stack:
+            return tech
+    for tech in stack:
+        if tech in LANGUAGES:
+            return tech
+    return stack[0] if stack else None
+
+
+class QuestionBank:
+    def __init__(self, path: str = DEFAULT_QUESTION_BANK_PATH, max_age_days: float = QUESTION_BANK_MAX_AGE_DAYS) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _fresh_clause(self) -> Tuple[str, Tuple[Any, ...]]:
+        min_created = time.time() - self.max_age_days * 86400 if self.max_age_days > 0 else 0
+        return "fingerprint = ? AND created_at >= ?", (bank_fingerprint(), min_created)
+
+    def add(self, tech: str, grade: str, items: Iterable[Dict[str, str]]) -> Dict[str, int]:
+        """Проверяет и записывает вопросы; повторы по ключу пропускаются."""
+        added = rejected = 0
+        fingerprint, now = bank_fingerprint(), time.time()
+        with self._lock:
+            for item in items:
+                question = str(item.get("question") or "").strip()
+                if vet_question(tech, question):
+                    rejected += 1
+                    continue
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO questions (tech, grade, topic, question, norm, fingerprint, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (tech, grade, str(item.get("topic") or "").strip(), question,
+                     _normalize_question(question), fingerprint, now),
+                )
+                added += cur.rowcount
+        return {"added": added, "rejected": rejected}
+
+    def pick(self, tech: str, grade: str, exclude: Iterable[str] = (), limit: int = 1,
+             mark: bool = True) -> List[Dict[str, Any]]:
+        """
+        Свежие вопросы ключа, реже всего выдававшиеся, кроме уже заданных (exclude — тексты реплик).
+        mark=False — только подобрать: served увеличит mark_asked, когда вопрос действительно задан.
+        """
+        asked = [_normalize_question(text) for text in exclude]
+        clause, params = self._fresh_clause()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, topic, question, norm FROM questions WHERE tech = ? AND grade = ? AND {clause}"
+                " ORDER BY served, RANDOM()",
+                (tech, grade, *params),
+            ).fetchall()
+            picked = [dict(r) for r in rows if not any(r["norm"] in a for a in asked)][:limit]
+        if mark:
+            self.mark_served(r["id"] for r in picked)
+        return picked
+
+    def mark_served(self, ids: Iterable[int]) -> None:
+        with self._lock:
+            self._conn.executemany("UPDATE questions SET served = served + 1 WHERE id = ?",
+                                   [(i,) for i in ids])
+
+    def mark_asked(self, techs: Iterable[str], grade: str, message: str) -> int:
+        """Увеличивает served вопросам ключей, текст которых вошел в реплику интервьюера."""
+        techs = list(techs)
+        if not techs:
+            return 0
+        said = _normalize_question(message)
+        clause, params = self._fresh_clause()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, norm FROM questions WHERE tech IN ({','.join('?' * len(techs))}) AND grade = ?"
+                f" AND {clause}",
+                (*techs, grade, *params),
+            ).fetchall()
+        ids = [r["id"] for r in rows if r["norm"] in said]
+        self.mark_served(ids)
+        return len(ids)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        clause, params = self._fresh_clause()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT tech, grade, COUNT(*) AS total, SUM(CASE WHEN {clause} THEN 1 ELSE 0 END) AS fresh,"
+                " SUM(served) AS served, MAX(created_at) AS updated_at FROM questions GROUP BY tech, grade"
+                " ORDER BY tech, grade",
+                params,
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def stale_keys(self, min_fresh: int) -> List[Tuple[str, str]]:
+        """Ключи, где свежих вопросов меньше min_fresh."""
+        return [(s["tech"], s["grade"]) for s in self.stats() if s["fresh"] < min_fresh]
+
+    def prune(self) -> int:
+        """Удаляет устаревшие вопросы."""
+        clause, params = self._fresh_clause()
+        with self._lock:
+            cur = self._conn.execute(f"DELETE FROM questions WHERE NOT ({clause})", params)
+        return cur.rowcount
+
+
+def generate_questions(tech: str, grade: str, count: int) -> List[Dict[str, str]]:
+    prompt = QUESTION_PROMPT.format(tech=display_name(tech), grade=grade, count=count)
+    data = get_llm().chat_json([{"role": "system", "content": prompt}], agent="question_bank")
+    items = data.get("questions") if isinstance(data, dict) else None
+    return [i for i in items or [] if isinstance(i, dict)]
+
+
+def fill(bank: QuestionBank, keys: List[Tuple[str, str]], per_key: int, concurrency: int = 4) -> Dict[str, Any]:
+    """Пакетная генерация: по одному запросу к LLM на ключ (технология, грейд)."""
+    totals = {"keys": len(keys), "added": 0, "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def one(key: Tuple[str, str]) -> None:
+        tech, grade = key
+        try:
+            res = bank.add(tech, grade, generate_questions(tech, grade, per_key))
+        except LLMUnavailableError as e:
+            print(f"[{tech}/{grade}] ошибка: {e}")
+            res = {"errors": 1}
+        else:
+            print(f"[{tech}/{grade}] +{res['added']} (отклонено {res['rejected']})")
+        with lock:
+            for k, v in res.items():
+                totals[k] += v
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(one, keys))
+    return totals
+
+
+_bank: Optional[QuestionBank] = None
+_bank_lock = threading.Lock()
+
+
+def get_question_bank() -> Optional[QuestionBank]:
+    """Банк для выдачи вопросов; None, если банк выключен или еще не построен."""
+    global _bank
+    if not QUESTION_BANK_ENABLED:
+        return None
+    if _bank is None:
+        path = os.getenv("QUESTION_BANK_PATH", DEFAULT_QUESTION_BANK_PATH)
+        if not os.path.exists(path):
+            return None
+        with _bank_lock:
+            if _bank is None:
+                _bank = QuestionBank(path)
+    return _bank
+
+
+def opening_turn(profile: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """Первый ход интервьюера из банка (тот же формат, что в SYSTEM_PROMPT) или None."""
+    bank = get_question_bank()
+    tech = primary_tech(profile)
+    if bank is None or tech is None:
+        return None
+    grade = normalize_grade(profile.get("grade"))
+    # served отметит mark_asked, когда ход уйдет кандидату
+    picked = bank.pick(tech, grade, mark=False)
+    if not picked:
+        return None
+    q = picked[0]
+    message = OPENING_TEMPLATE.format(
+        name=profile.get("name") or "Кандидат",
+        role=profile.get("target_role") or "Backend Dev",
+        stack=", ".join(profile.get("stack") or ["Python"]),
+        question=q["question"],
+    )
+    thought = f"Первый вопрос из банка ({display_name(tech)}, {grade}): {q['topic'] or 'без темы'}."
+    return {"thought": thought, "message": message}
+
+
+def suggest(profile: Dict[str, Any], history: List[Dict[str, str]], limit: int = 3) -> List[str]:
+    """
+    Незаданные вопросы банка по стеку кандидата — подсказка интервьюеру на следующий ход.
+    Выданными они не считаются: интервьюер может взять другой вопрос (см. mark_asked).
+    """
+    bank = get_question_bank()
+    if bank is None or not QUESTION_BANK_SEED_TURNS:
+        return []
+    grade = normalize_grade(profile.get("grade"))
+    asked = [m["content"] for m in history if m.get("role") == "assistant"]
+    out: List[str] = []
+    for tech in dict.fromkeys(canonical_tech(s) for s in profile.get("stack") or []):
+        for q in bank.pick(tech, grade, exclude=asked + out, limit=1, mark=False):
+            out.append(q["question"])
+        if len(out) >= limit:
+            break
+    return out
+
+
+def mark_asked(profile: Dict[str, Any], message: str) -> int:
+    """
+    Отмечает выданными вопросы банка, которые вошли в отправленную кандидату реплику.
+    Вызывается для каждого отправленного хода (и для первого из opening_turn),
+    поэтому отброшенные спекулятивные черновики и невзятые подсказки served не трогают.
+    """
+    bank = get_question_bank()
+    if bank is None or not message:
+        return 0
+    techs = {canonical_tech(s) for s in profile.get("stack") or []}
+    tech = primary_tech(profile)
+    if tech:
+        techs.add(tech)
+    return bank.mark_asked(sorted(techs), normalize_grade(profile.get("grade")), message)
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Банк вопросов интервьюера")
+    ap.add_argument("--db", default=os.getenv("QUESTION_BANK_PATH", DEFAULT_QUESTION_BANK_PATH))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    fill_p = sub.add_parser("fill", help="сгенерировать вопросы")
+    fill_p.add_argument("--stack", default=",".join(LANGUAGES), help="технологии через запятую")
+    fill_p.add_argument("--grades", default=",".join(GRADES))
+    fill_p.add_argument("--per-key", type=int, default=12, help="вопросов на запрос (технология, грейд)")
+    fill_p.add_argument("--min-fresh", type=int, default=10, help="с --stale-only: свежих вопросов на ключ")
+    fill_p.add_argument("--stale-only", action="store_true", help="только ключи с недостатком свежих вопросов")
+    fill_p.add_argument("--concurrency", type=int, default=4)
+    sub.add_parser("stats", help="вопросы по ключам")
+    stale_p = sub.add_parser("stale", help="ключи, которые пора перегенерировать")
+    stale_p.add_argument("--min-fresh", type=int, default=10)
+    sub.add_parser("prune", help="удалить устаревшие вопросы")
+    args = ap.parse_args()
+
+    bank = QuestionBank(args.db)
+    if args.cmd == "fill":
+        techs = [canonical_tech(t) for t in args.stack.split(",") if t.strip()]
+        grades = [normalize_grade(g) for g in args.grades.split(",") if g.strip()]
+        keys = [(t, g) for t in techs for g in grades]
+        if args.stale_only:
+            counts = {(s["tech"], s["grade"]): s["fresh"] for s in bank.stats()}
+            keys = [k for k in keys if counts.get(k, 0) < args.min_fresh]
+        print(fill(bank, keys, args.per_key, args.concurrency))
+    elif args.cmd == "stats":
+        for s in bank.stats():
+            updated = time.strftime("%Y-%m-%d", time.localtime(s["updated_at"]))
+            print(f"{s['tech']:<12} {s['grade']:<7} свежих {s['fresh']}/{s['total']}  выдано {s['served']}  {updated}")
+    elif args.cmd == "stale":
+        for tech, grade in bank.stale_keys(args.min_fresh):
+            print(f"{tech}/{grade}")
+    elif args.cmd == "prune":
+        print(f"Удалено: {bank.prune()}")
+    bank.close()
+
+
+if __name__ == "__main__":
+    main()
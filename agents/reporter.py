@@ -1,9 +1,17 @@
+import asyncio
+import hashlib
 import json
-from typing import Any, Dict
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List
 from llm import get_llm
 from agents.resources import get_resources_str
+from agents import assessor
+from utils import estimate_tokens
 
-llm = get_llm()
 
 REPORT_PROMPT = """
 Ты — Tech Lead и Hiring Manager.
@@ -48,13 +56,81 @@ REPORT_PROMPT = """
 ВАЖНО: Пиши отчет на русском языке. Не используй Markdown-заголовки (с #) и форматирование через *, используй просто ВЕРХНИЙ РЕГИСТР для разделов.
 """
 
-def generate_final_feedback(log_data: Dict[str, Any]) -> str:
-    log_str = json.dumps(log_data, ensure_ascii=False, indent=2)
+CHUNK_PROMPT = """
+Ты — помощник Tech Lead. Тебе дана ЧАСТЬ лога технического интервью (ходы {first}-{last}).
+Составь сжатый конспект этой части для итогового отчета. Строго по пунктам:
+- ТЕМЫ: какие вопросы задавались.
+- ВЕРНО: темы, где кандидат ответил правильно.
+- ОШИБКИ: где кандидат ошибся или не знал, и для каждого — КРАТКИЙ ПРАВИЛЬНЫЙ ОТВЕТ.
+- FACTCHECKER: алерты о ложных утверждениях (если были).
+- SOFT SKILLS: ясность изложения, вопросы кандидата о проекте.
+Только факты из лога, без оценок грейда. Не более 150 слов.
+"""
+
+# Лимиты компактной сериализации лога для Reporter
+MAX_QUESTION_CHARS = int(os.getenv("REPORT_MAX_QUESTION_CHARS", "400"))
+MAX_ANSWER_CHARS = int(os.getenv("REPORT_MAX_ANSWER_CHARS", "1500"))
+# Порог (в токенах компактного лога), после которого включается map-reduce
+MAPREDUCE_THRESHOLD = int(os.getenv("REPORT_MAPREDUCE_THRESHOLD", "6000"))
+CHUNK_TURNS = int(os.getenv("REPORT_CHUNK_TURNS", "5"))
+MAP_CONCURRENCY = int(os.getenv("REPORT_MAP_CONCURRENCY", "4"))
+# llm (по умолчанию) — полная генерация по логу (map-reduce для длинных);
+# scorecard — отчет собирается из текущей оценки (agents/assessor.py), если лог
+# велся с ней, без длинной генерации
+REPORT_MODE = os.getenv("REPORT_MODE", "llm").lower()
+
+# Последние замеры Reporter: режим, токены промптов, время
+_report_stats: Deque[Dict[str, Any]] = deque(maxlen=100)
+_report_stats_lock = threading.Lock()
+
+
+def report_fingerprint() -> str:
+    """Хеш промптов и справочника: при их изменении сохраненные отчеты устаревают."""
+    raw = "\n".join([REPORT_PROMPT, CHUNK_PROMPT, get_resources_str(), str(MAPREDUCE_THRESHOLD), str(CHUNK_TURNS)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+def _truncate(text: str, limit: int) -> str:
+    text = str(text or "").strip()
+    return text if len(text) <= limit else text[:limit] + "…"
+
+def _turn_thoughts(turn: Dict[str, Any]) -> List[str]:
+    """Мысли агентов хода без повторов (лог бывает и в памяти — списком, и из файла — строкой)."""
+    raw = turn.get("internal_thoughts") or []
+    if isinstance(raw, str):
+        items = [line.strip() for line in raw.split("\n")]
+    else:
+        items = [
+            f"[{str(t.get('from', 'System')).replace('_Agent', '')}]: {str(t.get('content', '')).strip()}"
+            for t in raw if isinstance(t, dict)
+        ]
+    return [t for t in dict.fromkeys(items) if t and not t.endswith("]:")]
+
+def compact_turns(log_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    turns = []
+    for turn in log_data.get("turns", []):
+        turns.append({
+            "id": turn.get("turn_id"),
+            "q": _truncate(turn.get("agent_visible_message", ""), MAX_QUESTION_CHARS),
+            "a": _truncate(turn.get("user_message", ""), MAX_ANSWER_CHARS),
+            "thoughts": _turn_thoughts(turn),
+        })
+    return turns
+
+def compact_log(log_data: Dict[str, Any]) -> str:
+    """Компактный JSON лога: без отступов, мысли без дублей, длинные реплики обрезаны."""
+    data = {
+        "participant_name": log_data.get("participant_name", "Unknown"),
+        "turns": compact_turns(log_data),
+    }
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+def _report_messages(log_data: Dict[str, Any]) -> List[Dict[str, str]]:
+    log_str = compact_log(log_data)
     
     # Получаем список ссылок
     res_str = get_resources_str()
 
-    messages = [
+    return [
         {
             "role": "system", 
             "content": REPORT_PROMPT.format(resources_str=res_str)
@@ -62,4 +138,106 @@ def generate_final_feedback(log_data: Dict[str, Any]) -> str:
         {"role": "user", "content": f"Вот лог интервью:\n{log_str}"}
     ]
 
-    return llm.chat(messages)
\ No newline at end of file
+def _chunk_messages(log_data: Dict[str, Any]) -> List[List[Dict[str, str]]]:
+    turns = compact_turns(log_data)
+    out = []
+    for i in range(0, len(turns), CHUNK_TURNS):
+        part = turns[i:i + CHUNK_TURNS]
+        out.append([
+            {"role": "system", "content": CHUNK_PROMPT.format(first=part[0]["id"], last=part[-1]["id"])},
+            {"role": "user", "content": json.dumps(part, ensure_ascii=False, separators=(",", ":"))},
+        ])
+    return out
+
+def _reduce_messages(log_data: Dict[str, Any], summaries: List[str]) -> List[Dict[str, str]]:
+    notes = "\n\n".join(f"ЧАСТЬ {i + 1}:\n{text.strip()}" for i, text in enumerate(summaries))
+    return [
+        {"role": "system", "content": REPORT_PROMPT.format(resources_str=get_resources_str())},
+        {"role": "user", "content": (
+            f"Интервью длинное, поэтому вместо полного лога даны конспекты его частей по порядку "
+            f"(кандидат: {log_data.get('participant_name', 'Unknown')}, ходов: {len(log_data.get('turns', []))}). "
+            f"Составь по ним отчет в требуемой структуре.\n\n{notes}"
+        )},
+    ]
+
+def _use_mapreduce(log_data: Dict[str, Any]) -> bool:
+    return (
+        estimate_tokens(compact_log(log_data)) > MAPREDUCE_THRESHOLD
+        and len(log_data.get("turns", [])) > CHUNK_TURNS
+    )
+
+def _prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+def _record(mode: str, prompt_tokens: int, started: float, calls: int) -> None:
+    stat = {
+        "mode": mode,
+        "prompt_tokens": prompt_tokens,
+        "llm_calls": calls,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    with _report_stats_lock:
+        _report_stats.append(stat)
+    print(f"[DEBUG] Reporter: {stat}")
+
+def get_report_stats() -> List[Dict[str, Any]]:
+    """Замеры последних генераций отчета (режим, токены промптов, время)."""
+    with _report_stats_lock:
+        return list(_report_stats)
+
+def _use_scorecard(log_data: Dict[str, Any]) -> bool:
+    return REPORT_MODE == "scorecard" and assessor.is_tracked(log_data) and bool(log_data.get("turns"))
+
+def _scorecard_report(log_data: Dict[str, Any], started: float, catch_up: int) -> str:
+    report = assessor.format_report(log_data["scorecard"])
+    _record("scorecard", 0, started, catch_up)
+    return report
+
+def generate_final_feedback(log_data: Dict[str, Any]) -> str:
+    started = time.perf_counter()
+    if _use_scorecard(log_data):
+        catch_up = assessor.finalize(log_data)
+        if log_data["scorecard"].get("turns_assessed"):
+            return _scorecard_report(log_data, started, catch_up)
+    if not _use_mapreduce(log_data):
+        messages = _report_messages(log_data)
+        report = get_llm().chat(messages, agent="reporter")
+        _record("single", _prompt_tokens(messages), started, 1)
+        return report
+
+    # Map: конспекты частей параллельно, Reduce: итоговый отчет по конспектам
+    chunks = _chunk_messages(log_data)
+    with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as pool:
+        summaries = list(pool.map(lambda m: get_llm().chat(m, agent="reporter_map"), chunks))
+    reduce_msgs = _reduce_messages(log_data, summaries)
+    report = get_llm().chat(reduce_msgs, agent="reporter")
+    tokens = sum(_prompt_tokens(m) for m in chunks) + _prompt_tokens(reduce_msgs)
+    _record("mapreduce", tokens, started, len(chunks) + 1)
+    return report
+
+async def agenerate_final_feedback(log_data: Dict[str, Any]) -> str:
+    """Асинхронный вариант generate_final_feedback."""
+    started = time.perf_counter()
+    if _use_scorecard(log_data):
+        catch_up = await assessor.afinalize(log_data)
+        if log_data["scorecard"].get("turns_assessed"):
+            return _scorecard_report(log_data, started, catch_up)
+    if not _use_mapreduce(log_data):
+        messages = _report_messages(log_data)
+        report = await get_llm().achat(messages, agent="reporter")
+        _record("single", _prompt_tokens(messages), started, 1)
+        return report
+
+    chunks = _chunk_messages(log_data)
+    sem = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def summarize(messages: List[Dict[str, str]]) -> str:
+        async with sem:
+            return await get_llm().achat(messages, agent="reporter_map")
+
+    summaries = await asyncio.gather(*(summarize(m) for m in chunks))
+    reduce_msgs = _reduce_messages(log_data, list(summaries))
+    report = await get_llm().achat(reduce_msgs, agent="reporter")
+    tokens = sum(_prompt_tokens(m) for m in chunks) + _prompt_tokens(reduce_msgs)
+    _record("mapreduce", tokens, started, len(chunks) + 1)
+    return report
@@ -23,4 +23,18 @@ class InterviewerResponse(BaseModel):
 
 class FactCheckResponse(BaseModel):
     alert: bool = Field(default=False, description="Есть ли фактическая ошибка")
-    content: str = Field(default="OK", description="Текст алерта")
\ No newline at end of file
+    content: str = Field(default="OK", description="Текст алерта")
+
+
+class TurnAssessment(BaseModel):
+    topic: str = Field(default="", description="Тема вопроса")
+    verdict: str = Field(default="partial", description="correct / partial / wrong / no_answer / off_topic")
+    skill: str = Field(default="", description="Подтвержденный навык")
+    gap: str = Field(default="", description="Пробел в знаниях")
+    correct_answer: str = Field(default="", description="Краткий правильный ответ для пробела")
+    grade_signal: str = Field(default="", description="Уровень, который демонстрирует ответ")
+    clarity: int = Field(default=3, ge=1, le=5, description="Ясность изложения (1-5)")
+    resource: str = Field(default="", description="Ключ справочника ссылок для пробела")
+
+    class Config:
+        extra = "ignore"
@@ -1,54 +1,115 @@
+import argparse
 import os
 import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
 from graph import build_interview_graph
-from logger import start_session, add_turn, set_final_feedback, save_log
-from agents.reporter import generate_final_feedback
+from logger import start_session, add_turn
+from agents.assessor import submit_turn
 from utils import is_stop_command
+from llm import prewarm_from_env
+from report_jobs import get_report_queue, submit_report
+from session_store import SessionConflictError, get_session_store
+import metrics
 
 HARD_MAX_USER_TURNS = 15
 STUDENT_NAME = "Василенко Егор Викторович"
 
+def run_turn(app_graph, state, config):
+    """Прогон графа с потоковой печатью ответа интервьюера по мере генерации."""
+    final_state = {}
+    streamed = False
+    for mode, chunk in app_graph.stream(state, config=config, stream_mode=["values", "custom"]):
+        if mode == "values":
+            final_state = chunk
+            continue
+        delta = chunk.get("interviewer_delta")
+        if delta:
+            if not streamed:
+                print("\n[Агент]: ", end="", flush=True)
+                streamed = True
+            print(delta, end="", flush=True)
+    if streamed:
+        print()
+    return final_state, streamed
+
 def main() -> None:
+    ap = argparse.ArgumentParser(description="Multi-Agent Interview Coach (CLI)")
+    ap.add_argument("--resume", metavar="THREAD_ID", default=None,
+                    help="продолжить сессию из хранилища сессий (session_store.py)")
+    args = ap.parse_args()
+
+    metrics.serve_from_env()
+    # Клиент LLM и токен готовятся, пока кандидат вводит данные
+    prewarm_from_env()
     app_graph = build_interview_graph()
-    thread_id = str(uuid.uuid4())
+    store = get_session_store()
+    session = store.load(args.resume) if args.resume else None
+    if args.resume and session is None:
+        print(f"[System]: Сессия {args.resume} не найдена, начинаем новую.")
+    thread_id = session["thread_id"] if session else str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}}
     
     print("--- Multi-Agent Interview Coach (CLI) ---")
     print(f"Студент: {STUDENT_NAME}")
-    
-    print("\nВведите данные кандидата (Имя, Роль, Стек, Грейд):")
-    candidate_info = input(">>> ").strip()
-    while not candidate_info:
-        candidate_info = input("Введите данные кандидата: ").strip()
-        
-    log = start_session(STUDENT_NAME)
-
-    state = {
-        "profile": {}, 
-        "messages": [],
-        "user_input": candidate_info,
-        "history": [],
-        "internal_thoughts": [],
-        "turn_count": 0,
-        "is_finished": False
-    }
-
-    print(f"\n[System]: Данные отправлены в Intake Agent...")
+
+    if session:
+        # Состояние и лог берутся из хранилища: сессию мог начать другой процесс
+        log = session["log"]
+        state = {**session["state"], "stream_tokens": True}
+        version = session["version"]
+        pending_turn = False
+        print(f"\n[System]: Продолжаем сессию {thread_id}, ход {state.get('turn_count', 0)}.")
+    else:
+        print("\nВведите данные кандидата (Имя, Роль, Стек, Грейд):")
+        candidate_info = input(">>> ").strip()
+        while not candidate_info:
+            candidate_info = input("Введите данные кандидата: ").strip()
+            
+        log = start_session(STUDENT_NAME)
+
+        state = {
+            "profile": {}, 
+            "messages": [],
+            "user_input": candidate_info,
+            "history": [],
+            "internal_thoughts": [],
+            "turn_count": 0,
+            "is_finished": False,
+            "stream_tokens": True
+        }
+        version = 0
+        pending_turn = True
+
+        print(f"\n[System]: Данные отправлены в Intake Agent...")
+    print(f"[System]: ID сессии {thread_id} (продолжить: python app.py --resume {thread_id})")
     print("-" * 40)
 
     try:
-        turn_count = 0
+        turn_count = state.get("turn_count", 0)
         while True:
-            final_state = app_graph.invoke(state, config=config)
-            state.update(final_state)
+            streamed = False
+            if pending_turn:
+                final_state, streamed = run_turn(app_graph, state, config)
+                state.update(final_state)
+                try:
+                    version = store.save(thread_id, state, log, version)
+                except SessionConflictError as e:
+                    # Ход уже записал другой воркер: продолжаем с его состояния
+                    print(f"\n[System]: {e}. Продолжаем с сохраненного состояния.")
+                    session = store.load(thread_id)
+                    log, version = session["log"], session["version"]
+                    state = {**session["state"], "stream_tokens": True}
+                    turn_count = state.get("turn_count", 0)
+                    streamed = False
+            pending_turn = True
             
             ai_answer = state.get("ai_message", "Error")
             thoughts = state.get("internal_thoughts", [])
             
-            print(f"\n[Агент]: {ai_answer}")
+            if not streamed:
+                print(f"\n[Агент]: {ai_answer}")
 
             user_text = ""
             while not user_text:
@@ -65,6 +126,8 @@ def main() -> None:
             state["user_input"] = user_text
             
             add_turn(log, user_text, thoughts, ai_answer)
+            # Оценка хода для итогового отчета — в фоне, следующий ход ее не ждет
+            submit_turn(log, state.get("profile"), thread_id)
             
             turn_count += 1
             state["turn_count"] = turn_count
@@ -76,12 +139,20 @@ def main() -> None:
         print(f"\n[Ошибка]: {e}")
         import traceback; traceback.print_exc()
 
-    print("\n[Reporter]: Генерация фидбека...")
-    final_feedback = generate_final_feedback(log)
-    set_final_feedback(log, final_feedback)
-    path = save_log(log)
-    print("\nРЕЗУЛЬТАТЫ:\n", final_feedback)
-    print(f"Лог сохранен: {path}")
+    # Отчет и сохранение лога — задача очереди: при обрыве CLI ее доделает другой воркер
+    job_id = submit_report(log, thread_id)
+    # Интервью в очереди отчетов: незавершенная сессия больше не нужна
+    store.delete(thread_id)
+    print(f"\n[Reporter]: Генерация фидбека (задача {job_id})...")
+    try:
+        job = get_report_queue().wait(job_id)
+    except KeyboardInterrupt:
+        print(f"\n[System]: Отчет остается в очереди: python report_jobs.py show {job_id}")
+        return
+    if job["error"]:
+        print(f"[Ошибка]: {job['error']}")
+    print("\nРЕЗУЛЬТАТЫ:\n", job["final_feedback"])
+    print(f"Лог сохранен: {job['path']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
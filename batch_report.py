@@ -0,0 +1,183 @@
+"""
+Пакетная (пере)генерация отчетов Reporter по сохраненным логам.
+
+    python batch_report.py --dir outputs --concurrency 8 --rps 2
+
+Отчет пишется атомарно рядом с логом: interview_log_X.json -> interview_log_X.report.json.
+Лог пропускается, если отчет уже построен по тому же содержимому лога и той же
+версии промпта (хеши в файле отчета), поэтому повторный запуск после падения
+продолжает с места остановки.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+from agents.reporter import agenerate_final_feedback, report_fingerprint
+from llm import LLMUnavailableError
+
+REPORT_SUFFIX = ".report.json"
+
+
+def iter_logs(directory: str, pattern: str = "interview_log_*.json") -> Iterator[str]:
+    """Лениво перебирает логи в каталоге (без файлов отчетов)."""
+    for path in sorted(glob.iglob(os.path.join(directory, pattern))):
+        if not path.endswith(REPORT_SUFFIX):
+            yield path
+
+
+def report_path_for(log_path: str) -> str:
+    base, _ = os.path.splitext(log_path)
+    return base + REPORT_SUFFIX
+
+
+def log_hash(log_data: Dict[str, Any]) -> str:
+    raw = json.dumps(log_data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _reporter_input(log_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Старый фидбек не должен влиять на новый отчет
+    data = dict(log_data)
+    data["final_feedback"] = ""
+    return data
+
+
+def is_up_to_date(report_path: str, source_hash: str, fingerprint: str) -> bool:
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get("source_hash") == source_hash and meta.get("report_fingerprint") == fingerprint
+
+
+def write_atomic(path: str, data: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class RateLimiter:
+    """Равномерный лимит запросов в секунду, общий для всех воркеров батча."""
+
+    def __init__(self, rps: float) -> None:
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+async def _process(
+    path: str, limiter: RateLimiter, fingerprint: str, force: bool
+) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        log_data = _reporter_input(json.load(f))
+    source_hash = log_hash(log_data)
+    out_path = report_path_for(path)
+    if not force and is_up_to_date(out_path, source_hash, fingerprint):
+        return {"path": path, "status": "skipped"}
+
+    await limiter.acquire()
+    started = time.perf_counter()
+    report = await agenerate_final_feedback(log_data)
+    latency = time.perf_counter() - started
+    write_atomic(out_path, {
+        "source": os.path.basename(path),
+        "source_hash": source_hash,
+        "report_fingerprint": fingerprint,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "latency_sec": round(latency, 3),
+        "final_feedback": report,
+    })
+    return {"path": path, "status": "done", "latency": latency}
+
+
+async def run_batch(
+    directory: str, concurrency: int = 4, rps: float = 0.0, force: bool = False
+) -> Dict[str, Any]:
+    limiter = RateLimiter(rps)
+    fingerprint = report_fingerprint()
+    logs = iter_logs(directory)
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+
+    async def worker() -> None:
+        # Воркеры тянут пути из общего итератора — весь список в память не грузится
+        for path in logs:
+            try:
+                res = await _process(path, limiter, fingerprint, force)
+            except (LLMUnavailableError, OSError, ValueError) as e:
+                res = {"path": path, "status": "error", "error": str(e)}
+            results.append(res)
+            extra = f" {res['latency']:.2f}s" if "latency" in res else ""
+            print(f"[{res['status']}] {os.path.basename(path)}{extra}")
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return summarize(results, time.perf_counter() - started)
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(r["latency"] for r in results if "latency" in r)
+    done = len(latencies)
+
+    def pct(p: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return round(latencies[min(done - 1, int(p / 100 * done))], 3)
+
+    return {
+        "total": len(results),
+        "done": done,
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "errors": sum(1 for r in results if r["status"] == "error"),
+        "elapsed_sec": round(elapsed, 3),
+        "throughput_per_min": round(done / elapsed * 60, 2) if elapsed and done else 0.0,
+        "latency_mean": round(statistics.mean(latencies), 3) if latencies else None,
+        "latency_p50": pct(50),
+        "latency_p95": pct(95),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Пакетная генерация отчетов по логам интервью")
+    ap.add_argument("--dir", default="outputs", help="каталог с interview_log_*.json")
+    ap.add_argument("--concurrency", type=int, default=4, help="одновременных запросов к Reporter")
+    ap.add_argument("--rps", type=float, default=0.0, help="лимит запросов в секунду (0 — без лимита)")
+    ap.add_argument("--force", action="store_true", help="перегенерировать даже актуальные отчеты")
+    args = ap.parse_args()
+
+    summary = asyncio.run(run_batch(args.dir, args.concurrency, args.rps, args.force))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
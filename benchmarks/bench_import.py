@@ -0,0 +1,94 @@
+"""
+Время холодного старта: импорт точек входа в чистом интерпретаторе.
+
+Для каждой цели запускается `python -X importtime -c "import <модуль>"`,
+берется время стены процесса и суммарное время импорта, плюс самые
+тяжелые модули (по собственному времени, self). Цели по умолчанию:
+app (CLI) и модули, которые импортирует ui.py (сам ui.py — скрипт Streamlit
+и при импорте рисует интерфейс).
+
+Запуск: python -m benchmarks.bench_import [--repeat N] [--top K] [--out result.json]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+TARGETS = {
+    "app": "import app",
+    "ui_deps": "import streamlit, graph, agents.reporter, logger, utils, llm",
+    "llm": "import llm",
+    "graph": "import graph",
+}
+
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Строки -X importtime: (модуль, self мкс, cumulative мкс, глубина)."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def measure(code: str, repeat: int, top: int) -> Dict[str, Any]:
+    walls, totals = [], []
+    heaviest: Dict[str, int] = {}
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "0"}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              capture_output=True, text=True, env=env)
+        walls.append(time.perf_counter() - started)
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+        rows = parse_importtime(proc.stderr)
+        # Суммарное время — по модулям верхнего уровня (глубина 0)
+        totals.append(sum(cum for _, _, cum, depth in rows if depth == 0) / 1e6)
+        for name, self_us, _, _ in rows:
+            heaviest[name] = max(heaviest.get(name, 0), self_us)
+    top_modules = sorted(heaviest.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "import_ms": round(statistics.median(totals) * 1000, 1),
+        "modules_loaded": len(heaviest),
+        "top_self_ms": {name: round(us / 1000, 2) for name, us in top_modules},
+        "provider_sdks_loaded": sorted(
+            name for name in heaviest
+            if name.split(".")[0] in ("langchain_gigachat", "gigachat", "langchain_openai",
+                                      "langchain_google_genai", "langchain_google_vertexai")
+        ),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--targets", default=",".join(TARGETS), help="через запятую: " + ", ".join(TARGETS))
+    ap.add_argument("--out", default=None, help="куда сохранить результат (JSON)")
+    args = ap.parse_args()
+
+    result = {
+        "benchmark": "import_time",
+        "python": sys.version.split()[0],
+        "provider": os.getenv("LLM_PROVIDER", "gigachat"),
+        "targets": {name: measure(TARGETS[name], args.repeat, args.top) for name in args.targets.split(",")},
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Бенчмарк быстрого пути Intake (tech_matcher + agents.intake.extract_profile).
+
+Замеряется:
+  - matcher — прежний поиск стека подстрокой (копия ниже) против автомата
+              Aho-Corasick: скорость и точность на размеченных текстах
+              (ложные срабатывания вроде "go" в "google" и технологии,
+              на которые кандидат только хочет перейти);
+  - intake  — run_intake с быстрым путем и без него при задержке модели
+              FAKE_LLM_LATENCY: сколько вызовов LLM пропущено и сколько
+              времени сэкономлено.
+
+Запуск: python -m benchmarks.bench_intake [--repeat N] [--latency fixed:0.8] [--out result.json]
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+# Провайдер и побочные файлы настраиваются до импорта модулей проекта
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("JOURNAL_ENABLED", "false")
+
+from benchmarks.bench_pipeline import _percentiles
+
+# Текст кандидата и технологии, которые в нем действительно есть
+BLURBS: List[Tuple[str, Set[str]]] = [
+    ("Привет, я Анна, Middle Python developer, 4 года, Django, PostgreSQL, Docker",
+     {"python", "django", "postgres", "docker"}),
+    ("Меня зовут Олег. Senior Java разработчик, 7 лет опыта: Spring Boot, Kafka, k8s",
+     {"java", "spring", "kafka", "kubernetes"}),
+    ("Я Иван, Middle Python Developer. Знаю Django, Docker, PostgreSQL.",
+     {"python", "django", "docker", "postgres"}),
+    ("Junior, полтора года на Go, до этого стажировка в Google",
+     {"go"}),
+    ("Был джуном на PHP 2 года, сейчас middle на Java 3 года",
+     {"php", "java"}),
+    ("I am Alex, senior backend engineer, 10 years, golang, postgres, redis",
+     {"go", "postgres", "redis"}),
+    ("Я Мария, Junior Frontend разработчик, 1 год, JavaScript, React, немного TypeScript",
+     {"javascript", "react", "typescript"}),
+    ("Меня зовут Дмитрий, Middle Kotlin developer, 3 года, Spring, Gradle, Hibernate, MySQL",
+     {"kotlin", "spring", "gradle", "hibernate", "mysql"}),
+    ("Senior C++ разработчик, 8 лет, Linux, Git, немного Rust",
+     {"c++", "linux", "git", "rust"}),
+    ("Я Сергей, Middle Node.js developer, 2 года, MongoDB, RabbitMQ, Docker",
+     {"node", "mongodb", "rabbitmq", "docker"}),
+    ("Привет! Пишу на питоне года три, FastAPI, Celery, Redis, хочу на позицию мидла",
+     {"python", "fastapi", "celery", "redis"}),
+    ("Меня зовут Елена, Senior C# developer, 6 лет, .NET, SQL, Docker",
+     {"c#", "sql", "docker"}),
+    ("Middle JavaScript разработчик, 3 года, Vue, Node, TypeScript; до этого Java",
+     {"javascript", "vue", "node", "typescript", "java"}),
+    ("Я Павел, Junior Python developer, 1 год, Flask, SQL, Git",
+     {"python", "flask", "sql", "git"}),
+    ("Иван, джун, 1 год на Python, Django, хочу перейти в Java",
+     {"python", "django"}),
+    ("Меня зовут Ольга, Middle PHP developer, 3 года, Laravel, MySQL; планирую изучить Go",
+     {"php", "mysql"}),
+]
+
+# Прежний словарь utils.ALLOWED_STACK и поиск подстрокой из normalize_stack / intake.check_techs
+LEGACY_STACK = {
+    "python", "django", "fastapi", "flask",
+    "java", "spring", "hibernate", "kotlin", "maven", "gradle",
+    "javascript", "typescript", "react", "vue", "node",
+    "sql", "postgres", "postgresql", "mysql", "mongodb",
+    "redis", "docker", "kubernetes", "git", "linux", "celery", "rabbitmq", "kafka",
+}
+LEGACY_LANGS = ["java", "python", "javascript", "go", "rust", "c++", "c#", "php"]
+
+
+def legacy_find(text: str) -> Set[str]:
+    low = text.lower()
+    found = {t.replace("postgresql", "postgres") for t in LEGACY_STACK if t in low}
+    found.update(t for t in LEGACY_LANGS if t in low)
+    return found
+
+
+def _accuracy(find) -> Dict[str, Any]:
+    false_pos = missed = 0
+    for text, expected in BLURBS:
+        got = set(find(text))
+        false_pos += len(got - expected)
+        missed += len(expected - got)
+    total = sum(len(e) for _, e in BLURBS)
+    return {"false_positives": false_pos, "missed": missed, "recall": round(1 - missed / total, 3)}
+
+
+def bench_matcher(repeat: int) -> Dict[str, Any]:
+    from agents.intake import current_matches
+    from tech_matcher import find_techs, get_matcher
+
+    def current_find(text: str) -> List[str]:
+        return [m[2] for m in current_matches(text)]
+
+    started = time.perf_counter()
+    get_matcher()
+    build_ms = round((time.perf_counter() - started) * 1000, 3)
+    result: Dict[str, Any] = {"build_ms": build_ms}
+    # current — стек быстрого пути Intake: без технологий после "хочу перейти в" и т.п.
+    for name, fn in (("legacy", legacy_find), ("aho_corasick", find_techs), ("current", current_find)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for text, _ in BLURBS:
+                fn(text)
+        elapsed = time.perf_counter() - start
+        calls = repeat * len(BLURBS)
+        result[name] = {"ops_per_sec": round(calls / elapsed, 1) if elapsed else None, **_accuracy(fn)}
+    return result
+
+
+def bench_intake(repeat: int) -> Dict[str, Any]:
+    import agents.intake as intake
+    result = {}
+    for fast in (False, True):
+        intake.INTAKE_FAST_PATH = fast
+        latencies = []
+        skipped = 0
+        for _ in range(repeat):
+            for text, _ in BLURBS:
+                skipped += int(fast and intake._local_profile(text)[1])
+                start = time.perf_counter()
+                intake.run_intake(text)
+                latencies.append(time.perf_counter() - start)
+        result["fast_path" if fast else "llm_only"] = {
+            "runs": len(latencies),
+            "llm_skipped": skipped,
+            "total_s": round(sum(latencies), 3),
+            **_percentiles(latencies),
+        }
+    base, fast = result["llm_only"], result["fast_path"]
+    result["saved_s"] = round(base["total_s"] - fast["total_s"], 3)
+    result["hit_rate"] = round(fast["llm_skipped"] / fast["runs"], 3)
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=3, help="повторов корпуса для intake")
+    ap.add_argument("--matcher-repeat", type=int, default=2000, help="повторов корпуса для matcher")
+    ap.add_argument("--latency", default="fixed:0.8", help="задержка fake-модели (FAKE_LLM_LATENCY)")
+    ap.add_argument("--out", default=None, help="куда сохранить результат (JSON)")
+    args = ap.parse_args()
+    os.environ["FAKE_LLM_LATENCY"] = args.latency
+
+    result = {
+        "benchmark": "intake_fast_path",
+        "corpus_size": len(BLURBS),
+        "latency": args.latency,
+        "matcher": bench_matcher(args.matcher_repeat),
+        "intake": bench_intake(args.repeat),
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
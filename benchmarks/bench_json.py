@@ -0,0 +1,133 @@
+"""
+Микробенчмарк извлечения JSON из ответов LLM.
+
+Корпус строится из реальных логов outputs/interview_log_*.json: каждый ход
+превращается в ответ интервьюера {"thought", "message"} в нескольких
+"шумных" вариантах (```-блок, текст вокруг, два объекта, висячая запятая,
+одинарные кавычки, обрыв). Сравнивается старый _parse_json_safe (копия ниже)
+с json_stream.extract_json.
+
+Запуск: python -m benchmarks.bench_json [--repeat N] [--out result.json]
+"""
+import argparse
+import glob
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from json_stream import extract_json
+
+
+def legacy_parse_json_safe(text: Any) -> Dict[str, Any]:
+    """Прежняя реализация LLMService._parse_json_safe (базовая линия)."""
+    text = str(text).strip()
+    if "```" in text:
+        parts = text.split("```")
+        for part in parts:
+            if "{" in part:
+                text = part.replace("json", "").strip()
+                break
+    text = text.strip().strip("'").strip('"')
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            match = re.search(r'\{.*\}', text, re.DOTALL)
+            if match:
+                return json.loads(match.group(0))
+        except Exception:
+            pass
+        return {"error": "json_parse_error", "raw_content": text}
+
+
+def _variants(obj: Dict[str, str]) -> List[Tuple[str, str]]:
+    clean = json.dumps(obj, ensure_ascii=False)
+    pretty = json.dumps(obj, ensure_ascii=False, indent=2)
+    single = "{" + ", ".join(f"'{k}': '{v}'" for k, v in obj.items() if "'" not in v) + "}"
+    return [
+        ("clean", clean),
+        ("fenced", f"```json\n{pretty}\n```"),
+        ("prose", f"Вот мой ответ:\n{clean}\nНадеюсь, это поможет."),
+        ("two_objects", f"{clean}\n{json.dumps({'thought': 'лишнее', 'message': 'лишнее'}, ensure_ascii=False)}"),
+        ("trailing_comma", pretty[:-1].rstrip() + ",\n}"),
+        ("single_quotes", single),
+        ("truncated", clean[: max(len(clean) - 5, 1)]),
+    ]
+
+
+def build_corpus(pattern: str = "outputs/interview_log_*.json") -> List[Tuple[str, str, Dict[str, str]]]:
+    corpus = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            log = json.load(f)
+        for turn in log.get("turns", []):
+            obj = {
+                "thought": str(turn.get("internal_thoughts", "")).replace("'", "’") or "Анализирую...",
+                "message": str(turn.get("agent_visible_message", "")).replace("'", "’"),
+            }
+            for kind, raw in _variants(obj):
+                corpus.append((kind, raw, obj))
+    return corpus
+
+
+def _is_correct(kind: str, parsed: Optional[Dict[str, Any]], expected: Dict[str, str]) -> bool:
+    if not isinstance(parsed, dict) or "error" in parsed:
+        return False
+    if kind == "truncated":
+        return parsed.get("thought") == expected["thought"]
+    return parsed == expected
+
+
+def run(parser: Callable[[str], Any], corpus, repeat: int) -> Dict[str, Any]:
+    ok_by_kind: Dict[str, List[int]] = {}
+    for kind, raw, expected in corpus:
+        try:
+            parsed = parser(raw)
+        except Exception:
+            parsed = None
+        stat = ok_by_kind.setdefault(kind, [0, 0])
+        stat[0] += int(_is_correct(kind, parsed, expected))
+        stat[1] += 1
+
+    total_bytes = sum(len(raw.encode("utf-8")) for _, raw, _ in corpus)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, raw, _ in corpus:
+            try:
+                parser(raw)
+            except Exception:
+                pass
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(corpus)
+    return {
+        "calls": calls,
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(calls / elapsed, 1) if elapsed else None,
+        "mb_per_sec": round(total_bytes * repeat / elapsed / 1e6, 2) if elapsed else None,
+        "accuracy": {k: round(v[0] / v[1], 3) for k, v in sorted(ok_by_kind.items())},
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--out", default=None, help="куда сохранить результат (JSON)")
+    args = ap.parse_args()
+
+    corpus = build_corpus()
+    result = {
+        "benchmark": "json_extract",
+        "corpus_size": len(corpus),
+        "legacy": run(legacy_parse_json_safe, corpus, args.repeat),
+        "extract_json": run(extract_json, corpus, args.repeat),
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Бенчмарк конвейера хода на локальном провайдере LLM_PROVIDER=fake (без сети).
+
+Замеряется:
+  - parse_json   — LLMService._parse_json_safe на корпусе из bench_json;
+  - utils        — is_stop_command / normalize_stack;
+  - nodes        — накладные расходы узлов graph.py при нулевой задержке модели;
+  - turn         — полный ход графа (sync/async) при задержке FAKE_LLM_LATENCY;
+  - save_log     — экспорт лога разного размера.
+
+Запуск: python -m benchmarks.bench_pipeline [--repeat N] [--latency fixed:0.05] [--out result.json]
+        python -m benchmarks.bench_pipeline --compare baseline.json   # регрессии относительно прошлой версии
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Провайдер и побочные файлы настраиваются до импорта модулей проекта
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ.setdefault("FAKE_LLM_LATENCY", "fixed:0")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("PREROUTER_DATA_PATH", "")
+os.environ.setdefault("CLAIM_INDEX_PATH", "")
+os.environ.setdefault("JOURNAL_ENABLED", "false")
+
+from benchmarks.bench_json import build_corpus
+from graph import (
+    build_interview_graph, node_factchecker, node_intake, node_interviewer,
+)
+from llm import get_llm
+from logger import add_turn, save_log, start_session
+from utils import is_stop_command, normalize_stack
+
+INTAKE_TEXT = "Привет, я Олег, Middle Java разработчик, 3 года опыта, знаю SQL, Docker и Kafka"
+ANSWERS = [
+    "HashMap хранит пары в массиве бакетов, при коллизиях — список или дерево.",
+    "В Java 21 появились виртуальные потоки, это релиз 2023 года.",
+    "Не знаю",
+    "Индексы ускоряют поиск, но замедляют вставку.",
+]
+STOP_SAMPLES = ["Стоп", "давай фидбэк", "Расскажу про GIL подробнее", "нет", "stop!", "Я бы остановился на JOIN"]
+STACK_SAMPLES = [
+    (["Python", "Django"], ""),
+    ([], "Пишу на java и spring, немного docker и kafka"),
+    ("python, postgres", "Middle backend"),
+]
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": round(statistics.fmean(ordered) * 1000, 3)}
+
+
+def _throughput(fn: Callable[[Any], Any], samples: List[Any], repeat: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sample in samples:
+            fn(sample)
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(samples)
+    return {"calls": calls, "ops_per_sec": round(calls / elapsed, 1) if elapsed else None}
+
+
+def bench_parse_json(repeat: int) -> Dict[str, Any]:
+    llm = get_llm()
+    corpus = [raw for _, raw, _ in build_corpus()]
+    return _throughput(llm._parse_json_safe, corpus, repeat)
+
+
+def bench_utils(repeat: int) -> Dict[str, Any]:
+    return {
+        "is_stop_command": _throughput(is_stop_command, STOP_SAMPLES, repeat * 200),
+        "normalize_stack": _throughput(lambda s: normalize_stack(*s), STACK_SAMPLES, repeat * 200),
+    }
+
+
+def _state(user_input: str, profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {"profile": profile or {}, "messages": [], "user_input": user_input, "history": [],
+            "internal_thoughts": [], "turn_count": 0}
+
+
+def bench_nodes(repeat: int) -> Dict[str, Any]:
+    profile = node_intake(_state(INTAKE_TEXT))["profile"]
+    cases = {
+        "intake": (node_intake, _state(INTAKE_TEXT)),
+        "factchecker": (node_factchecker, _state(ANSWERS[1], profile)),
+        "interviewer": (node_interviewer, {**_state(ANSWERS[0], profile), "system_alert": ""}),
+    }
+    out = {}
+    for name, (node, state) in cases.items():
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            node(dict(state))
+            times.append(time.perf_counter() - started)
+        out[name] = _percentiles(times)
+    return out
+
+
+def bench_turn(repeat: int) -> Dict[str, Any]:
+    out = {}
+    for use_async in (False, True):
+        graph = build_interview_graph(use_async=use_async)
+        state = _state(INTAKE_TEXT)
+        state.update(graph.invoke(state) if not use_async else asyncio.run(graph.ainvoke(state)))
+        times = []
+        for i in range(repeat):
+            state["user_input"] = ANSWERS[i % len(ANSWERS)]
+            state["internal_thoughts"] = []
+            started = time.perf_counter()
+            result = graph.invoke(state) if not use_async else asyncio.run(graph.ainvoke(state))
+            times.append(time.perf_counter() - started)
+            state["history"] = result.get("history", state["history"])
+        out["async" if use_async else "sync"] = _percentiles(times)
+    return out
+
+
+def bench_save_log(repeat: int, sizes: List[int]) -> Dict[str, Any]:
+    out = {}
+    thoughts = [{"from": "Interviewer_Agent", "to": "Interviewer_Agent", "content": "Следующая тема по стеку."},
+                {"from": "FactChecker", "to": "Interviewer_Agent", "content": "Утверждение неверно."}]
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            log = start_session("Bench")
+            for i in range(size):
+                add_turn(log, ANSWERS[i % len(ANSWERS)] * 3, thoughts, "Вопрос интервьюера " * 10)
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                path = save_log(log, filename="bench.json", out_dir=tmp)
+                times.append(time.perf_counter() - started)
+            out[str(size)] = {**_percentiles(times), "bytes": os.path.getsize(path)}
+    return out
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Регрессии: время выросло (ops_per_sec упал) больше чем на threshold."""
+    found = []
+
+    def walk(cur: Any, base: Any, path: str) -> None:
+        if isinstance(cur, dict) and isinstance(base, dict):
+            for key in cur:
+                if key in base:
+                    walk(cur[key], base[key], f"{path}.{key}" if path else key)
+            return
+        if not isinstance(cur, (int, float)) or not isinstance(base, (int, float)) or not base:
+            return
+        if path.endswith("_ms") and cur > base * (1 + threshold):
+            found.append(f"{path}: {base} -> {cur} ms")
+        elif path.endswith("ops_per_sec") and cur < base * (1 - threshold):
+            found.append(f"{path}: {base} -> {cur} ops/s")
+
+    walk(current.get("results", {}), baseline.get("results", {}), "")
+    return found
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--latency", default="fixed:0.02", help="задержка модели для замера полного хода")
+    ap.add_argument("--sizes", default="10,100,1000", help="размеры лога (ходов) для save_log")
+    ap.add_argument("--out", default=None, help="куда сохранить результат (JSON)")
+    ap.add_argument("--compare", default=None, help="JSON прошлого прогона для поиска регрессий")
+    ap.add_argument("--threshold", type=float, default=0.2, help="допустимое ухудшение (доля)")
+    args = ap.parse_args()
+
+    llm = get_llm()
+    results: Dict[str, Any] = {
+        "parse_json": bench_parse_json(args.repeat),
+        "utils": bench_utils(args.repeat),
+        "nodes": bench_nodes(args.repeat),
+    }
+    # Полный ход — с реалистичной задержкой модели
+    from fake_llm import LatencyModel
+    llm.model._latency["*"] = LatencyModel.parse(args.latency)
+    results["turn"] = bench_turn(max(5, args.repeat // 5))
+    results["save_log"] = bench_save_log(max(3, args.repeat // 10), [int(s) for s in args.sizes.split(",")])
+
+    report = {
+        "benchmark": "pipeline",
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "latency": args.latency,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"[REGRESSION] {line}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Нагрузочный генератор: N одновременных кандидатов проходят полное интервью
+(Intake -> ответы -> стоп-команда -> Reporter) на одном скомпилированном графе.
+
+Ответы берутся из встроенных персон или из записанных логов outputs/*.json.
+Провайдер по умолчанию — локальный fake (см. fake_llm.py), задержку задает
+FAKE_LLM_LATENCY. Профили запуска сессий:
+
+    burst          — все сразу
+    linear:<sec>   — равномерно в течение sec секунд
+    step:<n>:<sec> — по n сессий каждые sec секунд
+
+Примеры:
+    python -m benchmarks.loadgen --sessions 50 --concurrency 20 --profile linear:10
+    python -m benchmarks.loadgen --saturate --slo 3.0 --latency lognormal:-1,0.5
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+PERSONAS: List[Dict[str, Any]] = [
+    {
+        "intake": "Привет, я Олег, Junior Java разработчик, 1 год опыта, Spring и SQL",
+        "answers": [
+            "Переменная — именованная область памяти, int x = 10;",
+            "HashMap хранит пары ключ-значение в бакетах.",
+            "Не знаю",
+            "Spring Boot упрощает конфигурацию через автоконфигурацию.",
+        ],
+    },
+    {
+        "intake": "Меня зовут Анна, Middle Python developer, 4 года, Django, PostgreSQL, Docker",
+        "answers": [
+            "GIL не дает двум потокам одновременно исполнять байткод Python.",
+            "В Python 3.13 появилась экспериментальная сборка без GIL.",
+            "Индексы ускоряют выборки, но замедляют запись.",
+            "Образ — шаблон, контейнер — запущенный экземпляр.",
+        ],
+    },
+    {
+        "intake": "Я Сергей, Senior backend, Python и Kafka, 8 лет",
+        "answers": [
+            "Kafka гарантирует порядок только внутри партиции.",
+            "Exactly-once достигается идемпотентным продюсером и транзакциями.",
+            "Я компилирую Python напрямую в HDMI-кабель.",
+        ],
+    },
+]
+
+STOP_COMMAND = "Стоп"
+
+
+def personas_from_logs(directory: str = "outputs") -> List[Dict[str, Any]]:
+    """Персоны из записанных интервью: ответы кандидатов из turns."""
+    out = []
+    for path in sorted(glob.glob(os.path.join(directory, "interview_log_*.json"))):
+        if path.endswith(".report.json"):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        answers = [t.get("user_message", "") for t in data.get("turns", []) if t.get("user_message")]
+        if answers:
+            out.append({"intake": f"Я {data.get('participant_name', 'Кандидат')}, Middle Python developer",
+                        "answers": answers})
+    return out
+
+
+def start_offsets(profile: str, sessions: int) -> List[float]:
+    """Смещения старта сессий (секунды) для профиля нагрузки."""
+    kind, *params = profile.split(":")
+    if kind == "burst":
+        return [0.0] * sessions
+    if kind == "linear":
+        span = float(params[0]) if params else 10.0
+        return [span * i / max(1, sessions - 1) for i in range(sessions)]
+    if kind == "step":
+        per_step = int(params[0]) if params else 10
+        every = float(params[1]) if len(params) > 1 else 5.0
+        return [(i // per_step) * every for i in range(sessions)]
+    raise ValueError(f"Неизвестный профиль нагрузки: {profile}")
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "mean": round(statistics.fmean(ordered), 4)}
+
+
+class LoadRun:
+    def __init__(self, graph: Any, personas: List[Dict[str, Any]], max_answers: int,
+                 save_dir: Optional[str], seed: int) -> None:
+        self.graph = graph
+        self.personas = personas
+        self.max_answers = max_answers
+        self.save_dir = save_dir
+        self.rng = random.Random(seed)
+        self.turn_latency: List[float] = []
+        self.report_latency: List[float] = []
+        self.session_time: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.completed = 0
+        self.active = 0
+        self.peak_active = 0
+
+    async def session(self) -> None:
+        from agents.assessor import submit_turn
+        from agents.reporter import agenerate_final_feedback
+        from logger import add_turn, save_log, set_final_feedback, start_session
+        from metrics import get_metrics
+        from utils import is_stop_command
+
+        persona = self.rng.choice(self.personas)
+        answers = persona["answers"][: self.max_answers]
+        thread_id = str(uuid.uuid4())
+        config = {"configurable": {"thread_id": thread_id}}
+        state: Dict[str, Any] = {
+            "profile": {}, "messages": [], "user_input": persona["intake"], "history": [],
+            "internal_thoughts": [], "turn_count": 0, "is_finished": False,
+        }
+        log = start_session("Load Test")
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        started = time.perf_counter()
+        try:
+            # Как в app.py: ход графа, затем ответ кандидата; стоп-команда завершает цикл
+            for answer in answers + [STOP_COMMAND]:
+                t0 = time.perf_counter()
+                state.update(await self.graph.ainvoke(state, config=config))
+                self.turn_latency.append(time.perf_counter() - t0)
+                if is_stop_command(answer):
+                    break
+                thoughts = state.get("internal_thoughts", [])
+                state["internal_thoughts"] = []
+                state["history"].append({"role": "user", "content": answer})
+                state["user_input"] = answer
+                add_turn(log, answer, thoughts, state.get("ai_message", ""))
+                submit_turn(log, state.get("profile"), thread_id)
+
+            t0 = time.perf_counter()
+            set_final_feedback(log, await agenerate_final_feedback(log))
+            self.report_latency.append(time.perf_counter() - t0)
+            if self.save_dir:
+                save_log(log, filename=f"load_{thread_id}.json", out_dir=self.save_dir)
+            self.completed += 1
+            self.session_time.append(time.perf_counter() - started)
+        except Exception as e:
+            name = type(e).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+        finally:
+            self.active -= 1
+            get_metrics().session_summary(thread_id)
+
+
+async def run_load(graph: Any, personas: List[Dict[str, Any]], sessions: int, concurrency: int,
+                   profile: str, max_answers: int, save_dir: Optional[str], seed: int,
+                   trace_memory: bool) -> Dict[str, Any]:
+    run = LoadRun(graph, personas, max_answers, save_dir, seed)
+    sem = asyncio.Semaphore(concurrency)
+    offsets = start_offsets(profile, sessions)
+    if trace_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    mem_base = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+    t_start = time.perf_counter()
+
+    async def launch(offset: float) -> None:
+        await asyncio.sleep(max(0.0, offset - (time.perf_counter() - t_start)))
+        async with sem:
+            await run.session()
+
+    await asyncio.gather(*(launch(o) for o in offsets))
+    wall = time.perf_counter() - t_start
+    mem_peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    if trace_memory:
+        tracemalloc.stop()
+
+    total_errors = sum(run.errors.values())
+    result = {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "profile": profile,
+        "completed": run.completed,
+        "errors": run.errors,
+        "error_rate": round(total_errors / sessions, 4) if sessions else 0.0,
+        "wall_seconds": round(wall, 3),
+        "sessions_per_sec": round(run.completed / wall, 3) if wall else None,
+        "turns": len(run.turn_latency),
+        "turn_latency": _percentiles(run.turn_latency),
+        "report_latency": _percentiles(run.report_latency),
+        "session_seconds": _percentiles(run.session_time),
+        "peak_active_sessions": run.peak_active,
+    }
+    if trace_memory and run.peak_active:
+        result["memory_per_session_kb"] = round((mem_peak - mem_base) / run.peak_active / 1024, 1)
+    return result
+
+
+def saturate(args: argparse.Namespace, graph: Any, personas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Удваивает число одновременных сессий, пока p95 хода укладывается в SLO,
+    ошибок не больше --max-error-rate и пропускная способность растет;
+    затем уточняет точку насыщения бинарным поиском.
+    """
+    levels: List[Dict[str, Any]] = []
+
+    def probe(concurrency: int) -> Tuple[bool, Dict[str, Any]]:
+        res = asyncio.run(run_load(graph, personas, concurrency * args.sessions_per_level, concurrency,
+                                   "burst", args.answers, None, args.seed, args.trace_memory))
+        prev = max((lv["sessions_per_sec"] or 0 for lv in levels), default=0)
+        p95 = res["turn_latency"]["p95"] or 0.0
+        ok = (p95 <= args.slo and res["error_rate"] <= args.max_error_rate
+              and (res["sessions_per_sec"] or 0) >= prev * (1 + args.min_gain))
+        levels.append({**res, "ok": ok})
+        print(f"[Load] concurrency={concurrency}: {res['sessions_per_sec']} sess/s, "
+              f"p95 хода {p95}s, ошибок {res['error_rate']:.1%} -> {'OK' if ok else 'насыщение'}")
+        return ok, res
+
+    good, bad = 0, None
+    concurrency = args.concurrency
+    while concurrency <= args.max_concurrency:
+        ok, _ = probe(concurrency)
+        if not ok:
+            bad = concurrency
+            break
+        good = concurrency
+        concurrency *= 2
+    if bad is not None and good:
+        lo, hi = good, bad
+        while hi - lo > max(1, lo // 8):
+            mid = (lo + hi) // 2
+            ok, _ = probe(mid)
+            lo, hi = (mid, hi) if ok else (lo, mid)
+        good = lo
+    return {"saturation_concurrency": good, "limit_reached": bad is not None, "levels": levels}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--provider", default="fake", help="LLM_PROVIDER (по умолчанию локальный fake)")
+    ap.add_argument("--latency", default=None, help="FAKE_LLM_LATENCY, например lognormal:-1,0.5")
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--profile", default="burst", help="burst | linear:<sec> | step:<n>:<sec>")
+    ap.add_argument("--answers", type=int, default=4, help="ответов кандидата до стоп-команды")
+    ap.add_argument("--personas", default="builtin", help="builtin | logs | all")
+    ap.add_argument("--save-logs", default=None, help="каталог для логов сессий (по умолчанию не сохранять)")
+    ap.add_argument("--speculative", action="store_true", help="граф со спекулятивным интервьюером")
+    ap.add_argument("--trace-memory", action="store_true", help="память на сессию через tracemalloc (медленнее)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--saturate", action="store_true", help="поиск точки насыщения")
+    ap.add_argument("--slo", type=float, default=5.0, help="допустимый p95 хода, сек")
+    ap.add_argument("--max-error-rate", type=float, default=0.01)
+    ap.add_argument("--min-gain", type=float, default=0.05, help="минимальный прирост sess/s при удвоении")
+    ap.add_argument("--max-concurrency", type=int, default=1024)
+    ap.add_argument("--sessions-per-level", type=int, default=2, help="сессий на один слот при поиске насыщения")
+    ap.add_argument("--out", default=None, help="куда сохранить результат (JSON)")
+    args = ap.parse_args()
+
+    # Окружение задается до импорта модулей проекта
+    os.environ["LLM_PROVIDER"] = args.provider
+    if args.latency:
+        os.environ["FAKE_LLM_LATENCY"] = args.latency
+    os.environ.setdefault("JOURNAL_ENABLED", "false")
+    os.environ.setdefault("PREROUTER_DATA_PATH", "")
+    os.environ.setdefault("CLAIM_INDEX_PATH", "")
+
+    from graph import build_interview_graph
+
+    personas = {"builtin": PERSONAS, "logs": personas_from_logs(), "all": PERSONAS + personas_from_logs()}[args.personas]
+    if not personas:
+        raise SystemExit("Нет персон: outputs/*.json пуст, используйте --personas builtin")
+    graph = build_interview_graph(use_async=True, speculative=args.speculative)
+
+    if args.saturate:
+        result = saturate(args, graph, personas)
+    else:
+        result = asyncio.run(run_load(graph, personas, args.sessions, args.concurrency, args.profile,
+                                      args.answers, args.save_logs, args.seed, args.trace_memory))
+    result = {"benchmark": "loadgen", "provider": args.provider,
+              "latency": os.getenv("FAKE_LLM_LATENCY"), **result}
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
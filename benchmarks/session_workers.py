@@ -0,0 +1,168 @@
+"""
+Проверка хранилища сессий (session_store.py) на нескольких процессах:
+одно интервью ведут разные воркеры через общий SQLite-файл.
+
+Режимы:
+  handoff — каждый ход выполняет новый процесс: сессию подхватывает
+            воркер, который ее не начинал;
+  race    — N процессов одновременно пытаются сделать следующий ход;
+            запись выигрывает один, остальные получают SessionConflictError
+            и пересчитывают ход от свежего состояния.
+
+После прогона проверяется, что ни один ход не потерян и не записан дважды:
+версия сессии, лог и история совпадают со сценарием ответов.
+Выход с кодом 1 при расхождении.
+
+Запуск: python -m benchmarks.session_workers [--mode both] [--workers 4] [--latency uniform:0.005,0.03]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List
+
+INTAKE_TEXT = "Привет, я Анна, Middle Python developer, 4 года, Django, PostgreSQL, Docker"
+ANSWERS = [
+    "GIL не дает потокам выполнять байткод параллельно.",
+    "Django ORM строит SQL лениво, запрос выполняется при итерации.",
+    "Не знаю",
+    "Индекс в PostgreSQL — B-дерево по умолчанию.",
+    "Docker-образ собирается слоями, слои кешируются.",
+    "asyncio подходит для I/O, а не для CPU-задач.",
+]
+
+
+def _worker(db: str, thread_id: str, latency: str, max_steps: int, out: "multiprocessing.Queue") -> None:
+    # Провайдер и побочные файлы настраиваются до импорта модулей проекта
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = latency
+    os.environ["FAKE_LLM_SEED"] = str(os.getpid())
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+    os.environ.setdefault("JOURNAL_ENABLED", "false")
+    os.environ.setdefault("PREROUTER_DATA_PATH", "")
+    os.environ.setdefault("CLAIM_INDEX_PATH", "")
+
+    from graph import build_interview_graph
+    from logger import add_turn, start_session
+    from session_store import SessionConflictError, SQLiteSessionStore
+
+    store = SQLiteSessionStore(db)
+    graph = build_interview_graph()
+    committed: List[int] = []
+    conflicts = steps = 0
+
+    while max_steps <= 0 or steps < max_steps:
+        session = store.load(thread_id)
+        if session is None:
+            # Intake: сессию создает тот, кто первым запишет версию 1
+            log, version = start_session("Session Workers"), 0
+            state = {"profile": {}, "user_input": INTAKE_TEXT, "history": [{"role": "user", "content": INTAKE_TEXT}],
+                     "internal_thoughts": [], "turn_count": 0}
+        else:
+            log, version, saved = session["log"], session["version"], session["state"]
+            turn = saved.get("turn_count", 0)
+            if turn >= len(ANSWERS):
+                break
+            answer = ANSWERS[turn]
+            # Ход как в app.py: вопрос прошлого хода + ответ + мысли попадают в лог
+            add_turn(log, answer, saved.get("internal_thoughts", []), saved.get("ai_message", ""))
+            state = {**saved, "user_input": answer, "internal_thoughts": [], "turn_count": turn + 1,
+                     "history": saved.get("history", []) + [{"role": "user", "content": answer}]}
+
+        state.update(graph.invoke(state))
+        steps += 1
+        try:
+            store.save(thread_id, state, log, version)
+            committed.append(version + 1)
+        except SessionConflictError:
+            conflicts += 1
+
+    store.close()
+    out.put({"pid": os.getpid(), "committed": committed, "conflicts": conflicts})
+
+
+def _spawn(ctx: Any, n: int, db: str, thread_id: str, latency: str, max_steps: int) -> List[Dict[str, Any]]:
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(db, thread_id, latency, max_steps, out)) for _ in range(n)]
+    for p in procs:
+        p.start()
+    results = [out.get(timeout=300) for _ in procs]
+    for p in procs:
+        p.join()
+    return results
+
+
+def verify(db: str, thread_id: str, workers: List[Dict[str, Any]]) -> List[str]:
+    """Расхождения итоговой сессии со сценарием (пустой список — все сошлось)."""
+    from session_store import SQLiteSessionStore
+
+    store = SQLiteSessionStore(db)
+    session = store.load(thread_id)
+    store.close()
+    if session is None:
+        return ["сессия не записана"]
+
+    errors = []
+    expected_version = len(ANSWERS) + 1
+    if session["version"] != expected_version:
+        errors.append(f"версия {session['version']}, ожидалась {expected_version}")
+    user_messages = [t["user_message"] for t in session["log"]["turns"]]
+    if user_messages != ANSWERS:
+        errors.append(f"ответы в логе не совпадают со сценарием: {user_messages}")
+    history = session["state"].get("history", [])
+    roles = [m["role"] for m in history]
+    if roles != ["user", "assistant"] * expected_version:
+        errors.append(f"история нарушена: {roles}")
+    if [m["content"] for m in history if m["role"] == "user"] != [INTAKE_TEXT] + ANSWERS:
+        errors.append("реплики кандидата в истории потеряны или задвоены")
+    versions = sorted(v for w in workers for v in w["committed"])
+    if versions != list(range(1, expected_version + 1)):
+        errors.append(f"записанные версии {versions}")
+    return errors
+
+
+def run_mode(mode: str, workers: int, latency: str) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "sessions.sqlite3")
+        thread_id = str(uuid.uuid4())
+        started = time.perf_counter()
+        if mode == "handoff":
+            # Один процесс — один ход: каждый следующий воркер видит сессию впервые
+            results = []
+            for _ in range(len(ANSWERS) + 1):
+                results.extend(_spawn(ctx, 1, db, thread_id, latency, max_steps=1))
+        else:
+            results = _spawn(ctx, workers, db, thread_id, latency, max_steps=0)
+        elapsed = time.perf_counter() - started
+        errors = verify(db, thread_id, results)
+    return {
+        "mode": mode,
+        "processes": len(results),
+        "writers": len({r["pid"] for r in results if r["committed"]}),
+        "conflicts": sum(r["conflicts"] for r in results),
+        "elapsed_s": round(elapsed, 2),
+        "ok": not errors,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("handoff", "race", "both"), default="both")
+    ap.add_argument("--workers", type=int, default=4, help="число процессов в режиме race")
+    ap.add_argument("--latency", default="uniform:0.005,0.03", help="задержка fake-модели (FAKE_LLM_LATENCY)")
+    args = ap.parse_args()
+
+    modes = ("handoff", "race") if args.mode == "both" else (args.mode,)
+    report = [run_mode(mode, args.workers, args.latency) for mode in modes]
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not all(r["ok"] for r in report):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
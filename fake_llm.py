@@ -0,0 +1,356 @@
+"""
+Локальный детерминированный провайдер LLM_PROVIDER=fake — для бенчмарков,
+нагрузочных прогонов и работы без сети.
+
+Ответы берутся из записи (FAKE_LLM_RECORDINGS — JSONL, который пишет
+LLMService при LLM_RECORD_PATH) или генерируются по сценарию: агент
+определяется по системному промпту, ответ зависит только от текста запроса
+и FAKE_LLM_SEED. Задержка задается распределением:
+
+    FAKE_LLM_LATENCY=fixed:0.8 | uniform:0.3,1.5 | normal:1.0,0.2 | lognormal:-0.2,0.4
+    FAKE_LLM_LATENCY_INTERVIEWER=lognormal:0.3,0.3   # переопределение для агента
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from utils import ALLOWED_STACK
+
+# Маркеры системных промптов агентов (порядок важен: конспект части лога
+# тоже упоминает Tech Lead)
+AGENT_MARKERS: Sequence[Tuple[str, str]] = (
+    ("Intake_Agent", "intake"),
+    ("ассессор технического интервью", "assessor"),
+    ("генератор банка вопросов", "question_bank"),
+    ("Router для FactChecker", "factcheck_router"),
+    ("FactChecker_Agent", "factcheck"),
+    ("ЧАСТЬ лога", "reporter_map"),
+    ("Tech Lead", "reporter"),
+    ("краткую сводку", "memory"),
+    ("Технический Интервьюер", "interviewer"),
+)
+
+QUESTIONS = {
+    "python": ["Чем list отличается от tuple?", "Что такое GIL и на что он влияет?",
+               "Как работают генераторы?", "Зачем нужны декораторы?"],
+    "java": ["Чем интерфейс отличается от абстрактного класса?", "Как устроен HashMap?",
+             "Что такое JVM и JIT?", "Как работает сборщик мусора?"],
+    "sql": ["Какие бывают JOIN?", "Зачем нужны индексы?", "Что такое транзакция и ACID?"],
+    "docker": ["Чем образ отличается от контейнера?", "Что такое слой образа?"],
+}
+DEFAULT_QUESTIONS = ["Расскажите о последнем проекте.", "Как вы тестируете свой код?",
+                     "Как вы ищете причину бага в проде?"]
+
+_NAME_RE = re.compile(r"(?:меня зовут|я)\s+([A-ZА-ЯЁ][a-zа-яё]+)", re.IGNORECASE)
+_GRADE_RE = re.compile(r"\b(junior|middle|senior|lead)\b", re.IGNORECASE)
+_YEARS_RE = re.compile(r"(\d+)\s*(?:год|лет|year)", re.IGNORECASE)
+_VERSION_RE = re.compile(r"\d+\.\d+|\bверси\w*|\bрелиз\w*")
+
+
+def messages_key(pairs: Sequence[Tuple[str, str]]) -> str:
+    """Ключ записи: хеш ролей и текстов сообщений."""
+    raw = json.dumps([[r, " ".join(str(c).split())] for r, c in pairs], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _pairs(messages: Sequence[BaseMessage]) -> List[Tuple[str, str]]:
+    roles = {"system": "system", "human": "user", "ai": "assistant"}
+    return [(roles.get(m.type, m.type), str(m.content)) for m in messages]
+
+
+class LatencyModel:
+    """Распределение задержки ответа (секунды)."""
+
+    def __init__(self, kind: str = "fixed", params: Sequence[float] = (0.0,)) -> None:
+        self.kind = kind
+        self.params = tuple(params)
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> "LatencyModel":
+        if not spec:
+            return cls()
+        kind, _, raw = spec.partition(":")
+        params = [float(p) for p in raw.split(",") if p.strip()] or [0.0]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Неизвестное распределение задержки: {spec}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "uniform":
+            value = rng.uniform(p[0], p[1] if len(p) > 1 else p[0])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1] if len(p) > 1 else 0.0)
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(p[0], p[1] if len(p) > 1 else 0.0)
+        else:
+            value = p[0]
+        return max(0.0, value)
+
+
+def load_recordings(path: Optional[str]) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    if not path or not os.path.exists(path):
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                out[rec["key"]] = rec["response"]
+            except (ValueError, KeyError, TypeError):
+                continue
+    return out
+
+
+_record_lock = threading.Lock()
+
+
+def record_response(path: str, pairs: Sequence[Tuple[str, str]], response: str) -> None:
+    """Дописывает пару запрос -> ответ реального провайдера (для последующего воспроизведения)."""
+    line = json.dumps({"key": messages_key(pairs), "response": response}, ensure_ascii=False)
+    with _record_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def detect_agent(system_prompt: str) -> str:
+    for marker, agent in AGENT_MARKERS:
+        if marker in system_prompt:
+            return agent
+    return "unknown"
+
+
+class FakeChatModel(BaseChatModel):
+    """Чат-модель без сети: запись или сценарий + задержка из распределения."""
+
+    seed: int = 0
+    latency: str = "fixed:0"
+    agent_latency: Dict[str, str] = {}
+    alert_rate: float = 0.2
+    recordings_path: Optional[str] = None
+    chunk_size: int = 12
+
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: Any = PrivateAttr()
+    _latency: Dict[str, LatencyModel] = PrivateAttr()
+    _recordings: Dict[str, str] = PrivateAttr()
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+        self._latency = {"*": LatencyModel.parse(self.latency)}
+        self._latency.update({a: LatencyModel.parse(s) for a, s in self.agent_latency.items()})
+        self._recordings = load_recordings(self.recordings_path)
+
+    @classmethod
+    def from_env(cls) -> "FakeChatModel":
+        prefix = "FAKE_LLM_LATENCY_"
+        agent_latency = {k[len(prefix):].lower(): v for k, v in os.environ.items() if k.startswith(prefix)}
+        return cls(
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+            latency=os.getenv("FAKE_LLM_LATENCY", "fixed:0"),
+            agent_latency=agent_latency,
+            alert_rate=float(os.getenv("FAKE_LLM_ALERT_RATE", "0.2")),
+            recordings_path=os.getenv("FAKE_LLM_RECORDINGS") or None,
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    # --- Ответ и задержка ---
+
+    def _delay(self, agent: str) -> float:
+        model = self._latency.get(agent, self._latency["*"])
+        with self._rng_lock:
+            return model.sample(self._rng)
+
+    def respond(self, messages: Sequence[BaseMessage]) -> Tuple[str, str]:
+        """(агент, текст ответа) для запроса."""
+        pairs = _pairs(messages)
+        system = next((c for r, c in pairs if r == "system"), "")
+        agent = detect_agent(system)
+        recorded = self._recordings.get(messages_key(pairs))
+        if recorded is not None:
+            return agent, recorded
+        user = next((c for r, c in reversed(pairs) if r == "user"), "")
+        # Служебная приписка chat_json не относится к тексту кандидата
+        user = user.split("\n\nВАЖНО:", 1)[0]
+        rng = random.Random(f"{self.seed}:{messages_key(pairs)}")
+        return agent, _SCRIPTS.get(agent, _script_default)(self, system, user, rng)
+
+    # --- BaseChatModel ---
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        agent, text = self.respond(messages)
+        time.sleep(self._delay(agent))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        agent, text = self.respond(messages)
+        await asyncio.sleep(self._delay(agent))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _pieces(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        agent, text = self.respond(messages)
+        pieces = self._pieces(text)
+        # Треть задержки — до первого куска, остальное равномерно между кусками
+        total = self._delay(agent)
+        time.sleep(total / 3)
+        for piece in pieces:
+            time.sleep(total * 2 / 3 / len(pieces))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        agent, text = self.respond(messages)
+        pieces = self._pieces(text)
+        total = self._delay(agent)
+        await asyncio.sleep(total / 3)
+        for piece in pieces:
+            await asyncio.sleep(total * 2 / 3 / len(pieces))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+
+# --- Сценарии ответов по агентам ---
+
+def _stack_from(text: str) -> List[str]:
+    """Технологии из словаря в порядке упоминания."""
+    low = text.lower()
+    found = []
+    for tech in ALLOWED_STACK:
+        m = re.search(rf"\b{re.escape(tech)}\b", low)
+        if m:
+            found.append((m.start(), tech))
+    return [tech for _, tech in sorted(found)]
+
+
+def _script_intake(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    name = _NAME_RE.search(user)
+    grade = _GRADE_RE.search(user)
+    years = _YEARS_RE.search(user)
+    stack = _stack_from(user) or ["python"]
+    profile = {
+        "name": name.group(1) if name else "Кандидат",
+        "target_role": f"{stack[0].capitalize()} Developer",
+        "grade": grade.group(1).capitalize() if grade else None,
+        "years_experience": int(years.group(1)) if years else None,
+        "stack": stack,
+        "experience_text": user[:200],
+        "unknowns": [] if grade else ["grade"],
+    }
+    return json.dumps(profile, ensure_ascii=False)
+
+
+def _script_router(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    should = bool(_VERSION_RE.search(user.lower())) or len(user.split()) > 12
+    return json.dumps({"should_factcheck": should, "reason": "fake"}, ensure_ascii=False)
+
+
+def _script_factcheck(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    if rng.random() < model.alert_rate:
+        return json.dumps({"alert": True, "content": "Утверждение кандидата неверно (fake)."}, ensure_ascii=False)
+    return json.dumps({"alert": False, "content": "OK"}, ensure_ascii=False)
+
+
+def _script_interviewer(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    stack_line = re.search(r"Стек технологий:\s*(.+)", system)
+    stack = _stack_from(stack_line.group(1)) if stack_line else []
+    pool = [q for t in stack for q in QUESTIONS.get(t, [])] or DEFAULT_QUESTIONS
+    question = rng.choice(pool)
+    return json.dumps({"thought": "Следующая тема по стеку кандидата (fake).",
+                       "message": f"Понял. {question}"}, ensure_ascii=False)
+
+
+def _script_memory(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    return "- Обсуждали базовые темы стека.\n- Кандидат отвечает уверенно (fake)."
+
+
+def _script_reporter_map(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    return "- ТЕМЫ: базовые вопросы.\n- ВЕРНО: большинство.\n- ОШИБКИ: нет.\n- FACTCHECKER: нет."
+
+
+def _script_reporter(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    verdict = rng.choice(["Hire", "No Hire"])
+    return (
+        "ВЕРДИКТ\nОцененный грейд: Middle\n"
+        f"Рекомендация: {verdict}\nУровень уверенности: 70%\n\n"
+        "ТЕХНИЧЕСКИЙ АНАЛИЗ (Hard Skills)\nConfirmed Skills: базовые темы стека\n"
+        "Knowledge Gaps: нет\n\nSOFT SKILLS & COMMUNICATION\n- Ясность изложения: хорошая\n\n"
+        "ROADMAP (Что учить)\n- Углубить знания стека."
+    )
+
+
+def _script_assessor(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    question = re.search(r"ВОПРОС:\s*(.+)", user)
+    answer = re.search(r"ОТВЕТ:\s*(.+)", user)
+    # Тема — последнее вопросительное предложение реплики интервьюера
+    asked = re.findall(r"([^.!?]+)\?", question.group(1)) if question else []
+    topic = " ".join((asked[-1] if asked else "вопрос").split()[:4])
+    answer_text = (answer.group(1) if answer else "").lower()
+    if "не знаю" in answer_text or not answer_text.strip():
+        verdict = "no_answer"
+    elif "FACTCHECKER:" in user:
+        verdict = "wrong"
+    else:
+        verdict = rng.choice(["correct", "correct", "partial", "wrong"])
+    missed = verdict != "correct"
+    return json.dumps({
+        "topic": topic,
+        "verdict": verdict,
+        "skill": "" if verdict in ("wrong", "no_answer") else topic,
+        "gap": topic if missed else "",
+        "correct_answer": f"Краткий правильный ответ про {topic} (fake)." if missed else "",
+        "grade_signal": rng.choice(["Junior", "Middle", "Middle", "Senior"]),
+        "clarity": rng.randint(3, 5),
+        "resource": "",
+    }, ensure_ascii=False)
+
+
+def _script_question_bank(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    tech = re.search(r"Технология:\s*([^.\n]+)\.", system)
+    grade = re.search(r"Грейд кандидата:\s*(\w+)", system)
+    count = re.search(r"Составь\s+(\d+)", system)
+    tech_name = tech.group(1).strip() if tech else "Python"
+    level = grade.group(1) if grade else "Middle"
+    base = [q for q in QUESTIONS.get(tech_name.lower(), []) if q.endswith("?")]
+    base += [f"Как бы вы объяснили тему {i} по {tech_name} кандидату уровня {level}?" for i in range(1, 40)]
+    n = int(count.group(1)) if count else 10
+    return json.dumps({"questions": [{"topic": f"{tech_name} {i + 1}", "question": q}
+                                     for i, q in enumerate(base[:n])]}, ensure_ascii=False)
+
+
+def _script_default(model: FakeChatModel, system: str, user: str, rng: random.Random) -> str:
+    return "OK"
+
+
+_SCRIPTS = {
+    "intake": _script_intake,
+    "factcheck_router": _script_router,
+    "factcheck": _script_factcheck,
+    "interviewer": _script_interviewer,
+    "memory": _script_memory,
+    "reporter_map": _script_reporter_map,
+    "reporter": _script_reporter,
+    "assessor": _script_assessor,
+    "question_bank": _script_question_bank,
+}
@@ -1,10 +1,30 @@
+import os
+import asyncio
+import contextvars
 import operator
-from typing import Annotated, Any, Dict, List, TypedDict, Union, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Any, Awaitable, Callable, Dict, List, Tuple, TypedDict, Union, Optional
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
 
-from agents.intake import run_intake
-from agents.factchecker import run_factcheck
-from agents.interviewer import run_interviewer_turn
+from agents.intake import run_intake, arun_intake
+from agents.factchecker import run_factcheck, arun_factcheck
+from agents.interviewer import run_interviewer_turn, arun_interviewer_turn
+from agents.memory import update_memory, aupdate_memory
+from agents.question_bank import mark_asked
+from metrics import instrument_node
+
+# Первый узел хода (intake или factchecker) начинает свое обновление internal_thoughts
+# с этой метки: мысли прошлых ходов сбрасываются в самом состоянии, и чекпойнтер
+# не копит их всю сессию
+TURN_START = {"from": "__turn__", "content": ""}
+
+def add_turn_thoughts(left: List[Dict[str, str]], right: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    right = right or []
+    if right and right[0] == TURN_START:
+        return list(right[1:])
+    return (left or []) + right
 
 class InterviewState(TypedDict):
     messages: List[Dict[str, str]]
@@ -13,82 +33,290 @@ class InterviewState(TypedDict):
     interview_log: List[Any]
     turn_count: int
     final_feedback: Optional[str]
-    history: List[Dict[str, str]]
-    internal_thoughts: Annotated[List[Dict[str, str]], operator.add]
+    # Узлы и вызывающий код передают только новые реплики, склейка — в редьюсере.
+    # С чекпойнтером (см. ui.py) ход отправляет одно сообщение, а не всю историю
+    history: Annotated[List[Dict[str, str]], operator.add]
+    # Мысли агентов за текущий ход (см. TURN_START)
+    internal_thoughts: Annotated[List[Dict[str, str]], add_turn_thoughts]
     system_alert: str
     ai_message: str
     final_report: str
     is_finished: bool
+    draft_response: Dict[str, str]
+    stream_tokens: bool
+    memory: Dict[str, Any]
 
-def node_intake(state: InterviewState) -> Dict[str, Any]:
-    print("Intake_Agent извлекает данные профиля...")
-    user_text = state.get("user_input", "")
-    new_profile = run_intake(user_text)
-    
+# Счетчики спекулятивного режима: hit — черновик интервьюера принят как есть,
+# miss — FactChecker поднял алерт и ответ пришлось перегенерировать
+_speculation_lock = threading.Lock()
+_speculation_stats = {"hits": 0, "misses": 0}
+
+def _count_speculation(hit: bool) -> None:
+    with _speculation_lock:
+        _speculation_stats["hits" if hit else "misses"] += 1
+
+def get_speculation_stats() -> Dict[str, Any]:
+    with _speculation_lock:
+        hits, misses = _speculation_stats["hits"], _speculation_stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
+
+def reset_speculation_stats() -> None:
+    with _speculation_lock:
+        _speculation_stats["hits"] = 0
+        _speculation_stats["misses"] = 0
+
+# Сводка истории (agents/memory.py) считается параллельно с ответом интервьюера:
+# обоим нужна только история до текущего хода, ответ ее не ждет
+_memory_pool: Optional[ThreadPoolExecutor] = None
+_memory_pool_lock = threading.Lock()
+
+def _get_memory_pool() -> ThreadPoolExecutor:
+    global _memory_pool
+    if _memory_pool is None:
+        with _memory_pool_lock:
+            if _memory_pool is None:
+                _memory_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memory")
+    return _memory_pool
+
+def _with_memory(state: InterviewState, turn: Callable[[], Dict[str, str]]) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    # copy_context: вызов сводки привязывается к сессии метрик так же, как вызов интервьюера
+    future = _get_memory_pool().submit(
+        contextvars.copy_context().run, update_memory, state.get("history", []), state.get("memory")
+    )
+    resp = turn()
+    return resp, future.result()
+
+async def _awith_memory(state: InterviewState, turn: Awaitable[Dict[str, str]]) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    resp, memory = await asyncio.gather(turn, aupdate_memory(state.get("history", []), state.get("memory")))
+    return resp, memory
+
+def _intake_updates(new_profile: Dict[str, Any]) -> Dict[str, Any]:
     if not new_profile.get("stack"):
         role_lower = str(new_profile.get("target_role", "")).lower()
         if any(word in role_lower for word in ["architect", "lead", "expert", "senior"]):
             new_profile["stack"] = ["System Design", "Distributed Systems", "Highload"]
-    
+
     print(f"[DEBUG] Профиль обновлен: {new_profile}")
-    
+
     return {
         "profile": new_profile,
-        "internal_thoughts": [{"from": "Intake_Agent", "content": "Profile parsed"}]
+        "internal_thoughts": [TURN_START, {"from": "Intake_Agent", "content": "Profile parsed"}]
     }
 
+def node_intake(state: InterviewState) -> Dict[str, Any]:
+    print("Intake_Agent извлекает данные профиля...")
+    user_text = state.get("user_input", "")
+    return _intake_updates(run_intake(user_text))
+
+async def anode_intake(state: InterviewState) -> Dict[str, Any]:
+    print("Intake_Agent извлекает данные профиля...")
+    user_text = state.get("user_input", "")
+    return _intake_updates(await arun_intake(user_text))
+
 def route_starting_step(state: InterviewState) -> str:
     if not state.get("profile", {}).get("name"):
         return "intake"
     return "factchecker"
 
-def node_factchecker(state: InterviewState) -> Dict[str, Any]:
-    print("FactChecker проверяет факты...")
-    user_text = state.get("user_input", "")
-    if not user_text or user_text == "...":
-        return {"system_alert": ""}
-        
-    fc_res = run_factcheck(user_text)
-    updates = {"system_alert": ""}
+def _needs_factcheck(user_text: str) -> bool:
+    return bool(user_text) and user_text != "..."
+
+def _factcheck_updates(fc_res: Dict[str, Any]) -> Dict[str, Any]:
+    updates = {"system_alert": "", "internal_thoughts": [TURN_START]}
     if fc_res.get("alert"):
         content = fc_res.get("content", "Alert")
-        updates["internal_thoughts"] = [{"from": "FactChecker", "content": content}]
+        updates["internal_thoughts"].append({"from": "FactChecker", "content": content})
         updates["system_alert"] = f"[SYSTEM ALERT: {content}] "
     return updates
 
+def node_factchecker(state: InterviewState) -> Dict[str, Any]:
+    print("FactChecker проверяет факты...")
+    user_text = state.get("user_input", "")
+    if not _needs_factcheck(user_text):
+        return _factcheck_updates({})
+    return _factcheck_updates(run_factcheck(user_text))
+
+async def anode_factchecker(state: InterviewState) -> Dict[str, Any]:
+    print("FactChecker проверяет факты...")
+    user_text = state.get("user_input", "")
+    if not _needs_factcheck(user_text):
+        return _factcheck_updates({})
+    return _factcheck_updates(await arun_factcheck(user_text))
+
+def _interviewer_updates(state: InterviewState, resp: Dict[str, str]) -> Dict[str, Any]:
+    ai_msg_text = resp["message"]
+    # Реплика уходит кандидату: вопросы банка в ней считаются выданными
+    mark_asked(state.get("profile", {}), ai_msg_text)
+
+    return {
+        "internal_thoughts": [{"from": "Interviewer", "content": resp.get("thought", "")}],
+        "ai_message": ai_msg_text,
+        "history": [{"role": "assistant", "content": ai_msg_text}]
+    }
+
+def _message_delta_writer(state: InterviewState) -> Optional[Callable[[str], None]]:
+    """
+    При stream_tokens=True текст ответа интервьюера уходит в custom-поток графа
+    (stream_mode="custom") событиями {"interviewer_delta": "..."}.
+    """
+    if not state.get("stream_tokens"):
+        return None
+    writer = get_stream_writer()
+    return lambda delta: writer({"interviewer_delta": delta})
+
 def node_interviewer(state: InterviewState) -> Dict[str, Any]:
     print("Interviewer думает...")
     alert = state.get("system_alert", "")
     user_input = state.get("user_input", "")
     full_text = alert + user_input
-    
-    resp = run_interviewer_turn(
+
+    on_delta = _message_delta_writer(state)
+    resp, memory = _with_memory(state, lambda: run_interviewer_turn(
         user_text=full_text,
         history_context=state.get("history", []),
-        profile=state.get("profile", {})
-    )
-    
-    ai_msg_text = resp["message"]
-    
-    return {
-        "internal_thoughts": [{"from": "Interviewer", "content": resp.get("thought", "")}],
-        "ai_message": ai_msg_text,
-        "history": state.get("history", []) + [{"role": "assistant", "content": ai_msg_text}]
-    }
+        profile=state.get("profile", {}),
+        on_message_delta=on_delta,
+        memory=state.get("memory")
+    ))
+    updates = _interviewer_updates(state, resp)
+    updates["memory"] = memory
+    return updates
+
+async def anode_interviewer(state: InterviewState) -> Dict[str, Any]:
+    print("Interviewer думает...")
+    alert = state.get("system_alert", "")
+    user_input = state.get("user_input", "")
+    full_text = alert + user_input
+
+    resp, memory = await _awith_memory(state, arun_interviewer_turn(
+        user_text=full_text,
+        history_context=state.get("history", []),
+        profile=state.get("profile", {}),
+        on_message_delta=_message_delta_writer(state),
+        memory=state.get("memory")
+    ))
+    updates = _interviewer_updates(state, resp)
+    updates["memory"] = memory
+    return updates
+
+# --- Спекулятивный режим: FactChecker и черновик Interviewer параллельно ---
+
+def route_speculative_step(state: InterviewState) -> Union[str, List[str]]:
+    if route_starting_step(state) == "intake":
+        return "intake"
+    return ["factchecker", "interviewer_draft"]
+
+# Сводка обновляется вместе с черновиком: принятому черновику она уже не мешает,
+# а при перегенерации update_memory видит свежую сводку и повторно LLM не вызывает
+
+def node_interviewer_draft(state: InterviewState) -> Dict[str, Any]:
+    print("Interviewer готовит черновик...")
+    resp, memory = _with_memory(state, lambda: run_interviewer_turn(
+        user_text=state.get("user_input", ""),
+        history_context=state.get("history", []),
+        profile=state.get("profile", {}),
+        memory=state.get("memory")
+    ))
+    return {"draft_response": resp, "memory": memory}
+
+async def anode_interviewer_draft(state: InterviewState) -> Dict[str, Any]:
+    print("Interviewer готовит черновик...")
+    resp, memory = await _awith_memory(state, arun_interviewer_turn(
+        user_text=state.get("user_input", ""),
+        history_context=state.get("history", []),
+        profile=state.get("profile", {}),
+        memory=state.get("memory")
+    ))
+    return {"draft_response": resp, "memory": memory}
+
+def _accept_draft(state: InterviewState) -> Optional[Dict[str, str]]:
+    """Возвращает черновик, если он пригоден без перегенерации."""
+    draft = state.get("draft_response") or {}
+    if not draft:
+        # Ход после Intake: черновика не было, это не спекуляция
+        return None
+    if state.get("system_alert"):
+        _count_speculation(hit=False)
+        return None
+    _count_speculation(hit=True)
+    return draft
+
+def _emit_draft(state: InterviewState, draft: Dict[str, str]) -> Dict[str, Any]:
+    # Черновик не стримится (он мог быть отброшен), принятый отдаем одним куском
+    on_delta = _message_delta_writer(state)
+    if on_delta is not None:
+        on_delta(draft["message"])
+    return _interviewer_updates(state, draft)
+
+def node_interviewer_speculative(state: InterviewState) -> Dict[str, Any]:
+    draft = _accept_draft(state)
+    if draft:
+        updates = _emit_draft(state, draft)
+    else:
+        updates = node_interviewer(state)
+    updates["draft_response"] = {}
+    return updates
+
+async def anode_interviewer_speculative(state: InterviewState) -> Dict[str, Any]:
+    draft = _accept_draft(state)
+    if draft:
+        updates = _emit_draft(state, draft)
+    else:
+        updates = await anode_interviewer(state)
+    updates["draft_response"] = {}
+    return updates
+
+def build_interview_graph(use_async: bool = False, speculative: Optional[bool] = None,
+                          checkpointer: Optional[Any] = None):
+    """
+    Собирает граф интервью.
+    use_async=True — узлы на корутинах, граф запускается через ainvoke/astream
+    и не занимает поток на время запросов к LLM.
+    speculative=True — FactChecker и черновик Interviewer выполняются параллельно,
+    ответ перегенерируется с system_alert только при алерте
+    (по умолчанию берется из SPECULATIVE_INTERVIEWER).
+    checkpointer — хранилище состояния по thread_id: с ним на вход хода
+    достаточно передать только новое сообщение пользователя.
+    """
+    if speculative is None:
+        speculative = os.getenv("SPECULATIVE_INTERVIEWER", "false").lower() == "true"
+
+    if use_async:
+        intake, factchecker, interviewer = anode_intake, anode_factchecker, anode_interviewer
+        draft, finalize = anode_interviewer_draft, anode_interviewer_speculative
+    else:
+        intake, factchecker, interviewer = node_intake, node_factchecker, node_interviewer
+        draft, finalize = node_interviewer_draft, node_interviewer_speculative
+
+    # Каждый узел замеряется (metrics.py): время и привязка вызовов LLM к сессии
+    def add_node(name: str, fn: Callable[..., Any]) -> None:
+        workflow.add_node(name, instrument_node(name, fn, is_async=use_async))
 
-def build_interview_graph():
     workflow = StateGraph(InterviewState)
-    workflow.add_node("intake", node_intake)
-    workflow.add_node("factchecker", node_factchecker)
-    workflow.add_node("interviewer", node_interviewer)
-    
+    add_node("intake", intake)
+    add_node("factchecker", factchecker)
+
+    if not speculative:
+        add_node("interviewer", interviewer)
+        workflow.set_conditional_entry_point(
+            route_starting_step,
+            {"intake": "intake", "factchecker": "factchecker"}
+        )
+        workflow.add_edge("intake", "interviewer")
+        workflow.add_edge("factchecker", "interviewer")
+        workflow.add_edge("interviewer", END)
+        return workflow.compile(checkpointer=checkpointer)
+
+    add_node("interviewer_draft", draft)
+    add_node("interviewer", finalize)
     workflow.set_conditional_entry_point(
-        route_starting_step,
-        {"intake": "intake", "factchecker": "factchecker"}
+        route_speculative_step,
+        ["intake", "factchecker", "interviewer_draft"]
     )
-    
     workflow.add_edge("intake", "interviewer")
-    workflow.add_edge("factchecker", "interviewer")
+    # Узел interviewer ждет завершения обеих веток
+    workflow.add_edge(["factchecker", "interviewer_draft"], "interviewer")
     workflow.add_edge("interviewer", END)
-    
-    return workflow.compile()
\ No newline at end of file
+
+    return workflow.compile(checkpointer=checkpointer)
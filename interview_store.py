@@ -0,0 +1,354 @@
+"""
+Индексированное хранилище сохраненных интервью (SQLite + FTS5).
+
+    python interview_store.py ingest --dir outputs
+    python interview_store.py query --grade Junior --verdict "No Hire" --stack python
+    python interview_store.py search "GIL"
+
+Ingest инкрементальный: файл переиндексируется, только если изменились его
+размер или время модификации. Грейд и вердикт берутся из блока ВЕРДИКТ
+отчета, стек — из мыслей Intake/приветствия, число алертов — по мыслям
+FactChecker.
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_STORE_PATH = os.path.join("outputs", "interviews.sqlite3")
+
+_FILE_TS_RE = re.compile(r"(\d{8}_\d{6})")
+_GRADE_RE = re.compile(r"Оцененный грейд:\s*\**\s*([^\n*]+)", re.IGNORECASE)
+_VERDICT_RE = re.compile(r"Рекомендация:\s*\**\s*([^\n*]+)", re.IGNORECASE)
+_INTAKE_STACK_RE = re.compile(r"\[Intake\]:\s*Извлечен стек:\s*(\[[^\]]*\])")
+_GREETING_STACK_RE = re.compile(r"основному стеку:\s*([^.\n]+)")
+_ALERT_RE = re.compile(r"^\[FactChecker\]:", re.MULTILINE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interviews (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    participant TEXT NOT NULL,
+    started_at TEXT,
+    stack TEXT NOT NULL,
+    grade TEXT,
+    verdict TEXT,
+    turn_count INTEGER NOT NULL,
+    alert_count INTEGER NOT NULL,
+    final_feedback TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_interviews_participant ON interviews(participant COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_interviews_started ON interviews(started_at);
+CREATE INDEX IF NOT EXISTS idx_interviews_grade ON interviews(grade COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_interviews_verdict ON interviews(verdict COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS interview_stack (
+    interview_id INTEGER NOT NULL REFERENCES interviews(id) ON DELETE CASCADE,
+    tech TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stack_tech ON interview_stack(tech, interview_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+    interview_id UNINDEXED,
+    turn_id UNINDEXED,
+    user_message,
+    agent_visible_message,
+    internal_thoughts,
+    tokenize = "unicode61 remove_diacritics 2"
+);
+"""
+
+_COLUMNS = ("id", "path", "participant", "started_at", "stack", "grade", "verdict", "turn_count", "alert_count")
+
+
+def _first(regex: "re.Pattern[str]", text: str) -> Optional[str]:
+    m = regex.search(text or "")
+    return m.group(1).strip() if m else None
+
+
+def _thoughts_text(turn: Dict[str, Any]) -> str:
+    raw = turn.get("internal_thoughts") or ""
+    if isinstance(raw, list):
+        # Лог из памяти (до экспорта) — список словарей
+        return "\n".join(
+            f"[{str(t.get('from', 'System')).replace('_Agent', '')}]: {t.get('content', '')}"
+            for t in raw if isinstance(t, dict)
+        )
+    return str(raw)
+
+
+def _extract_stack(turns: List[Dict[str, Any]]) -> List[str]:
+    for turn in turns:
+        found = _first(_INTAKE_STACK_RE, _thoughts_text(turn))
+        if found:
+            try:
+                return [str(s).strip().lower() for s in ast.literal_eval(found) if str(s).strip()]
+            except (ValueError, SyntaxError):
+                pass
+    if turns:
+        found = _first(_GREETING_STACK_RE, turns[0].get("agent_visible_message", ""))
+        if found:
+            return [s.strip().lower() for s in found.split(",") if s.strip()]
+    return []
+
+
+def _started_at(path: str, mtime: float) -> str:
+    m = _FILE_TS_RE.search(os.path.basename(path))
+    if m:
+        try:
+            return datetime.strptime(m.group(1), "%Y%m%d_%H%M%S").isoformat()
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(mtime).isoformat(timespec="seconds")
+
+
+def summarize_log(path: str, log_data: Dict[str, Any], mtime: float) -> Dict[str, Any]:
+    """Поля индекса по одному логу."""
+    turns = log_data.get("turns", [])
+    feedback = str(log_data.get("final_feedback", "") or "")
+    return {
+        "participant": str(log_data.get("participant_name", "Unknown")),
+        "started_at": _started_at(path, mtime),
+        "stack": _extract_stack(turns),
+        "grade": _first(_GRADE_RE, feedback),
+        "verdict": _first(_VERDICT_RE, feedback),
+        "turn_count": len(turns),
+        "alert_count": sum(len(_ALERT_RE.findall(_thoughts_text(t))) for t in turns),
+        "final_feedback": feedback,
+    }
+
+
+class InterviewStore:
+    def __init__(self, path: str = DEFAULT_STORE_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # --- Ingest ---
+
+    def _known_files(self) -> Dict[str, Tuple[int, float, int]]:
+        rows = self._conn.execute("SELECT path, id, mtime, size FROM interviews").fetchall()
+        return {r["path"]: (r["id"], r["mtime"], r["size"]) for r in rows}
+
+    def _delete(self, interview_id: int) -> None:
+        self._conn.execute("DELETE FROM turns_fts WHERE interview_id = ?", (interview_id,))
+        self._conn.execute("DELETE FROM interview_stack WHERE interview_id = ?", (interview_id,))
+        self._conn.execute("DELETE FROM interviews WHERE id = ?", (interview_id,))
+
+    def add(self, path: str, log_data: Dict[str, Any], mtime: float = 0.0, size: int = 0) -> int:
+        """Индексирует один лог (заменяя прежнюю версию того же файла)."""
+        info = summarize_log(path, log_data, mtime)
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM interviews WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                self._delete(row["id"])
+            cur = self._conn.execute(
+                "INSERT INTO interviews (path, mtime, size, participant, started_at, stack, grade, verdict,"
+                " turn_count, alert_count, final_feedback) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, mtime, size, info["participant"], info["started_at"], ",".join(info["stack"]),
+                 info["grade"], info["verdict"], info["turn_count"], info["alert_count"], info["final_feedback"]),
+            )
+            interview_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO interview_stack (interview_id, tech) VALUES (?, ?)",
+                [(interview_id, tech) for tech in info["stack"]],
+            )
+            self._conn.executemany(
+                "INSERT INTO turns_fts (interview_id, turn_id, user_message, agent_visible_message, internal_thoughts)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (interview_id, t.get("turn_id"), t.get("user_message", ""),
+                     t.get("agent_visible_message", ""), _thoughts_text(t))
+                    for t in log_data.get("turns", [])
+                ],
+            )
+            self._conn.commit()
+        return interview_id
+
+    def ingest(self, directory: str = "outputs", pattern: str = "interview_log_*.json", prune: bool = True) -> Dict[str, int]:
+        """Индексирует новые и измененные логи каталога; удаленные файлы убирает из индекса."""
+        stats = {"added": 0, "updated": 0, "skipped": 0, "removed": 0, "errors": 0}
+        known = self._known_files()
+        seen = set()
+        for path in sorted(glob.iglob(os.path.join(directory, pattern))):
+            if path.endswith(".report.json"):
+                continue
+            seen.add(path)
+            st = os.stat(path)
+            prev = known.get(path)
+            if prev is not None and prev[1] == st.st_mtime and prev[2] == st.st_size:
+                stats["skipped"] += 1
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    log_data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[Store] Пропуск {path}: {e}")
+                stats["errors"] += 1
+                continue
+            self.add(path, log_data, st.st_mtime, st.st_size)
+            stats["updated" if prev is not None else "added"] += 1
+
+        if prune:
+            prefix = os.path.join(directory, "")
+            with self._lock:
+                for path, (interview_id, _, _) in known.items():
+                    if path.startswith(prefix) and path not in seen:
+                        self._delete(interview_id)
+                        stats["removed"] += 1
+                self._conn.commit()
+        return stats
+
+    # --- Запросы ---
+
+    def query(
+        self,
+        participant: Optional[str] = None,
+        stack: Optional[str] = None,
+        grade: Optional[str] = None,
+        verdict: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        min_turns: Optional[int] = None,
+        min_alerts: Optional[int] = None,
+        text: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """
+        Фильтр интервью. Строковые поля сравниваются без учета регистра
+        (participant — по подстроке), since/until — ISO-даты, text — запрос FTS5.
+        """
+        where: List[str] = []
+        params: List[Any] = []
+        if participant:
+            where.append("i.participant LIKE ?")
+            params.append(f"%{participant}%")
+        if stack:
+            where.append("i.id IN (SELECT interview_id FROM interview_stack WHERE tech = ?)")
+            params.append(stack.strip().lower())
+        if grade:
+            where.append("i.grade = ? COLLATE NOCASE")
+            params.append(grade)
+        if verdict:
+            where.append("i.verdict = ? COLLATE NOCASE")
+            params.append(verdict)
+        if since:
+            where.append("i.started_at >= ?")
+            params.append(since)
+        if until:
+            where.append("i.started_at <= ?")
+            params.append(until)
+        if min_turns is not None:
+            where.append("i.turn_count >= ?")
+            params.append(min_turns)
+        if min_alerts is not None:
+            where.append("i.alert_count >= ?")
+            params.append(min_alerts)
+        if text:
+            where.append("i.id IN (SELECT interview_id FROM turns_fts WHERE turns_fts MATCH ?)")
+            params.append(text)
+
+        sql = "SELECT " + ", ".join(f"i.{c}" for c in _COLUMNS) + " FROM interviews i"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY i.started_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(r) for r in rows]
+
+    def search(self, text: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Полнотекстовый поиск по ходам: сниппеты с подсветкой совпадений."""
+        sql = (
+            "SELECT i.path, i.participant, f.turn_id,"
+            " snippet(turns_fts, -1, '[', ']', '…', 12) AS snippet"
+            " FROM turns_fts f JOIN interviews i ON i.id = f.interview_id"
+            " WHERE turns_fts MATCH ? ORDER BY rank LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, (text, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM interviews").fetchone()[0]
+            verdicts = self._conn.execute(
+                "SELECT COALESCE(verdict, '-') AS v, COUNT(*) AS n FROM interviews GROUP BY v"
+            ).fetchall()
+        return {"interviews": total, "verdicts": {r["v"]: r["n"] for r in verdicts}}
+
+
+def _print_rows(rows: Iterable[Dict[str, Any]], as_json: bool) -> None:
+    rows = list(rows)
+    if as_json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    for r in rows:
+        print(" | ".join(str(r.get(k, "")) for k in r if k != "id"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Индекс сохраненных интервью")
+    parser.add_argument("--db", default=os.getenv("INTERVIEW_STORE_PATH", DEFAULT_STORE_PATH))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ing = sub.add_parser("ingest", help="Проиндексировать новые/измененные логи")
+    ing.add_argument("--dir", default="outputs")
+
+    q = sub.add_parser("query", help="Фильтр интервью")
+    q.add_argument("--participant")
+    q.add_argument("--stack")
+    q.add_argument("--grade")
+    q.add_argument("--verdict")
+    q.add_argument("--since", help="ISO-дата, например 2026-01-30")
+    q.add_argument("--until")
+    q.add_argument("--min-turns", type=int)
+    q.add_argument("--min-alerts", type=int)
+    q.add_argument("--text", help="Полнотекстовый запрос (синтаксис FTS5)")
+    q.add_argument("--limit", type=int, default=50)
+    q.add_argument("--json", action="store_true")
+
+    s = sub.add_parser("search", help="Полнотекстовый поиск по ходам")
+    s.add_argument("text")
+    s.add_argument("--limit", type=int, default=20)
+    s.add_argument("--json", action="store_true")
+
+    sub.add_parser("stats", help="Сводка по индексу")
+    args = parser.parse_args()
+
+    store = InterviewStore(args.db)
+    started = time.perf_counter()
+    if args.command == "ingest":
+        print(store.ingest(args.dir))
+    elif args.command == "query":
+        _print_rows(store.query(
+            participant=args.participant, stack=args.stack, grade=args.grade, verdict=args.verdict,
+            since=args.since, until=args.until, min_turns=args.min_turns, min_alerts=args.min_alerts,
+            text=args.text, limit=args.limit,
+        ), args.json)
+    elif args.command == "search":
+        _print_rows(store.search(args.text, args.limit), args.json)
+    else:
+        print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
+    if not getattr(args, "json", False):
+        print(f"[{(time.perf_counter() - started) * 1000:.1f} ms]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Журнал интервью: одна компактная JSONL-запись на ход, дописывается сразу.
+
+Если процесс упал посреди интервью, ходы остаются в журнале, и
+`python journal.py recover` собирает из них обычный interview_log_*.json.
+Оборванным считается только журнал, который не менялся дольше
+JOURNAL_STALE_AFTER секунд и не принадлежит сессии из хранилища сессий
+(session_store.py): идущие и отложенные интервью recover не трогает.
+После штатного завершения журнал сжимается в .jsonl.gz (или удаляется),
+число архивов ограничено.
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+JOURNAL_EXT = ".jsonl"
+ARCHIVE_EXT = ".jsonl.gz"
+# Сколько сессий хранилища просматривать в поиске их журналов
+_MAX_ACTIVE_SESSIONS = 100000
+
+
+def journal_dir() -> str:
+    return os.getenv("JOURNAL_DIR", os.path.join("outputs", "journal"))
+
+
+class InterviewJournal:
+    """
+    Append-only писатель журнала. Каждая запись — одна строка JSON.
+    flush_every задает, сколько записей копится в буфере до записи в файл,
+    fsync — сбрасывать ли данные на диск после каждой записи в файл.
+    """
+
+    def __init__(self, path: str, fsync: bool = False, flush_every: int = 1) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.fsync = fsync
+        self.flush_every = max(1, flush_every)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def from_env(cls, path: str) -> "InterviewJournal":
+        return cls(
+            path,
+            fsync=os.getenv("JOURNAL_FSYNC", "false").lower() == "true",
+            flush_every=int(os.getenv("JOURNAL_FLUSH_EVERY", "1")),
+        )
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line)
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._flush()
+
+    def _flush(self) -> None:
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.close()
+
+
+def read_journal(path: str) -> Dict[str, Any]:
+    """
+    Восстанавливает лог сессии из журнала (обычного или .gz).
+    Недописанная последняя строка (обрыв при падении) пропускается.
+    """
+    log: Dict[str, Any] = {"participant_name": "Unknown", "turns": [], "final_feedback": ""}
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            kind = rec.get("type")
+            if kind == "session":
+                log["participant_name"] = rec.get("participant_name", "Unknown")
+                log["started_at"] = rec.get("started_at")
+            elif kind == "turn":
+                log["turns"].append(rec["turn"])
+            elif kind == "final_feedback":
+                log["final_feedback"] = rec.get("text", "")
+            elif kind == "compacted":
+                log["compacted_to"] = rec.get("path")
+    return log
+
+
+def archive_journal(path: str, gzip_enabled: Optional[bool] = None, max_archives: Optional[int] = None) -> Optional[str]:
+    """
+    Убирает журнал завершенной сессии: сжимает в .gz или удаляет,
+    затем удаляет самые старые архивы сверх лимита.
+    """
+    if gzip_enabled is None:
+        gzip_enabled = os.getenv("JOURNAL_GZIP", "true").lower() == "true"
+    if max_archives is None:
+        max_archives = int(os.getenv("JOURNAL_MAX_ARCHIVES", "50"))
+
+    archive: Optional[str] = None
+    if gzip_enabled:
+        archive = path[: -len(JOURNAL_EXT)] + ARCHIVE_EXT
+        with open(path, "rb") as src, gzip.open(archive, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    os.remove(path)
+
+    directory = os.path.dirname(path) or "."
+    archives = sorted(glob.glob(os.path.join(directory, "*" + ARCHIVE_EXT)), key=os.path.getmtime)
+    for old in archives[: max(0, len(archives) - max_archives)]:
+        os.remove(old)
+    return archive
+
+
+def stale_after() -> float:
+    return float(os.getenv("JOURNAL_STALE_AFTER", "3600"))
+
+
+def active_journals() -> Set[str]:
+    """Журналы сессий, которые еще лежат в хранилище сессий (их можно продолжить)."""
+    from session_store import get_session_store
+
+    store = get_session_store()
+    paths = set()
+    for info in store.list_sessions(limit=_MAX_ACTIVE_SESSIONS):
+        session = store.load(info["thread_id"])
+        path = (session or {}).get("log", {}).get("journal_path")
+        if path:
+            paths.add(os.path.abspath(path))
+    return paths
+
+
+def pending_journals(directory: Optional[str] = None) -> List[str]:
+    """Журналы, которые не были сжаты: идущие, отложенные и оборванные падением сессии."""
+    return sorted(glob.glob(os.path.join(directory or journal_dir(), "*" + JOURNAL_EXT)))
+
+
+def stale_journals(directory: Optional[str] = None, min_age: Optional[float] = None) -> List[str]:
+    """Незавершенные журналы оборванных сессий: давно не менялись и не принадлежат живой сессии."""
+    if min_age is None:
+        min_age = stale_after()
+    deadline = time.time() - min_age
+    active = active_journals()
+    return [
+        path for path in pending_journals(directory)
+        if os.path.getmtime(path) < deadline and os.path.abspath(path) not in active
+    ]
+
+
+def recover(directory: Optional[str] = None, out_dir: str = "outputs", min_age: Optional[float] = None) -> List[str]:
+    """Собирает interview_log_*.json из журналов оборванных сессий (stale_journals)."""
+    from logger import save_log
+
+    saved = []
+    for path in stale_journals(directory, min_age):
+        log = read_journal(path)
+        if log.get("compacted_to"):
+            # Экспорт уже записан, процесс упал до архивации
+            archive_journal(path)
+            continue
+        if not log["turns"]:
+            os.remove(path)
+            continue
+        name = os.path.basename(path)[: -len(JOURNAL_EXT)] + ".json"
+        saved.append(save_log(log, filename=name, out_dir=out_dir))
+        archive_journal(path)
+        print(f"[Journal] Восстановлено: {path} -> {saved[-1]}")
+    return saved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Журналы интервью: восстановление оборванных сессий")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("recover", help="Собрать interview_log_*.json из незавершенных журналов")
+    rec.add_argument("--dir", default=None, help="Папка журналов (по умолчанию JOURNAL_DIR)")
+    rec.add_argument("--out", default="outputs", help="Куда сохранить логи")
+    rec.add_argument("--min-age", type=float, default=None,
+                     help="Сколько секунд журнал не должен меняться (по умолчанию JOURNAL_STALE_AFTER)")
+    sub.add_parser("list", help="Показать незавершенные журналы")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        stale = set(stale_journals())
+        for path in pending_journals():
+            log = read_journal(path)
+            status = "оборван" if path in stale else "идет или отложен"
+            print(f"{path}: {log['participant_name']}, ходов: {len(log['turns'])}, {status}")
+        return
+    saved = recover(args.dir, args.out, args.min_age)
+    print(f"Восстановлено сессий: {len(saved)} ({datetime.now():%H:%M:%S})")
+
+
+if __name__ == "__main__":
+    main()
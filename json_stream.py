@@ -0,0 +1,294 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonFieldStreamer:
+    """
+    Достает строковое значение поля верхнего уровня из JSON, который приходит
+    кусками. Каждый вызов feed() возвращает новую порцию декодированного текста
+    поля — по мере генерации, не дожидаясь конца объекта.
+    """
+
+    def __init__(self, field: str) -> None:
+        self.field = field
+        self._pending = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._last_key: Optional[str] = None
+        self._await_value = False
+        self._streaming = False
+        self.done = False
+        self.value = ""
+
+    def feed(self, chunk: str) -> str:
+        if self.done or not chunk:
+            return ""
+        data = self._pending + chunk
+        self._pending = ""
+        out = []
+        i = 0
+        n = len(data)
+        while i < n and not self.done:
+            ch = data[i]
+
+            if self._streaming:
+                if ch == "\\":
+                    if i + 1 >= n:
+                        self._pending = data[i:]
+                        break
+                    esc = data[i + 1]
+                    if esc == "u":
+                        if i + 6 > n:
+                            self._pending = data[i:]
+                            break
+                        try:
+                            out.append(chr(int(data[i + 2:i + 6], 16)))
+                        except ValueError:
+                            pass
+                        i += 6
+                        continue
+                    out.append(_SIMPLE_ESCAPES.get(esc, esc))
+                    i += 2
+                    continue
+                if ch == '"':
+                    self._streaming = False
+                    self.done = True
+                    break
+                out.append(ch)
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    if self._key is not None:
+                        self._key += ch
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key is not None:
+                        self._last_key, self._key = self._key, None
+                elif self._key is not None:
+                    self._key += ch
+                i += 1
+                continue
+
+            if ch == '"':
+                if self._await_value and self._depth == 1:
+                    self._await_value = False
+                    self._streaming = True
+                    i += 1
+                    continue
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._key = ""
+                    self._expect_key = False
+            elif ch in "{[":
+                self._depth += 1
+                self._expect_key = ch == "{" and self._depth == 1
+                self._await_value = False
+            elif ch in "}]":
+                self._depth -= 1
+                self._await_value = False
+            elif ch == "," and self._depth == 1:
+                self._expect_key = True
+            elif ch == ":" and self._depth == 1:
+                self._await_value = self._last_key == self.field
+                self._last_key = None
+            elif not ch.isspace():
+                self._await_value = False
+            i += 1
+
+        text = "".join(out)
+        self.value += text
+        return text
+
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_SPECIAL_RE = re.compile(r"[\"'{}\[\]]")
+_STRING_END_RE = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_REPAIR_TOKEN_RE = re.compile(r"[\"'{}\[\]]|\b(?:True|False|None)\b")
+_REPAIR_STRING_RE = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\"\\]")}
+
+
+def _load_object(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        obj = json.loads(text, strict=False)
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def repair_json(text: str) -> str:
+    """
+    Чинит типичные дефекты ответа модели за один проход: одинарные кавычки,
+    висячие запятые, Python-литералы, незакрытые строки и скобки на обрыве.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    quote: Optional[str] = None
+    pos, n = 0, len(text)
+    while pos < n:
+        if quote:
+            m = _REPAIR_STRING_RE[quote].search(text, pos)
+            if m is None:
+                out.append(text[pos:])
+                break
+            out.append(text[pos:m.start()])
+            tok = m.group()
+            pos = m.end()
+            if tok == "\\":
+                nxt = text[pos:pos + 1]
+                # \' в одинарных кавычках в JSON не нужен
+                out.append("'" if quote == "'" and nxt == "'" else "\\" + nxt)
+                pos += 1
+            elif tok == quote:
+                out.append('"')
+                quote = None
+            else:
+                # Двойная кавычка внутри строки в одинарных кавычках
+                out.append('\\"')
+            continue
+
+        m = _REPAIR_TOKEN_RE.search(text, pos)
+        if m is None:
+            out.append(text[pos:])
+            break
+        out.append(text[pos:m.start()])
+        tok = m.group()
+        pos = m.end()
+        if tok in "\"'":
+            quote = tok
+            out.append('"')
+        elif tok in "{[":
+            stack.append("}" if tok == "{" else "]")
+            out.append(tok)
+        elif tok in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(tok)
+        else:
+            out.append(_LITERALS.get(tok, tok))
+
+    if quote:
+        out.append('"')
+    if stack:
+        _strip_trailing_comma(out)
+        if "".join(out).rstrip().endswith(":"):
+            out.append(" null")
+        out.extend(reversed(stack))
+    return "".join(out)
+
+
+def _strip_trailing_comma(out: List[str]) -> None:
+    while out and not out[-1].strip():
+        out.pop()
+    if out:
+        tail = out[-1].rstrip()
+        if tail.endswith(","):
+            out[-1] = tail[:-1]
+
+
+class JsonObjectExtractor:
+    """
+    Потоковый извлекатель первого полного JSON-объекта верхнего уровня.
+    Учитывает строки и экранирование, поэтому скобки внутри строк и второй
+    объект после первого не ломают разбор. feed() можно вызывать по кускам,
+    finish() на конце потока пытается починить недописанный объект.
+    """
+
+    def __init__(self) -> None:
+        self._buf: List[str] = []
+        self._depth = 0
+        self._quote: Optional[str] = None
+        self._escape = False
+        self.result: Optional[Dict[str, Any]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        if self.done or not chunk:
+            return self.result
+        pos, n = 0, len(chunk)
+
+        if self._depth == 0:
+            start = chunk.find("{")
+            if start < 0:
+                return None
+            self._buf = []
+            self._depth = 1
+            self._quote = None
+            self._escape = False
+            pos = start + 1
+            self._buf.append("{")
+
+        seg_start = pos
+        while pos < n:
+            if self._escape:
+                self._escape = False
+                pos += 1
+                continue
+            if self._quote:
+                # Внутри строки интересны только закрывающая кавычка и экранирование
+                m = _STRING_END_RE[self._quote].search(chunk, pos)
+                if m is None:
+                    break
+                pos = m.end()
+                if m.group() == "\\":
+                    self._escape = True
+                else:
+                    self._quote = None
+                continue
+            m = _SPECIAL_RE.search(chunk, pos)
+            if m is None:
+                break
+            pos = m.end()
+            ch = m.group()
+            if ch in "\"'":
+                self._quote = ch
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._buf.append(chunk[seg_start:pos])
+                    candidate = "".join(self._buf)
+                    obj = _load_object(candidate)
+                    if obj is None:
+                        obj = _load_object(repair_json(candidate))
+                    if obj is not None:
+                        self.result = obj
+                        return obj
+                    # Не объект — ищем следующий в остатке
+                    return self.feed(chunk[pos:])
+        self._buf.append(chunk[seg_start:])
+        return None
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        if self.done or self._depth == 0:
+            return self.result
+        self.result = _load_object(repair_json("".join(self._buf)))
+        return self.result
+
+
+def extract_json(text: str) -> Optional[Dict[str, Any]]:
+    """Первый JSON-объект из текста модели (с починкой) или None."""
+    stripped = text.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        # Быстрый путь: весь ответ — валидный объект
+        obj = _load_object(stripped)
+        if obj is not None:
+            return obj
+    extractor = JsonObjectExtractor()
+    extractor.feed(text)
+    return extractor.finish()
@@ -3,10 +3,10 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-import json
+import threading
 import warnings
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterator, AsyncIterator, Tuple
 
 # Глушим предупреждения LangChain
 from langchain_core._api import LangChainDeprecationWarning
@@ -15,108 +15,256 @@ warnings.simplefilter("ignore", category=LangChainDeprecationWarning)
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 from langchain_core.language_models.chat_models import BaseChatModel
 
-# Великий Гигачат
-try:
-    from langchain_gigachat.chat_models import GigaChat
-except ImportError:
+from llm_cache import cache_from_env, make_cache_key
+from json_stream import JsonFieldStreamer, JsonObjectExtractor, extract_json
+from resilience import AsyncQuota, Quota, ResilientCaller, LLMUnavailableError, Settle
+from rate_limit import RateLimiter
+from model_routing import DEFAULT_PROFILE, Profile, load_routing, profile_name_for
+from utils import estimate_tokens
+import metrics
+
+Message = Dict[str, str]
+
+# Реестр провайдеров: SDK импортируется только при создании модели выбранного
+# провайдера, а не при импорте llm.py
+ProviderFactory = Callable[[str, Optional[str], float, int, Optional[int]], BaseChatModel]
+_PROVIDERS: Dict[str, ProviderFactory] = {}
+
+
+def register_provider(*names: str) -> Callable[[ProviderFactory], ProviderFactory]:
+    def decorator(factory: ProviderFactory) -> ProviderFactory:
+        for name in names:
+            _PROVIDERS[name] = factory
+        return factory
+    return decorator
+
+
+def create_model(
+    provider: str, model_name: Optional[str], temperature: float, timeout: int, max_tokens: Optional[int] = None
+) -> BaseChatModel:
+    factory = _PROVIDERS.get(provider)
+    if factory is None:
+        raise ValueError(f"Неизвестный LLM_PROVIDER: {provider}")
+    return factory(provider, model_name, temperature, timeout, max_tokens)
+
+
+@register_provider("fake")
+def _fake_model(
+    provider: str, model_name: Optional[str], temperature: float, timeout: int, max_tokens: Optional[int]
+) -> BaseChatModel:
+    # Локальная модель без сети: бенчмарки и нагрузочные прогоны
+    from fake_llm import FakeChatModel
+    return FakeChatModel.from_env()
+
+
+@register_provider("gigachat")
+def _gigachat_model(
+    provider: str, model_name: Optional[str], temperature: float, timeout: int, max_tokens: Optional[int]
+) -> BaseChatModel:
+    # Великий Гигачат
     try:
-        from langchain_community.chat_models import GigaChat
+        from langchain_gigachat.chat_models import GigaChat
     except ImportError:
-        GigaChat = None
+        try:
+            from langchain_community.chat_models import GigaChat
+        except ImportError:
+            raise ImportError("Библиотека не найдена. Выполни: pip install langchain-gigachat")
+
+    verify_ssl = os.getenv("GIGACHAT_VERIFY_SSL", "true").lower() == "true"
+
+    return GigaChat(
+        credentials=os.environ["GIGACHAT_CREDENTIALS"],
+        scope=os.getenv("GIGACHAT_SCOPE", "GIGACHAT_API_PERS"),
+        verify_ssl_certs=verify_ssl,
+        timeout=timeout,
+        model=model_name or "GigaChat-Pro",
+        temperature=temperature,
+        max_tokens=max_tokens,
+        verbose=False
+    )
 
-# OpenAI
-try:
-    from langchain_openai import ChatOpenAI
-except ImportError:
-    ChatOpenAI = None
 
-# Gemini
-try:
-    from langchain_google_genai import ChatGoogleGenerativeAI
-except ImportError:
-    ChatGoogleGenerativeAI = None
+@register_provider("openai", "openrouter")
+def _openai_model(
+    provider: str, model_name: Optional[str], temperature: float, timeout: int, max_tokens: Optional[int]
+) -> BaseChatModel:
+    try:
+        from langchain_openai import ChatOpenAI
+    except ImportError:
+        raise ImportError("Библиотека не найдена. Выполни: pip install langchain-openai")
 
-# Google Vertex AI
-try:
-    from langchain_google_vertexai import ChatVertexAI
-except ImportError:
-    ChatVertexAI = None
+    base_url = "https://openrouter.ai/api/v1" if provider == "openrouter" else None
+    api_key = os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
 
+    return ChatOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        model_name=model_name or "gpt-4o-mini",
+        temperature=temperature,
+        max_tokens=max_tokens,
+        request_timeout=timeout
+    )
+
+
+@register_provider("gemini")
+def _gemini_model(
+    provider: str, model_name: Optional[str], temperature: float, timeout: int, max_tokens: Optional[int]
+) -> BaseChatModel:
+    try:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+    except ImportError:
+        raise ImportError("Библиотека не найдена. Выполни: pip install langchain-google-genai")
+
+    return ChatGoogleGenerativeAI(
+        google_api_key=os.environ["GOOGLE_API_KEY"],
+        model=model_name or "gemini-1.5-flash",
+        temperature=temperature,
+        max_output_tokens=max_tokens,
+        convert_system_message_to_human=True,
+        timeout=timeout
+    )
+
+
+@register_provider("vertex")
+def _vertex_model(
+    provider: str, model_name: Optional[str], temperature: float, timeout: int, max_tokens: Optional[int]
+) -> BaseChatModel:
+    try:
+        from langchain_google_vertexai import ChatVertexAI
+    except ImportError:
+        raise ImportError("Библиотека не найдена. Выполни: pip install langchain-google-vertexai")
+
+    return ChatVertexAI(
+        model_name=model_name or "gemini-1.5-pro",
+        temperature=temperature,
+        max_output_tokens=max_tokens,
+        project=os.getenv("GOOGLE_PROJECT_ID"),
+        location=os.getenv("GOOGLE_LOCATION", "us-central1"),
+        max_retries=1
+    )
+
+
+def _fetch_token(model: BaseChatModel) -> None:
+    """Получает токен авторизации, если SDK это умеет (GigaChat: OAuth по credentials)."""
+    for obj in (model, getattr(model, "_client", None)):
+        get_token = getattr(obj, "get_token", None)
+        if callable(get_token):
+            get_token()
+            return
+
+JSON_INSTRUCTION = "\n\nВАЖНО: Ответ должен быть ТОЛЬКО валидным JSON объектом. Без Markdown, без ```."
 
-Message = Dict[str, str]
 
 class LLMService:
     _instance = None
+    _lock = threading.Lock()
     
     def __new__(cls):
+        # Double-checked locking: при одновременном первом обращении из нескольких
+        # потоков модель создается ровно один раз
         if cls._instance is None:
-            cls._instance = super(LLMService, cls).__new__(cls)
-            cls._instance.model = cls._instance._init_model()
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(LLMService, cls).__new__(cls)
+                    instance._setup()
+                    cls._instance = instance
         return cls._instance
 
-    def _init_model(self) -> BaseChatModel:
-        # Читаем конфиг из .env
-        provider = os.getenv("LLM_PROVIDER", "gigachat").lower()
-        temperature = float(os.getenv("LLM_TEMPERATURE", "0.2"))
-        model_name = os.getenv("LLM_MODEL") 
-        timeout = int(os.getenv("LLM_TIMEOUT", "30"))
+    def _setup(self) -> None:
+        self._read_config()
+        # Клиенты по профилям создаются при первом запросе агента (или в prewarm) и переиспользуются
+        self._models: Dict[str, BaseChatModel] = {}
+        self._model_lock = threading.Lock()
+        self.cache = cache_from_env()
+        # Ретраи/breaker и лимит RPS/TPM — по провайдеру: профили одного провайдера делят квоту
+        self._resilience: Dict[str, ResilientCaller] = {}
+        self._limiters: Dict[str, Optional[RateLimiter]] = {}
+        self.resilience = self._resilience_for(self.provider)
+        # Общий лимит RPS/TPM с приоритетами агентов (None — без лимита)
+        self.rate_limiter = self._limiter_for(self.provider)
+        self.usage: Dict[str, Dict[str, int]] = {}
+        self._usage_lock = threading.Lock()
+        # Запись пар запрос/ответ для воспроизведения через LLM_PROVIDER=fake
+        self.record_path = os.getenv("LLM_RECORD_PATH") or None
+        self._prewarm_thread: Optional[threading.Thread] = None
 
-        if provider == "gigachat":
-            if not GigaChat:
-                raise ImportError("Библиотека не найдена. Выполни: pip install langchain-gigachat")
-            
-            verify_ssl = os.getenv("GIGACHAT_VERIFY_SSL", "true").lower() == "true"
-
-            return GigaChat(
-                credentials=os.environ["GIGACHAT_CREDENTIALS"],
-                scope=os.getenv("GIGACHAT_SCOPE", "GIGACHAT_API_PERS"),
-                verify_ssl_certs=verify_ssl,
-                timeout=timeout,
-                model=model_name or "GigaChat-Pro",
-                temperature=temperature,
-                verbose=False
-            )
-        
-        if provider in ["openai", "openrouter"]:
-            if not ChatOpenAI:
-                raise ImportError("Библиотека не найдена. Выполни: pip install langchain-openai")
-            
-            base_url = "https://openrouter.ai/api/v1" if provider == "openrouter" else None
-            api_key = os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
-            
-            return ChatOpenAI(
-                api_key=api_key,
-                base_url=base_url,
-                model_name=model_name or "gpt-4o-mini",
-                temperature=temperature,
-                request_timeout=timeout
-            )
-
-        if provider == "gemini":
-            if not ChatGoogleGenerativeAI:
-                raise ImportError("Библиотека не найдена. Выполни: pip install langchain-google-genai")
-            
-            return ChatGoogleGenerativeAI(
-                google_api_key=os.environ["GOOGLE_API_KEY"],
-                model=model_name or "gemini-1.5-flash",
-                temperature=temperature,
-                convert_system_message_to_human=True,
-                timeout=timeout
-            )
-        
-        if provider == "vertex":
-            if not ChatVertexAI:
-                raise ImportError("Библиотека не найдена. Выполни: pip install langchain-google-vertexai")
-            
-            return ChatVertexAI(
-                model_name=model_name or "gemini-1.5-pro",
-                temperature=temperature,
-                project=os.getenv("GOOGLE_PROJECT_ID"),
-                location=os.getenv("GOOGLE_LOCATION", "us-central1"),
-                max_retries=1
-            )
-            
-        raise ValueError(f"Неизвестный LLM_PROVIDER: {provider}")
+    def _read_config(self) -> None:
+        # Читаем конфиг из .env; параметры модели входят в ключ кеша ответов.
+        # Профиль default — LLM_*, остальные профили и маршруты агентов — model_routing.py
+        self.profiles, self.routes = load_routing()
+        default = self.profiles[DEFAULT_PROFILE]
+        self.provider = default["provider"]
+        self.temperature = default["temperature"]
+        self.model_name = default["model"] or ""
+        self.timeout = default["timeout"]
+        for profile in self.profiles.values():
+            if profile["provider"] not in _PROVIDERS:
+                raise ValueError(f"Неизвестный LLM_PROVIDER: {profile['provider']}")
+
+    def _profile(self, agent: Optional[str]) -> Tuple[str, Profile]:
+        name = profile_name_for(self.routes, agent)
+        return name, self.profiles[name]
+
+    def profile_for(self, agent: Optional[str]) -> Profile:
+        """Профиль модели, на котором работает агент."""
+        return dict(self._profile(agent)[1])
+
+    def _init_model(self, profile: Profile) -> BaseChatModel:
+        return create_model(
+            profile["provider"], profile["model"], profile["temperature"], profile["timeout"], profile["max_tokens"]
+        )
+
+    def _model_for(self, name: str) -> BaseChatModel:
+        model = self._models.get(name)
+        if model is None:
+            with self._model_lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._models[name] = self._init_model(self.profiles[name])
+        return model
+
+    def model_for(self, agent: Optional[str]) -> BaseChatModel:
+        return self._model_for(self._profile(agent)[0])
+
+    @property
+    def model(self) -> BaseChatModel:
+        return self._model_for(DEFAULT_PROFILE)
+
+    def _resilience_for(self, provider: str) -> ResilientCaller:
+        caller = self._resilience.get(provider)
+        if caller is None:
+            caller = self._resilience.setdefault(provider, ResilientCaller.from_env(provider))
+        return caller
+
+    def _limiter_for(self, provider: str) -> Optional[RateLimiter]:
+        if provider not in self._limiters:
+            self._limiters.setdefault(provider, RateLimiter.from_env(provider))
+        return self._limiters[provider]
+
+    def prewarm(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Создает клиент провайдера и заранее получает токен авторизации,
+        чтобы первый ход кандидата не ждал импорта SDK и OAuth.
+        """
+        def run() -> None:
+            # Прогреваются default и профили, на которые ведут маршруты агентов
+            for name in dict.fromkeys([DEFAULT_PROFILE, *self.routes.values()]):
+                started = time.perf_counter()
+                try:
+                    _fetch_token(self._model_for(name))
+                    print(f"[DEBUG] LLM ({name}: {self.profiles[name]['provider']}) прогрет за "
+                          f"{time.perf_counter() - started:.2f} c")
+                except Exception as e:
+                    print(f"Прогрев LLM не удался (запрос пойдет обычным путем): {e}")
+
+        if not background:
+            run()
+            return None
+        with self._model_lock:
+            if self._prewarm_thread is None:
+                self._prewarm_thread = threading.Thread(target=run, daemon=True, name="llm-prewarm")
+                self._prewarm_thread.start()
+        return self._prewarm_thread
 
     def _convert_messages(self, messages: List[Message]) -> List[BaseMessage]:
         lc_msgs = []
@@ -130,36 +278,284 @@ class LLMService:
                 lc_msgs.append(AIMessage(content=content))
         return lc_msgs
 
-    def chat(self, messages: List[Message]) -> str:
+    def _record(self, messages: List[Message], answer: Any, provider: str) -> None:
+        if self.record_path and provider != "fake" and isinstance(answer, str):
+            from fake_llm import record_response
+            record_response(self.record_path, [(m["role"], str(m.get("content", ""))) for m in messages], answer)
+
+    @staticmethod
+    def _count_tokens(messages: List[Message]) -> int:
+        return sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+
+    def _quota(self, limiter: Optional[RateLimiter], messages: List[Message], agent: Optional[str]) -> Optional[Quota]:
+        """Квота лимитера на каждую попытку и каждый хедж ResilientCaller (None — без лимита)."""
+        if limiter is None:
+            return None
+
+        def take() -> Settle:
+            reserved = self._acquire(limiter, messages, agent)
+            return lambda answer: self._settle(limiter, reserved, answer)
+        return take
+
+    def _aquota(self, limiter: Optional[RateLimiter], messages: List[Message],
+                agent: Optional[str]) -> Optional[AsyncQuota]:
+        if limiter is None:
+            return None
+
+        async def take() -> Settle:
+            reserved = await self._aacquire(limiter, messages, agent)
+            return lambda answer: self._settle(limiter, reserved, answer)
+        return take
+
+    def _acquire(self, limiter: Optional[RateLimiter], messages: List[Message], agent: Optional[str]) -> float:
+        """Квота лимитера на один запрос к провайдеру."""
+        if limiter is None:
+            return 0.0
+        return limiter.acquire(agent, self._count_tokens(messages))
+
+    async def _aacquire(self, limiter: Optional[RateLimiter], messages: List[Message], agent: Optional[str]) -> float:
+        if limiter is None:
+            return 0.0
+        return await limiter.aacquire(agent, self._count_tokens(messages))
+
+    @staticmethod
+    def _settle(limiter: Optional[RateLimiter], reserved: float, answer: Any) -> None:
+        if limiter is not None:
+            limiter.settle(reserved, estimate_tokens(str(answer or "")))
+
+    def _invoke(self, messages: List[Message], agent: Optional[str] = None, admitted: bool = False) -> str:
+        """
+        Запрос к модели профиля агента с ретраями/breaker; при отказе — LLMUnavailableError.
+        admitted=True — breaker уже пропустил запрос (повтор потока, оборвавшегося до первого куска).
+        """
+        name, profile = self._profile(agent)
+        model, limiter = self._model_for(name), self._limiter_for(profile["provider"])
         lc_msgs = self._convert_messages(messages)
-        
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                return self.model.invoke(lc_msgs).content
-            except Exception as e:
-                print(f"Ошибка сети LLM (попытка {attempt+1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2) # Ждем 2 секунды
-                    continue
-                else:
-                    return "Извините, ошибка соединения с нейросетью. Попробуйте повторить запрос."
-
-    def chat_json(self, messages: List[Message]) -> Dict[str, Any]:
-        """Гарантирует возврат JSON."""
-        json_instruction = "\n\nВАЖНО: Ответ должен быть ТОЛЬКО валидным JSON объектом. Без Markdown, без ```."
-        
+        answer = self._resilience_for(profile["provider"]).call(
+            lambda: model.invoke(lc_msgs).content, self._quota(limiter, messages, agent), admitted
+        )
+        self._record(messages, answer, profile["provider"])
+        return answer
+
+    async def _ainvoke(self, messages: List[Message], agent: Optional[str] = None, admitted: bool = False) -> str:
+        name, profile = self._profile(agent)
+        model, limiter = self._model_for(name), self._limiter_for(profile["provider"])
+        lc_msgs = self._convert_messages(messages)
+
+        async def once() -> str:
+            resp = await model.ainvoke(lc_msgs)
+            return resp.content
+
+        answer = await self._resilience_for(profile["provider"]).acall(
+            once, self._aquota(limiter, messages, agent), admitted
+        )
+        self._record(messages, answer, profile["provider"])
+        return answer
+
+    def _use_cache(self, agent: Optional[str]) -> bool:
+        return self.cache is not None and self.cache.enabled_for(agent)
+
+    def _cache_key(self, messages: List[Message], agent: Optional[str]) -> str:
+        profile = self._profile(agent)[1]
+        return make_cache_key(messages, profile["provider"], profile["model"] or "", profile["temperature"])
+
+    @staticmethod
+    def _is_cacheable(answer: Any) -> bool:
+        return isinstance(answer, str) and bool(answer)
+
+    @classmethod
+    def _is_cacheable_json(cls, answer: Any) -> bool:
+        # Ответ, из которого не извлекся JSON, иначе повторялся бы из кеша весь TTL
+        return cls._is_cacheable(answer) and extract_json(answer) is not None
+
+    def _track_prompt(self, messages: List[Message], agent: Optional[str]) -> int:
+        tokens = self._count_tokens(messages)
+        with self._usage_lock:
+            stat = self.usage.setdefault(agent or "unknown", {"calls": 0, "prompt_tokens": 0, "last_prompt_tokens": 0})
+            stat["calls"] += 1
+            stat["prompt_tokens"] += tokens
+            stat["last_prompt_tokens"] = tokens
+        return tokens
+
+    def usage_stats(self) -> Dict[str, Dict[str, int]]:
+        """Число вызовов и оценка токенов промпта по агентам."""
+        with self._usage_lock:
+            return {agent: dict(stat) for agent, stat in self.usage.items()}
+
+    def chat(self, messages: List[Message], agent: Optional[str] = None) -> str:
+        """
+        agent — имя вызывающего агента, по нему решается, кешировать ли ответ.
+        Если провайдер недоступен, бросает LLMUnavailableError.
+        """
+        return self._chat(messages, agent, self._is_cacheable)
+
+    async def achat(self, messages: List[Message], agent: Optional[str] = None) -> str:
+        """Асинхронный вариант chat: не блокирует event loop на время запроса."""
+        return await self._achat(messages, agent, self._is_cacheable)
+
+    def _chat(self, messages: List[Message], agent: Optional[str], cacheable: Callable[[Any], bool]) -> str:
+        with metrics.llm_call(agent, self._track_prompt(messages, agent)) as call:
+            if not self._use_cache(agent):
+                answer = self._invoke(messages, agent)
+            else:
+                answer = self.cache.get_or_compute(
+                    self._cache_key(messages, agent), lambda: self._invoke(messages, agent), cacheable
+                )
+            call.completion(answer)
+            return answer
+
+    async def _achat(self, messages: List[Message], agent: Optional[str], cacheable: Callable[[Any], bool]) -> str:
+        with metrics.llm_call(agent, self._track_prompt(messages, agent)) as call:
+            if not self._use_cache(agent):
+                answer = await self._ainvoke(messages, agent)
+            else:
+                answer = await self.cache.aget_or_compute(
+                    self._cache_key(messages, agent), lambda: self._ainvoke(messages, agent), cacheable
+                )
+            call.completion(answer)
+            return answer
+
+    def stream(self, messages: List[Message], agent: Optional[str] = None) -> Iterator[str]:
+        """Ответ модели по кускам. Если поток оборвался до первого куска — обычный запрос с ретраями."""
+        name, profile = self._profile(agent)
+        model, limiter = self._model_for(name), self._limiter_for(profile["provider"])
+        resilience = self._resilience_for(profile["provider"])
+        lc_msgs = self._convert_messages(messages)
+        resilience.check()
+        reserved = self._acquire(limiter, messages, agent)
+        parts: List[str] = []
+        t0 = time.perf_counter()
+        try:
+            for chunk in model.stream(lc_msgs):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        except GeneratorExit:
+            # Потребитель остановился сам (объект уже собран) — это успех
+            resilience.record(True, time.perf_counter() - t0)
+            self._settle(limiter, reserved, "".join(parts))
+            raise
+        except Exception as e:
+            self._settle(limiter, reserved, "".join(parts))
+            if parts:
+                resilience.record(False)
+                raise LLMUnavailableError(profile["provider"], f"поток оборвался: {e}") from e
+            # До первого куска: пропуск breaker'а (в half_open — пробный запрос) переходит
+            # к обычному запросу, его исход breaker и учтет; иначе повтор отклонялся бы
+            print(f"Ошибка стриминга LLM, повтор без стриминга: {e}")
+            yield self._invoke(messages, agent, admitted=True)
+            return
+        resilience.record(True, time.perf_counter() - t0)
+        self._settle(limiter, reserved, "".join(parts))
+
+    async def astream(self, messages: List[Message], agent: Optional[str] = None) -> AsyncIterator[str]:
+        """Асинхронный вариант stream."""
+        name, profile = self._profile(agent)
+        model, limiter = self._model_for(name), self._limiter_for(profile["provider"])
+        resilience = self._resilience_for(profile["provider"])
+        lc_msgs = self._convert_messages(messages)
+        resilience.check()
+        reserved = await self._aacquire(limiter, messages, agent)
+        parts: List[str] = []
+        t0 = time.perf_counter()
+        try:
+            async for chunk in model.astream(lc_msgs):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        except GeneratorExit:
+            resilience.record(True, time.perf_counter() - t0)
+            self._settle(limiter, reserved, "".join(parts))
+            raise
+        except Exception as e:
+            self._settle(limiter, reserved, "".join(parts))
+            if parts:
+                resilience.record(False)
+                raise LLMUnavailableError(profile["provider"], f"поток оборвался: {e}") from e
+            # До первого куска: пропуск breaker'а (в half_open — пробный запрос) переходит
+            # к обычному запросу, его исход breaker и учтет; иначе повтор отклонялся бы
+            print(f"Ошибка стриминга LLM, повтор без стриминга: {e}")
+            yield await self._ainvoke(messages, agent, admitted=True)
+            return
+        resilience.record(True, time.perf_counter() - t0)
+        self._settle(limiter, reserved, "".join(parts))
+
+    def stream_json(
+        self, messages: List[Message], field: str, on_delta: Callable[[str], None],
+        agent: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Как chat_json, но по мере генерации отдает в on_delta текст строкового
+        поля field (например, "message"), вынутый из недописанного JSON.
+        """
+        with metrics.llm_call(agent, self._track_prompt(messages, agent)) as call:
+            streamer = JsonFieldStreamer(field)
+            extractor = JsonObjectExtractor()
+            parts = []
+            for chunk in self.stream(self._with_json_instruction(messages), agent):
+                parts.append(chunk)
+                delta = streamer.feed(chunk)
+                if delta:
+                    on_delta(delta)
+                # Объект закрыт — хвост генерации (пояснения, ```) не ждем
+                if extractor.feed(chunk) is not None:
+                    call.completion("".join(parts))
+                    return extractor.result
+            call.completion("".join(parts))
+        return self._parse_json_safe("".join(parts), agent)
+
+    async def astream_json(
+        self, messages: List[Message], field: str, on_delta: Callable[[str], None],
+        agent: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Асинхронный вариант stream_json."""
+        with metrics.llm_call(agent, self._track_prompt(messages, agent)) as call:
+            streamer = JsonFieldStreamer(field)
+            extractor = JsonObjectExtractor()
+            parts = []
+            async for chunk in self.astream(self._with_json_instruction(messages), agent):
+                parts.append(chunk)
+                delta = streamer.feed(chunk)
+                if delta:
+                    on_delta(delta)
+                # Объект закрыт — хвост генерации (пояснения, ```) не ждем
+                if extractor.feed(chunk) is not None:
+                    call.completion("".join(parts))
+                    return extractor.result
+            call.completion("".join(parts))
+        return self._parse_json_safe("".join(parts), agent)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats() if self.cache is not None else {}
+
+    def resilience_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Ретраи, хеджирование и состояние circuit breaker по провайдерам, к которым уже обращались."""
+        return {provider: caller.stats() for provider, caller in list(self._resilience.items())}
+
+    def rate_limit_stats(self) -> Dict[str, Dict[str, int]]:
+        """Глубина очереди лимитеров по провайдерам и классам приоритета в этом процессе."""
+        return {provider: limiter.stats() for provider, limiter in list(self._limiters.items()) if limiter is not None}
+
+    def _with_json_instruction(self, messages: List[Message]) -> List[Message]:
         msgs = [m.copy() for m in messages]
         if msgs and msgs[-1]["role"] == "user":
-            msgs[-1]["content"] += json_instruction
+            msgs[-1]["content"] += JSON_INSTRUCTION
         else:
-            msgs.append({"role": "user", "content": json_instruction})
+            msgs.append({"role": "user", "content": JSON_INSTRUCTION})
+        return msgs
+
+    def chat_json(self, messages: List[Message], agent: Optional[str] = None) -> Dict[str, Any]:
+        """Гарантирует возврат JSON."""
+        raw = self._chat(self._with_json_instruction(messages), agent, self._is_cacheable_json)
+        return self._parse_json_safe(raw, agent)
 
-        raw = self.chat(msgs)
-        return self._parse_json_safe(raw)
+    async def achat_json(self, messages: List[Message], agent: Optional[str] = None) -> Dict[str, Any]:
+        """Асинхронный вариант chat_json."""
+        raw = await self._achat(self._with_json_instruction(messages), agent, self._is_cacheable_json)
+        return self._parse_json_safe(raw, agent)
     
 
-    def _parse_json_safe(self, text: Any) -> Dict[str, Any]:
+    def _parse_json_safe(self, text: Any, agent: Optional[str] = None) -> Dict[str, Any]:
         if isinstance(text, list) and len(text) > 0:
             text = text[0]
         
@@ -169,28 +565,20 @@ class LLMService:
         if not isinstance(text, str):
             text = str(text)
 
-        text = text.strip()
-        
-        if "```" in text:
-            parts = text.split("```")
-            for part in parts:
-                if "{" in part:
-                    text = part.replace("json", "").strip()
-                    break
-        
-        text = text.strip().strip("'").strip('"')
-        
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            try:
-                import re
-                match = re.search(r'\{.*\}', text, re.DOTALL)
-                if match:
-                    return json.loads(match.group(0))
-            except:
-                pass
-            return {"error": "json_parse_error", "raw_content": text}
+        # Однопроходный извлекатель: игнорирует ``` и текст вокруг, берет первый
+        # полный объект и чинит висячие запятые/одинарные кавычки/обрыв на конце
+        obj = extract_json(text)
+        if obj is not None:
+            return obj
+
+        print(f"Не удалось извлечь JSON из ответа LLM ({len(text)} символов)")
+        metrics.note_parse_failure(agent)
+        return {"error": "json_parse_error", "raw_content": text.strip()}
 
 def get_llm() -> LLMService:
-    return LLMService()
\ No newline at end of file
+    return LLMService()
+
+def prewarm_from_env() -> None:
+    """Фоновый прогрев клиента при LLM_PREWARM=true (вызывается при старте app.py / ui.py)."""
+    if os.getenv("LLM_PREWARM", "false").lower() == "true":
+        get_llm().prewarm()
\ No newline at end of file
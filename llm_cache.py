@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Message = Dict[str, str]
+
+# Агенты, ответы которых по умолчанию кешируются. Interviewer ведет диалог,
+# и повтор одного и того же вопроса кандидату нежелателен — поэтому выключен.
+DEFAULT_CACHED_AGENTS = {"intake", "factcheck_router", "factcheck", "reporter"}
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(str(text).split())
+
+
+def make_cache_key(messages: List[Message], provider: str, model: str, temperature: float) -> str:
+    """Хеш нормализованных сообщений + параметров модели."""
+    payload = {
+        "provider": provider,
+        "model": model,
+        "temperature": round(float(temperature), 3),
+        "messages": [[m.get("role", ""), _normalize_text(m.get("content", ""))] for m in messages],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _DiskTier:
+    """SQLite-уровень кеша с TTL и ограничением по суммарному размеру."""
+
+    def __init__(self, path: str, ttl: float, max_bytes: int) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Выбрасываем самые давно использованные записи (LRU по accessed)
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+class ResponseCache:
+    """
+    Двухуровневый кеш ответов LLM: LRU в памяти + SQLite на диске.
+    Одинаковые одновременные запросы схлопываются в один (single-flight).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 1024,
+        ttl: float = 7 * 24 * 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+        agents: Optional[set] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.agents = set(DEFAULT_CACHED_AGENTS if agents is None else agents)
+        self.disk = _DiskTier(path, ttl, max_bytes) if path else None
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        # Future привязан к своему event loop: ключ — (loop, ключ запроса), чтобы
+        # запросы из разных loop'ов (asyncio.run на вызов, граф Streamlit) не ждали чужой
+        self._ainflight: Dict[Tuple[asyncio.AbstractEventLoop, str], "asyncio.Future[None]"] = {}
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "bytes_saved": 0}
+
+    def enabled_for(self, agent: Optional[str]) -> bool:
+        return agent is not None and agent in self.agents
+
+    # --- Уровни ---
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get_memory(key)
+        if value is None and self.disk is not None:
+            value = self._get_disk(key)
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Как get, но SQLite-уровень читается в потоке, а не в event loop."""
+        value = self._get_memory(key)
+        if value is None and self.disk is not None:
+            value = await asyncio.to_thread(self._get_disk, key)
+        return value
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            value, created = item
+            if not self.ttl or now - created <= self.ttl:
+                self._memory.move_to_end(key)
+                self._hit("memory_hits", value)
+                return value
+            del self._memory[key]
+        return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        value = self.disk.get(key)
+        if value is not None:
+            with self._lock:
+                self._remember(key, value)
+                self._hit("disk_hits", value)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._remember(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    async def aput(self, key: str, value: str) -> None:
+        with self._lock:
+            self._remember(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, value)
+
+    def _remember(self, key: str, value: str) -> None:
+        self._memory[key] = (value, time.time())
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _hit(self, kind: str, value: str) -> None:
+        self._stats[kind] += 1
+        self._stats["bytes_saved"] += len(value.encode("utf-8"))
+
+    # --- Single-flight ---
+
+    def get_or_compute(self, key: str, compute: Callable[[], str], cacheable: Callable[[str], bool]) -> str:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            event.wait()
+            value = self.get(key)
+            if value is not None:
+                return value
+            # Лидер получил ошибку — идем в сеть сами
+            return compute()
+
+        try:
+            with self._lock:
+                self._stats["misses"] += 1
+            value = compute()
+            if cacheable(value):
+                self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    async def aget_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[str]], cacheable: Callable[[str], bool]
+    ) -> str:
+        value = await self.aget(key)
+        if value is not None:
+            return value
+
+        loop = asyncio.get_running_loop()
+        flight = (loop, key)
+        with self._lock:
+            fut = self._ainflight.get(flight)
+            leader = fut is None
+            if leader:
+                fut = self._ainflight[flight] = loop.create_future()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            # Как в синхронной ветке: после лидера ответ берется из кеша,
+            # а если лидер упал или ответ не кешируется — идем в сеть сами
+            await asyncio.shield(fut)
+            value = await self.aget(key)
+            if value is not None:
+                return value
+            return await compute()
+
+        try:
+            with self._lock:
+                self._stats["misses"] += 1
+            value = await compute()
+            if cacheable(value):
+                await self.aput(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._ainflight.pop(flight, None)
+            fut.set_result(None)
+
+    # --- Наблюдаемость ---
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["memory_entries"] = len(self._memory)
+        hits = out["memory_hits"] + out["disk_hits"]
+        total = hits + out["misses"]
+        out["hit_ratio"] = hits / total if total else 0.0
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+def cache_from_env() -> Optional[ResponseCache]:
+    """Кеш по настройкам окружения; None, если LLM_CACHE_ENABLED не включен."""
+    if os.getenv("LLM_CACHE_ENABLED", "false").lower() != "true":
+        return None
+    agents_env = os.getenv("LLM_CACHE_AGENTS")
+    agents = {a.strip() for a in agents_env.split(",") if a.strip()} if agents_env is not None else None
+    return ResponseCache(
+        path=os.getenv("LLM_CACHE_PATH", "outputs/llm_cache.sqlite3") or None,
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+        ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+        max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        agents=agents,
+    )
@@ -1,18 +1,50 @@
 import json
 import os
+import uuid
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Union
 
+from journal import InterviewJournal, archive_journal, journal_dir
+
 Thought = Dict[str, str]
 InternalThoughts = List[Thought]
 Log = Dict[str, Any]
 
+# Открытые журналы сессий (путь журнала хранится в самом логе)
+_journals: Dict[str, InterviewJournal] = {}
+
+def _journal_enabled() -> bool:
+    return os.getenv("JOURNAL_ENABLED", "true").lower() == "true"
+
+def _journal_for(log: Log) -> Optional[InterviewJournal]:
+    path = log.get("journal_path")
+    if not path:
+        return None
+    journal = _journals.get(path)
+    if journal is None and os.path.exists(path):
+        # Сессию продолжает другой процесс (session_store.py): дописываем тот же журнал
+        journal = InterviewJournal.from_env(path)
+        _journals[path] = journal
+    return journal
+
 def start_session(participant_name: str) -> Log:
-    return {
+    log: Log = {
         "participant_name": participant_name,
         "turns": [],
         "final_feedback": "",
     }
+    if _journal_enabled():
+        # Суффикс uuid: параллельные сессии в одну секунду не делят журнал
+        path = os.path.join(journal_dir(), make_log_filename(prefix=f"interview_log_{uuid.uuid4().hex[:8]}", ext="jsonl"))
+        journal = InterviewJournal.from_env(path)
+        _journals[path] = journal
+        log["journal_path"] = path
+        journal.append({
+            "type": "session",
+            "participant_name": participant_name,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        })
+    return log
 
 def _normalize_internal_thoughts(
     internal_thoughts: Union[str, InternalThoughts, None],
@@ -32,7 +64,8 @@ def _normalize_internal_thoughts(
             if not isinstance(item, dict):
                 continue
             frm = str(item.get("from", "")).strip()
-            to = str(item.get("to", "")).strip()
+            # Узлы графа адресата не указывают: мысли идут интервьюеру
+            to = str(item.get("to", "")).strip() or default_to
             content = str(item.get("content", "")).strip()
             if frm and to and content:
                 norm.append({"from": frm, "to": to, "content": content})
@@ -46,38 +79,44 @@ def add_turn(
     agent_visible_message: str,
 ) -> int:
     turn_id = len(log["turns"]) + 1
-    log["turns"].append(
-        {
-            "turn_id": turn_id,
-            "user_message": user_message,
-            "internal_thoughts": _normalize_internal_thoughts(internal_thoughts),
-            "agent_visible_message": agent_visible_message,
-        }
-    )
+    turn = {
+        "turn_id": turn_id,
+        "user_message": user_message,
+        "internal_thoughts": _normalize_internal_thoughts(internal_thoughts),
+        "agent_visible_message": agent_visible_message,
+    }
+    log["turns"].append(turn)
+    journal = _journal_for(log)
+    if journal is not None:
+        journal.append({"type": "turn", "turn": turn})
     return turn_id
 
 def set_final_feedback(log: Log, final_feedback: str) -> None:
     log["final_feedback"] = final_feedback
+    journal = _journal_for(log)
+    if journal is not None:
+        journal.append({"type": "final_feedback", "text": final_feedback})
+
+def set_metrics(log: Log, summary: Dict[str, Any]) -> None:
+    """Сводка метрик сессии (латентность узлов, токены по агентам) — попадает в экспорт лога."""
+    if summary:
+        log["metrics"] = summary
 
 def make_log_filename(prefix: str = "interview_log", ext: str = "json") -> str:
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     return f"{prefix}_{ts}.{ext}"
 
-def save_log(
-    log: Log,
-    filename: Optional[str] = None,
-    out_dir: str = "outputs",
-) -> str:
-    os.makedirs(out_dir, exist_ok=True)
-    if not filename:
-        filename = make_log_filename()
-    path = os.path.join(out_dir, filename)
-
+def export_log(log: Log) -> Dict[str, Any]:
+    """Лог в формате файла interview_log_*.json."""
     export_data = {
         "participant_name": log.get("participant_name", "Unknown"),
         "turns": [],
         "final_feedback": log.get("final_feedback", "")
     }
+    if log.get("metrics"):
+        export_data["metrics"] = log["metrics"]
+    if log.get("scorecard"):
+        export_data["scorecard"] = log["scorecard"]
 
     for turn in log.get("turns", []):
         thoughts_list = turn.get("internal_thoughts", [])
@@ -103,8 +142,30 @@ def save_log(
             "user_message": turn["user_message"], # Ответ
             "internal_thoughts": final_thoughts_str # Мысли
         })
+    return export_data
+
+def save_log(
+    log: Log,
+    filename: Optional[str] = None,
+    out_dir: str = "outputs",
+) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    if not filename:
+        filename = make_log_filename()
+    path = os.path.join(out_dir, filename)
+
+    # Пишем во временный файл и атомарно подменяем: оборванная запись не портит лог
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(export_log(log), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
 
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(export_data, f, ensure_ascii=False, indent=2)
+    # Журнал больше не нужен: экспорт записан, журнал уходит в архив
+    journal = _journal_for(log)
+    if journal is not None:
+        journal.append({"type": "compacted", "path": path})
+        journal.close()
+        _journals.pop(log["journal_path"], None)
+        archive_journal(log["journal_path"])
 
-    return path
\ No newline at end of file
+    return path
@@ -0,0 +1,407 @@
+"""
+Метрики латентности и токенов: узлы графа и вызовы LLM по агентам.
+
+Данные копятся в памяти процесса (гистограммы с p50/p95/p99), отдаются в
+текстовом формате Prometheus (to_prometheus() или HTTP при METRICS_PORT)
+и, если задан METRICS_TRACE_PATH, пишутся по событию в JSONL.
+Сводка по сессии (thread_id графа) добавляется в лог интервью: метрики ходов —
+при постановке отчета в очередь (report_jobs.submit_report), метрики отчета —
+воркером, который его построил (в том числе в другом процессе). Сводки сессий,
+которые закончились без отчета, выбрасываются после METRICS_SESSION_TTL секунд простоя.
+
+    python metrics.py outputs/metrics_trace.jsonl   # сводка по trace-файлу
+"""
+import argparse
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from utils import estimate_tokens
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("metrics_session", default=None)
+_call: contextvars.ContextVar[Optional["CallRecord"]] = contextvars.ContextVar("metrics_call", default=None)
+
+
+class Histogram:
+    """Счетчик + сумма + скользящая выборка последних значений для перцентилей."""
+
+    def __init__(self, size: int = 2048) -> None:
+        self.count = 0
+        self.total = 0.0
+        self._values: Deque[float] = deque(maxlen=size)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self._values.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._values:
+            return None
+        ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"count": self.count, "sum": round(self.total, 4)}
+        for q in QUANTILES:
+            value = self.quantile(q)
+            out[f"p{int(q * 100)}"] = round(value, 4) if value is not None else None
+        return out
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Registry:
+    def __init__(self) -> None:
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        hist = self.histograms.get((name, labels))
+        if hist is None:
+            hist = self.histograms[(name, labels)] = Histogram()
+        hist.observe(value)
+
+    def inc(self, name: str, labels: Labels, value: float = 1) -> None:
+        self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+
+class Metrics:
+    def __init__(self, trace_path: Optional[str] = None, session_ttl: float = 3600.0) -> None:
+        self.trace_path = trace_path
+        self.session_ttl = session_ttl
+        self._lock = threading.Lock()
+        self._global = _Registry()
+        self._sessions: Dict[str, _Registry] = {}
+        # Время последней записи по сессии: брошенные сессии выбрасываются по TTL
+        self._session_used: Dict[str, float] = {}
+        # Мгновенные значения (глубина очереди и т.п.) — только глобально, без сессий
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._trace_file = None
+
+    def _registries(self, session: Optional[str]) -> List[_Registry]:
+        regs = [self._global]
+        if session:
+            now = time.monotonic()
+            reg = self._sessions.get(session)
+            if reg is None:
+                self._evict_idle(now)
+                reg = self._sessions[session] = _Registry()
+            self._session_used[session] = now
+            regs.append(reg)
+        return regs
+
+    def _evict_idle(self, now: float) -> None:
+        # Под self._lock; вызывается при появлении новой сессии
+        deadline = now - self.session_ttl
+        for session in [s for s, used in self._session_used.items() if used < deadline]:
+            self._sessions.pop(session, None)
+            del self._session_used[session]
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            for reg in self._registries(_session.get()):
+                reg.observe(name, key, value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            for reg in self._registries(_session.get()):
+                reg.inc(name, key, value)
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def trace(self, event: Dict[str, Any]) -> None:
+        if not self.trace_path:
+            return
+        event = {"ts": round(time.time(), 3), "session": _session.get(), **event}
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._trace_file is None:
+                os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+                self._trace_file = open(self.trace_path, "a", encoding="utf-8")
+            self._trace_file.write(line)
+            self._trace_file.flush()
+
+    # --- Экспорт ---
+
+    @staticmethod
+    def _snapshot(reg: _Registry) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for (name, labels), hist in reg.histograms.items():
+            out.setdefault(name, {})[_label_key(labels)] = hist.summary()
+        for (name, labels), value in reg.counters.items():
+            out.setdefault(name, {})[_label_key(labels)] = value
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = self._snapshot(self._global)
+            for (name, labels), value in self._gauges.items():
+                out.setdefault(name, {})[_label_key(labels)] = value
+            return out
+
+    def session_summary(self, session: str, pop: bool = True) -> Dict[str, Any]:
+        """Метрики одной сессии; pop=True освобождает память после выгрузки в лог."""
+        with self._lock:
+            if pop:
+                reg = self._sessions.pop(session, None)
+                self._session_used.pop(session, None)
+            else:
+                reg = self._sessions.get(session)
+            return self._snapshot(reg) if reg is not None else {}
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            hists = sorted(self._global.histograms.items())
+            counters = sorted(self._global.counters.items())
+            seen = set()
+            for (name, labels), hist in hists:
+                if name not in seen:
+                    lines.append(f"# TYPE {name} summary")
+                    seen.add(name)
+                for q in QUANTILES:
+                    value = hist.quantile(q)
+                    if value is not None:
+                        lines.append(f"{name}{_prom_labels(labels + (('quantile', str(q)),))} {value:.6f}")
+                lines.append(f"{name}_sum{_prom_labels(labels)} {hist.total:.6f}")
+                lines.append(f"{name}_count{_prom_labels(labels)} {hist.count}")
+            for (name, labels), value in counters:
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                lines.append(f"{name}{_prom_labels(labels)} {value:g}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} gauge")
+                    seen.add(name)
+                lines.append(f"{name}{_prom_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def merge_summaries(base: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Сводки двух частей сессии (ходы и отчет): значения extra заменяют совпавшие метки."""
+    out = {name: dict(values) for name, values in (base or {}).items()}
+    for name, values in (extra or {}).items():
+        out.setdefault(name, {}).update(values)
+    return out
+
+
+def _label_key(labels: Labels) -> str:
+    return ",".join(f"{k}={v}" for k, v in labels) or "all"
+
+
+def _prom_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + body + "}"
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics(
+                    trace_path=os.getenv("METRICS_TRACE_PATH") or None,
+                    session_ttl=float(os.getenv("METRICS_SESSION_TTL", "3600")),
+                )
+    return _metrics
+
+
+# --- Контексты измерения ---
+
+@contextmanager
+def session(session_id: Optional[str]) -> Iterator[None]:
+    """Все метрики внутри блока дополнительно копятся в сводку сессии."""
+    token = _session.set(session_id)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+class CallRecord:
+    def __init__(self, agent: str, prompt_tokens: int) -> None:
+        self.agent = agent
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = 0
+        self.retries = 0
+
+    def completion(self, text: Any) -> None:
+        self.completion_tokens = estimate_tokens(str(text or ""))
+
+
+@contextmanager
+def llm_call(agent: Optional[str], prompt_tokens: int) -> Iterator[CallRecord]:
+    """Замер одного обращения к LLM: время, токены, ретраи, ошибки."""
+    record = CallRecord(agent or "unknown", prompt_tokens)
+    token = _call.set(record)
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield record
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        _call.reset(token)
+        elapsed = time.perf_counter() - started
+        m = get_metrics()
+        m.observe("llm_call_seconds", elapsed, agent=record.agent)
+        m.inc("llm_calls_total", agent=record.agent)
+        m.inc("llm_prompt_tokens_total", record.prompt_tokens, agent=record.agent)
+        m.inc("llm_completion_tokens_total", record.completion_tokens, agent=record.agent)
+        if record.retries:
+            m.inc("llm_retries_total", record.retries, agent=record.agent)
+        if not ok:
+            m.inc("llm_errors_total", agent=record.agent)
+        m.trace({
+            "kind": "llm", "name": record.agent, "seconds": round(elapsed, 4), "ok": ok,
+            "prompt_tokens": record.prompt_tokens, "completion_tokens": record.completion_tokens,
+            "retries": record.retries,
+        })
+
+
+def note_retry() -> None:
+    """Вызывается из ResilientCaller при повторе запроса."""
+    record = _call.get()
+    if record is not None:
+        record.retries += 1
+
+
+def note_parse_failure(agent: Optional[str]) -> None:
+    m = get_metrics()
+    m.inc("llm_parse_failures_total", agent=agent or "unknown")
+    m.trace({"kind": "parse_failure", "name": agent or "unknown"})
+
+
+def _observe_node(name: str, elapsed: float, ok: bool) -> None:
+    m = get_metrics()
+    m.observe("node_seconds", elapsed, node=name)
+    if not ok:
+        m.inc("node_errors_total", node=name)
+    m.trace({"kind": "node", "name": name, "seconds": round(elapsed, 4), "ok": ok})
+
+
+def _thread_id() -> Optional[str]:
+    """thread_id текущего запуска графа (None вне графа)."""
+    try:
+        from langgraph.config import get_config
+        config = get_config()
+    except (ImportError, RuntimeError):
+        return None
+    return (config.get("configurable") or {}).get("thread_id")
+
+
+def instrument_node(name: str, fn: Callable[..., Any], is_async: bool = False) -> Callable[..., Any]:
+    """Обертка узла графа: время выполнения и привязка метрик к thread_id сессии."""
+    if is_async:
+        async def anode(state: Dict[str, Any]) -> Any:
+            with session(_thread_id() or _session.get()):
+                started = time.perf_counter()
+                ok = False
+                try:
+                    result = await fn(state)
+                    ok = True
+                    return result
+                finally:
+                    _observe_node(name, time.perf_counter() - started, ok)
+        return anode
+
+    def node(state: Dict[str, Any]) -> Any:
+        with session(_thread_id() or _session.get()):
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = fn(state)
+                ok = True
+                return result
+            finally:
+                _observe_node(name, time.perf_counter() - started, ok)
+    return node
+
+
+# --- HTTP-экспорт для Prometheus ---
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        body = get_metrics().to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def serve_from_env() -> Optional[int]:
+    """Поднимает /metrics в фоновом потоке, если задан METRICS_PORT (один раз на процесс)."""
+    global _server
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    with _metrics_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("127.0.0.1", int(port)), _Handler)
+            except OSError as e:
+                print(f"[Metrics] Не удалось открыть порт {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-http").start()
+            print(f"[Metrics] Prometheus: http://127.0.0.1:{port}/metrics")
+    return int(port)
+
+
+def summarize_trace(path: str) -> Dict[str, Any]:
+    """Перцентили по событиям trace-файла (узлы и вызовы LLM)."""
+    hists: Dict[str, Histogram] = {}
+    totals: Dict[str, Dict[str, int]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                continue
+            key = f"{ev.get('kind')}:{ev.get('name')}"
+            if "seconds" in ev:
+                hists.setdefault(key, Histogram(size=100000)).observe(float(ev["seconds"]))
+            agg = totals.setdefault(key, {"events": 0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0})
+            agg["events"] += 1
+            for field in ("prompt_tokens", "completion_tokens", "retries"):
+                agg[field] += int(ev.get(field, 0) or 0)
+    return {key: {**totals[key], **(hists[key].summary() if key in hists else {})} for key in sorted(totals)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сводка по trace-файлу метрик")
+    parser.add_argument("path", nargs="?", default=os.getenv("METRICS_TRACE_PATH", "outputs/metrics_trace.jsonl"))
+    args = parser.parse_args()
+    print(json.dumps(summarize_trace(args.path), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
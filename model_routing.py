@@ -0,0 +1,120 @@
+"""
+Маршрутизация агентов по профилям моделей.
+
+Профиль — провайдер, модель, температура, таймаут и лимит токенов ответа.
+Профиль default собирается из LLM_PROVIDER / LLM_MODEL / LLM_TEMPERATURE /
+LLM_TIMEOUT / LLM_MAX_TOKENS; остальные профили наследуют от него
+незаданные поля. Агент без маршрута работает на default.
+
+Через окружение:
+    LLM_PROFILE_FAST_MODEL=GigaChat
+    LLM_PROFILE_FAST_TEMPERATURE=0
+    LLM_PROFILE_FAST_MAX_TOKENS=200
+    LLM_ROUTE_FACTCHECK_ROUTER=fast
+    LLM_ROUTE_FACTCHECK=fast
+
+Или файлом LLM_ROUTING_PATH (JSON; переменные окружения важнее файла):
+    {"profiles": {"fast": {"model": "GigaChat", "temperature": 0, "max_tokens": 200}},
+     "routes": {"factcheck_router": "fast", "factcheck": "fast", "intake": "fast"}}
+
+    python model_routing.py   # итоговые профили и маршруты
+"""
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_PROFILE = "default"
+PROFILE_FIELDS = ("provider", "model", "temperature", "timeout", "max_tokens")
+_PROFILE_PREFIX = "LLM_PROFILE_"
+_ROUTE_PREFIX = "LLM_ROUTE_"
+
+Profile = Dict[str, Any]
+
+
+def _coerce(field: str, value: Any) -> Any:
+    if value is None or value == "":
+        return None
+    if field == "provider":
+        return str(value).lower()
+    if field == "model":
+        return str(value)
+    if field == "temperature":
+        return float(value)
+    return int(value)
+
+
+def default_profile() -> Profile:
+    return {
+        "provider": os.getenv("LLM_PROVIDER", "gigachat").lower(),
+        "model": os.getenv("LLM_MODEL") or None,
+        "temperature": float(os.getenv("LLM_TEMPERATURE", "0.2")),
+        "timeout": int(os.getenv("LLM_TIMEOUT", "30")),
+        "max_tokens": _coerce("max_tokens", os.getenv("LLM_MAX_TOKENS")),
+    }
+
+
+def _load_file(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Не удалось прочитать LLM_ROUTING_PATH {path}: {e}") from e
+    return data if isinstance(data, dict) else {}
+
+
+def load_routing() -> Tuple[Dict[str, Profile], Dict[str, str]]:
+    """Профили (с унаследованными полями) и маршруты агент -> профиль."""
+    raw_profiles: Dict[str, Dict[str, Any]] = {}
+    routes: Dict[str, str] = {}
+
+    path = os.getenv("LLM_ROUTING_PATH", "")
+    if path:
+        data = _load_file(path)
+        for name, fields in (data.get("profiles") or {}).items():
+            raw_profiles[name.lower()] = {k: v for k, v in (fields or {}).items() if k in PROFILE_FIELDS}
+        routes.update({agent.lower(): str(p).lower() for agent, p in (data.get("routes") or {}).items()})
+
+    for key, value in os.environ.items():
+        if key.startswith(_PROFILE_PREFIX):
+            # LLM_PROFILE_<ИМЯ>_<ПОЛЕ>: поле ищется с конца, имя профиля может содержать "_"
+            rest = key[len(_PROFILE_PREFIX):].lower()
+            for field in PROFILE_FIELDS:
+                if rest.endswith("_" + field):
+                    raw_profiles.setdefault(rest[: -len(field) - 1], {})[field] = value
+                    break
+        elif key.startswith(_ROUTE_PREFIX) and value:
+            routes[key[len(_ROUTE_PREFIX):].lower()] = value.lower()
+
+    base = default_profile()
+    profiles = {DEFAULT_PROFILE: base}
+    for name, fields in raw_profiles.items():
+        profile = dict(base)
+        for field, value in fields.items():
+            coerced = _coerce(field, value)
+            if coerced is not None:
+                profile[field] = coerced
+        # Другой провайдер — модель по умолчанию этого провайдера, а не чужая из LLM_MODEL
+        if profile["provider"] != base["provider"] and "model" not in fields:
+            profile["model"] = None
+        profiles[name] = profile
+
+    unknown = {p for p in routes.values() if p not in profiles}
+    if unknown:
+        raise ValueError(f"Маршруты ссылаются на неизвестные профили: {', '.join(sorted(unknown))}")
+    return profiles, routes
+
+
+def profile_name_for(routes: Dict[str, str], agent: Optional[str]) -> str:
+    return routes.get((agent or "").lower(), DEFAULT_PROFILE)
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    profiles, routes = load_routing()
+    print(json.dumps({"profiles": profiles, "routes": routes}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
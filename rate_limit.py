@@ -0,0 +1,371 @@
+"""
+Лимит обращений к провайдеру LLM: запросы в секунду и токены в минуту.
+
+Квота хранится в двух ведрах токенов (requests, tokens). Ведра живут либо в
+памяти процесса, либо в SQLite-файле RATE_LIMIT_PATH — тогда квоту делят все
+локальные процессы (app.py, ui.py, batch_report.py). Списание из обоих ведер
+выполняется одной транзакцией.
+
+Классы приоритета (по имени агента):
+  interactive — intake, interviewer, memory: ждут квоту, не отбрасываются;
+  factcheck   — router и FactChecker;
+  background  — reporter, reporter_map, assessor, пакетные отчеты.
+
+Внутри процесса ожидающие запросы обслуживаются в порядке приоритета.
+Между процессами младший класс не может опустошить ведро ниже своего резерва
+(RATE_LIMIT_RESERVE — доля емкости, для factcheck — половина). Если ожидание
+не укладывается в срок класса (RATE_LIMIT_DEADLINE_<CLASS>), запрос
+отбрасывается с RateLimitedError — агенты обрабатывают ее как недоступность LLM.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import metrics
+from resilience import LLMUnavailableError
+
+INTERACTIVE, FACTCHECK, BACKGROUND = "interactive", "factcheck", "background"
+PRIORITY = {INTERACTIVE: 0, FACTCHECK: 1, BACKGROUND: 2}
+AGENT_CLASSES = {
+    "intake": INTERACTIVE,
+    "interviewer": INTERACTIVE,
+    "memory": INTERACTIVE,
+    "factcheck_router": FACTCHECK,
+    "factcheck": FACTCHECK,
+    "reporter": BACKGROUND,
+    "reporter_map": BACKGROUND,
+    "assessor": BACKGROUND,
+    "question_bank": BACKGROUND,
+}
+# Доля резерва по классам (умножается на RATE_LIMIT_RESERVE)
+RESERVE_SHARE = {INTERACTIVE: 0.0, FACTCHECK: 0.5, BACKGROUND: 1.0}
+
+# Ожидающий запрос в очереди процесса: (приоритет, порядковый номер, токены)
+Ticket = Tuple[int, int, float]
+
+
+class RateLimitedError(LLMUnavailableError):
+    """Запрос отброшен лимитером: квота не освободится до срока его класса."""
+
+    def __init__(self, provider: str, priority_class: str, wait: float) -> None:
+        super().__init__(provider, f"лимит запросов, класс {priority_class} ждал бы {wait:.1f} c")
+        self.priority_class = priority_class
+        self.wait = wait
+
+
+def priority_class(agent: Optional[str]) -> str:
+    return AGENT_CLASSES.get(agent or "", FACTCHECK)
+
+
+class _Buckets(ABC):
+    """
+    Два ведра с пополнением по времени. levels/updated хранит наследник:
+    в памяти процесса или в общем SQLite-файле. blocking — take/adjust ходят
+    в файл и могут ждать его блокировку (из event loop их вызывают в потоке).
+    """
+
+    blocking = False
+
+    def __init__(self, rps: float, burst: float, tpm: float) -> None:
+        self.capacity = {"requests": burst if rps > 0 else 0.0, "tokens": tpm}
+        self.rate = {"requests": rps, "tokens": tpm / 60.0}
+
+    def _refill(self, levels: Dict[str, float], elapsed: float) -> None:
+        for name, cap in self.capacity.items():
+            if cap > 0:
+                levels[name] = min(cap, levels[name] + max(0.0, elapsed) * self.rate[name])
+
+    def _plan(self, levels: Dict[str, float], requests: float, tokens: float, reserve: float) -> float:
+        """0 — квоты хватает (levels уже уменьшены), иначе секунды до ее появления."""
+        need = {"requests": requests, "tokens": tokens}
+        wait = 0.0
+        for name, cap in self.capacity.items():
+            if cap <= 0:
+                continue
+            floor = reserve * cap
+            # Запрос крупнее ведра пропускается, когда ведро полно (до резерва)
+            amount = min(need[name], cap - floor)
+            deficit = amount + floor - levels[name]
+            if deficit > 0:
+                wait = max(wait, deficit / self.rate[name])
+        if wait > 0:
+            return wait
+        for name, cap in self.capacity.items():
+            if cap > 0:
+                levels[name] -= min(need[name], cap - reserve * cap)
+        return 0.0
+
+    @abstractmethod
+    def take(self, requests: float, tokens: float, reserve: float, dry_run: bool = False) -> float:
+        """Списывает квоту (0) или возвращает секунды до ее появления."""
+
+    @abstractmethod
+    def adjust(self, tokens: float) -> None:
+        """Поправка ведра токенов после ответа: возврат переоценки или долг."""
+
+
+class LocalBuckets(_Buckets):
+    def __init__(self, rps: float, burst: float, tpm: float) -> None:
+        super().__init__(rps, burst, tpm)
+        self._lock = threading.Lock()
+        self._levels = dict(self.capacity)
+        self._updated = time.monotonic()
+
+    def _levels_now(self) -> Dict[str, float]:
+        now = time.monotonic()
+        self._refill(self._levels, now - self._updated)
+        self._updated = now
+        return self._levels
+
+    def take(self, requests: float, tokens: float, reserve: float, dry_run: bool = False) -> float:
+        with self._lock:
+            levels = self._levels_now()
+            return self._plan(dict(levels) if dry_run else levels, requests, tokens, reserve)
+
+    def adjust(self, tokens: float) -> None:
+        with self._lock:
+            levels = self._levels_now()
+            if self.capacity["tokens"] > 0:
+                levels["tokens"] = min(self.capacity["tokens"], levels["tokens"] + tokens)
+
+
+class SQLiteBuckets(_Buckets):
+    """Ведра в файле: общий лимит для всех процессов с тем же RATE_LIMIT_PATH."""
+
+    blocking = True
+
+    def __init__(self, rps: float, burst: float, tpm: float, path: str, scope: str) -> None:
+        super().__init__(rps, burst, tpm)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _transact(self, fn: Callable[[Dict[str, float]], Tuple[float, bool]]) -> float:
+        """fn получает пополненные уровни и возвращает (результат, нужно ли записать уровни)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                rows = dict(self._conn.execute(
+                    "SELECT name, level FROM buckets WHERE name IN (?, ?)",
+                    (f"{self.scope}:requests", f"{self.scope}:tokens"),
+                ).fetchall())
+                row = self._conn.execute(
+                    "SELECT updated FROM buckets WHERE name = ?", (f"{self.scope}:tokens",)
+                ).fetchone()
+                levels = {name: rows.get(f"{self.scope}:{name}", cap) for name, cap in self.capacity.items()}
+                self._refill(levels, now - row[0] if row else 0.0)
+                result, changed = fn(levels)
+                if changed:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                        [(f"{self.scope}:{name}", level, now) for name, level in levels.items()],
+                    )
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def take(self, requests: float, tokens: float, reserve: float, dry_run: bool = False) -> float:
+        def fn(levels: Dict[str, float]) -> Tuple[float, bool]:
+            wait = self._plan(levels, requests, tokens, reserve)
+            return wait, wait == 0 and not dry_run
+        return self._transact(fn)
+
+    def adjust(self, tokens: float) -> None:
+        def fn(levels: Dict[str, float]) -> Tuple[float, bool]:
+            if self.capacity["tokens"] > 0:
+                levels["tokens"] = min(self.capacity["tokens"], levels["tokens"] + tokens)
+            return 0.0, True
+        self._transact(fn)
+
+
+class RateLimiter:
+    """
+    Очередь с приоритетами поверх ведер. Запрос резервирует токены промпта
+    плюс оценку ответа (completion_estimate); после ответа settle() сверяет
+    резерв с фактом.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        buckets: _Buckets,
+        reserve: float = 0.2,
+        deadlines: Optional[Dict[str, Optional[float]]] = None,
+        completion_estimate: int = 300,
+        poll_interval: float = 0.05,
+    ) -> None:
+        self.provider = provider
+        self.buckets = buckets
+        self.reserve = reserve
+        self.deadlines = deadlines or {}
+        self.completion_estimate = completion_estimate
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._queue: List[Ticket] = []
+        self._seq = itertools.count()
+        # Фоновые поправки settle: ссылки держатся до завершения, ошибки печатаются
+        self._adjusting: Set["asyncio.Future[None]"] = set()
+
+    @classmethod
+    def from_env(cls, provider: str) -> Optional["RateLimiter"]:
+        """None, если не задан ни RATE_LIMIT_RPS, ни RATE_LIMIT_TPM."""
+        rps = float(os.getenv("RATE_LIMIT_RPS", "0"))
+        tpm = float(os.getenv("RATE_LIMIT_TPM", "0"))
+        if rps <= 0 and tpm <= 0:
+            return None
+        burst = float(os.getenv("RATE_LIMIT_BURST", "0")) or max(1.0, rps)
+        path = os.getenv("RATE_LIMIT_PATH", os.path.join("outputs", "ratelimit.sqlite3"))
+        buckets = SQLiteBuckets(rps, burst, tpm, path, scope=provider) if path else LocalBuckets(rps, burst, tpm)
+
+        def deadline(name: str, default: str) -> Optional[float]:
+            value = float(os.getenv(f"RATE_LIMIT_DEADLINE_{name.upper()}", default))
+            return value if value > 0 else None
+
+        return cls(
+            provider,
+            buckets,
+            reserve=float(os.getenv("RATE_LIMIT_RESERVE", "0.2")),
+            deadlines={
+                INTERACTIVE: deadline(INTERACTIVE, "0"),
+                FACTCHECK: deadline(FACTCHECK, "5"),
+                BACKGROUND: deadline(BACKGROUND, "120"),
+            },
+            completion_estimate=int(os.getenv("RATE_LIMIT_COMPLETION_TOKENS", "300")),
+        )
+
+    # --- Очередь процесса ---
+
+    def _enqueue(self, cls_name: str, tokens: float) -> Ticket:
+        ticket = (PRIORITY[cls_name], next(self._seq), tokens)
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self._publish_depth()
+        return ticket
+
+    def _dequeue(self, ticket: Ticket) -> None:
+        with self._cond:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._publish_depth()
+            self._cond.notify_all()
+
+    def _publish_depth(self) -> None:
+        depth = {name: 0 for name in PRIORITY}
+        by_priority = {p: name for name, p in PRIORITY.items()}
+        for prio, _, _ in self._queue:
+            depth[by_priority[prio]] += 1
+        m = metrics.get_metrics()
+        for name, value in depth.items():
+            m.set_gauge("llm_ratelimit_queue_depth", value, priority=name)
+
+    def _ahead(self, ticket: Ticket) -> Tuple[int, float]:
+        with self._cond:
+            ahead = [t for t in self._queue if t < ticket]
+        return len(ahead), sum(t[2] for t in ahead)
+
+    def _step(self, ticket: Ticket, cls_name: str, started: float) -> float:
+        """Одна попытка: 0 — квота списана, иначе сколько подождать перед следующей."""
+        reserve = self.reserve * RESERVE_SHARE[cls_name]
+        with self._cond:
+            is_head = self._queue[0] == ticket
+        if is_head:
+            wait = self.buckets.take(1, ticket[2], reserve)
+            if wait == 0:
+                return 0.0
+            estimate = wait
+        else:
+            # Впереди есть запросы: оценка с учетом их потребности, без списания
+            count, tokens = self._ahead(ticket)
+            estimate = self.buckets.take(count + 1, tokens + ticket[2], reserve, dry_run=True)
+        deadline = self.deadlines.get(cls_name)
+        waited = time.monotonic() - started
+        if deadline is not None and waited + estimate > deadline:
+            metrics.get_metrics().inc("llm_ratelimit_shed_total", priority=cls_name)
+            print(f"[DEBUG] RateLimiter: отброшен запрос класса {cls_name} (ожидание {waited + estimate:.1f} c)")
+            raise RateLimitedError(self.provider, cls_name, waited + estimate)
+        # Короткие паузы: квоту могли вернуть другие процессы, а впереди — встать старший класс
+        return min(max(estimate, 0.001), self.poll_interval)
+
+    def _granted(self, cls_name: str, started: float) -> None:
+        metrics.get_metrics().observe("llm_ratelimit_wait_seconds", time.monotonic() - started, priority=cls_name)
+
+    def acquire(self, agent: Optional[str], prompt_tokens: int) -> float:
+        """Ждет квоту (или бросает RateLimitedError); возвращает зарезервированные токены."""
+        cls_name = priority_class(agent)
+        tokens = float(prompt_tokens + self.completion_estimate)
+        started = time.monotonic()
+        ticket = self._enqueue(cls_name, tokens)
+        try:
+            while True:
+                pause = self._step(ticket, cls_name, started)
+                if pause == 0:
+                    break
+                with self._cond:
+                    self._cond.wait(pause)
+        finally:
+            self._dequeue(ticket)
+        self._granted(cls_name, started)
+        return tokens
+
+    async def aacquire(self, agent: Optional[str], prompt_tokens: int) -> float:
+        """Асинхронный вариант acquire: ни ожидание, ни запрос к файлу ведер не блокируют event loop."""
+        cls_name = priority_class(agent)
+        tokens = float(prompt_tokens + self.completion_estimate)
+        started = time.monotonic()
+        ticket = self._enqueue(cls_name, tokens)
+        try:
+            while True:
+                if self.buckets.blocking:
+                    pause = await asyncio.to_thread(self._step, ticket, cls_name, started)
+                else:
+                    pause = self._step(ticket, cls_name, started)
+                if pause == 0:
+                    break
+                await asyncio.sleep(pause)
+        finally:
+            self._dequeue(ticket)
+        self._granted(cls_name, started)
+        return tokens
+
+    def settle(self, reserved: float, completion_tokens: int) -> None:
+        """Сверка резерва с фактической длиной ответа (0 — запрос не дошел до ответа)."""
+        delta = self.completion_estimate - completion_tokens
+        if not reserved or not delta:
+            return
+        if self.buckets.blocking:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                # Вызов из event loop: поправка пишется в файл в потоке, ответ ее не ждет
+                future = loop.run_in_executor(None, self.buckets.adjust, delta)
+                self._adjusting.add(future)
+                future.add_done_callback(self._adjusted)
+                return
+        self.buckets.adjust(delta)
+
+    def _adjusted(self, future: "asyncio.Future[None]") -> None:
+        self._adjusting.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Лимитер ({self.provider}): не удалось сверить резерв: {future.exception()}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {name: sum(1 for t in self._queue if t[0] == prio) for name, prio in PRIORITY.items()}
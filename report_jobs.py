@@ -0,0 +1,379 @@
+"""
+Очередь задач на итоговый отчет: стоп-команда не ждет Reporter.
+
+submit() кладет лог в SQLite-очередь (REPORT_QUEUE_PATH) и сразу возвращает
+id задачи. Воркеры (ReportWorkerPool) забирают задачи, генерируют отчет,
+пишут лог в outputs через save_log и отмечают задачу выполненной; UI и CLI
+опрашивают статус по id. Очередь переживает перезапуск и закрытую вкладку:
+задача с истекшей арендой (воркер упал) снова попадает в работу.
+
+Статусы: queued -> running -> done | failed. При LLMUnavailableError задача
+возвращается в очередь с паузой REPORT_RETRY_BACKOFF * 2^попытка; после
+REPORT_MAX_ATTEMPTS попыток лог все равно сохраняется с заглушкой вместо отчета.
+
+    python report_jobs.py worker --concurrency 2
+    python report_jobs.py list
+    python report_jobs.py show <job_id>
+    python report_jobs.py retry <job_id>
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+DEFAULT_REPORT_QUEUE_PATH = os.path.join("outputs", "report_jobs.sqlite3")
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_MAX_ATTEMPTS = int(os.getenv("REPORT_MAX_ATTEMPTS", "3"))
+REPORT_RETRY_BACKOFF = float(os.getenv("REPORT_RETRY_BACKOFF", "5"))
+# Аренда задачи: столько секунд воркер может молчать, прежде чем задачу заберет другой
+REPORT_LEASE_SEC = float(os.getenv("REPORT_LEASE_SEC", "300"))
+REPORT_POLL_INTERVAL = float(os.getenv("REPORT_POLL_INTERVAL", "1.0"))
+
+FALLBACK_FEEDBACK = "Отчет не сгенерирован: нейросеть недоступна. Лог сохранен, отчет можно пересобрать позже."
+TERMINAL = ("done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    log TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    final_feedback TEXT,
+    path TEXT,
+    error TEXT,
+    worker TEXT,
+    run_after REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, run_after);
+"""
+
+Job = Dict[str, Any]
+
+# Логи задач, поставленных этим процессом: воркер того же процесса берет живой
+# объект (оценки ходов дописываются в него фоном, см. agents/assessor.py)
+_live_logs: Dict[str, Dict[str, Any]] = {}
+
+
+class ReportQueue:
+    """
+    Очередь в одном SQLite-файле на несколько процессов: WAL, busy_timeout,
+    захват задачи в BEGIN IMMEDIATE — одну задачу не возьмут два воркера.
+    """
+
+    def __init__(self, path: str = DEFAULT_REPORT_QUEUE_PATH, busy_timeout_ms: int = 5000) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout_ms / 1000,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def submit(self, log: Dict[str, Any], thread_id: Optional[str] = None,
+               max_attempts: int = REPORT_MAX_ATTEMPTS) -> str:
+        """Ставит отчет в очередь и сразу возвращает id задачи."""
+        from logger import make_log_filename
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        # Имя файла фиксируется при постановке: повтор задачи перезаписывает тот же лог
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, thread_id, status, max_attempts, log, filename, run_after,"
+                " created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, thread_id, max(1, max_attempts), json.dumps(log, ensure_ascii=False),
+                 make_log_filename(), now, now, now),
+            )
+        _live_logs[job_id] = log
+        return job_id
+
+    def claim(self, worker: str, lease_sec: float = REPORT_LEASE_SEC) -> Optional[Job]:
+        """Забирает ближайшую готовую задачу (или задачу упавшего воркера)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE (status = 'queued' AND run_after <= ?)"
+                    " OR (status = 'running' AND lease_until < ?) ORDER BY run_after LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?,"
+                        " lease_until = ?, updated_at = ? WHERE job_id = ?",
+                        (worker, now + lease_sec, now, row["job_id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def complete(self, job_id: str, final_feedback: str, path: str, error: Optional[str] = None) -> None:
+        status = "failed" if error else "done"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, final_feedback = ?, path = ?, error = ?, lease_until = NULL,"
+                " updated_at = ? WHERE job_id = ?",
+                (status, final_feedback, path, error, time.time(), job_id),
+            )
+
+    def retry_later(self, job_id: str, error: str, delay: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, run_after = ?, lease_until = NULL, updated_at = ?"
+                " WHERE job_id = ?",
+                (error, now + delay, now, job_id),
+            )
+
+    def requeue(self, job_id: str) -> bool:
+        """Ручной перезапуск задачи (счетчик попыток обнуляется)."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, error = NULL, run_after = ?, updated_at = ?"
+                " WHERE job_id = ?",
+                (now, now, job_id),
+            )
+        return cur.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Статус задачи без тела лога — для опроса из UI."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, thread_id, status, attempts, max_attempts, final_feedback, path, error,"
+                " created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def wait(self, job_id: str, timeout: Optional[float] = None,
+             poll_interval: float = REPORT_POLL_INTERVAL) -> Optional[Job]:
+        """Ждет завершения задачи; по таймауту возвращает ее текущий статус."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in TERMINAL:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def list_jobs(self, limit: int = 50) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, thread_id, status, attempts, max_attempts, path, error, updated_at FROM jobs"
+                " ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+
+def run_job(queue: ReportQueue, job: Job, retry_backoff: float = REPORT_RETRY_BACKOFF) -> str:
+    """Отчет + save_log для одной задачи. Возвращает итоговый статус задачи."""
+    import metrics
+    from agents.reporter import generate_final_feedback
+    from llm import LLMUnavailableError
+    from logger import save_log, set_final_feedback, set_metrics
+
+    job_id = job["job_id"]
+    log = _live_logs.get(job_id) or json.loads(job["log"])
+    session_id = job["thread_id"] or job_id
+    error = None
+    try:
+        with metrics.session(session_id):
+            final_feedback = generate_final_feedback(log)
+    except LLMUnavailableError as e:
+        print(f"[DEBUG] Отчет {job_id}: попытка {job['attempts']}/{job['max_attempts']}: {e}")
+        if job["attempts"] < job["max_attempts"]:
+            queue.retry_later(job_id, str(e), retry_backoff * 2 ** (job["attempts"] - 1))
+            return "queued"
+        final_feedback, error = FALLBACK_FEEDBACK, str(e)
+
+    set_final_feedback(log, final_feedback)
+    # Метрики ходов пришли с задачей (submit_report), здесь добавляются метрики отчета
+    set_metrics(log, metrics.merge_summaries(log.get("metrics"), metrics.get_metrics().session_summary(session_id)))
+    path = save_log(log, filename=job["filename"])
+    queue.complete(job_id, final_feedback, path, error)
+    _live_logs.pop(job_id, None)
+    metrics.get_metrics().inc("report_jobs_total", status="failed" if error else "done")
+    return "failed" if error else "done"
+
+
+class ReportWorkerPool:
+    """
+    Фоновые потоки, разбирающие очередь. Число потоков — потолок одновременных
+    отчетов (REPORT_WORKERS): поток UI или CLI отчет не ждет и не занимает.
+    """
+
+    def __init__(self, queue: ReportQueue, concurrency: int = REPORT_WORKERS,
+                 poll_interval: float = REPORT_POLL_INTERVAL, retry_backoff: float = REPORT_RETRY_BACKOFF,
+                 lease_sec: float = REPORT_LEASE_SEC) -> None:
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.lease_sec = lease_sec
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self) -> "ReportWorkerPool":
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._loop, args=(f"{self._name}:{i}",), daemon=True,
+                                 name=f"report-worker-{i}")
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def notify(self) -> None:
+        """Будит воркеры сразу после submit, не дожидаясь очередного опроса."""
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _loop(self, worker: str) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(worker, self.lease_sec)
+            except sqlite3.Error as e:
+                print(f"[DEBUG] Очередь отчетов недоступна: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            try:
+                run_job(self.queue, job, self.retry_backoff)
+            except Exception as e:
+                # Неожиданная ошибка (диск, битый лог): задача уйдет в повтор по аренде
+                print(f"[DEBUG] Задача отчета {job['job_id']} упала: {e}")
+                if job["attempts"] < job["max_attempts"]:
+                    self.queue.retry_later(job["job_id"], str(e), self.retry_backoff)
+                else:
+                    self.queue.complete(job["job_id"], "", "", str(e))
+
+
+_queue: Optional[ReportQueue] = None
+_workers: Optional[ReportWorkerPool] = None
+_init_lock = threading.Lock()
+
+
+def get_report_queue() -> ReportQueue:
+    global _queue
+    if _queue is None:
+        with _init_lock:
+            if _queue is None:
+                _queue = ReportQueue(
+                    os.getenv("REPORT_QUEUE_PATH", DEFAULT_REPORT_QUEUE_PATH),
+                    busy_timeout_ms=int(os.getenv("REPORT_QUEUE_BUSY_TIMEOUT", "5000")),
+                )
+    return _queue
+
+
+def start_workers_from_env() -> Optional[ReportWorkerPool]:
+    """
+    Воркеры внутри процесса UI/CLI (REPORT_WORKERS_INPROCESS=true, по умолчанию).
+    При false очередь разбирают отдельные процессы: python report_jobs.py worker.
+    """
+    global _workers
+    if os.getenv("REPORT_WORKERS_INPROCESS", "true").lower() != "true":
+        return None
+    if _workers is None:
+        with _init_lock:
+            if _workers is None:
+                _workers = ReportWorkerPool(get_report_queue()).start()
+    return _workers
+
+
+def submit_report(log: Dict[str, Any], thread_id: Optional[str] = None) -> str:
+    """Ставит отчет в общую очередь и будит локальные воркеры."""
+    import metrics
+    from logger import set_metrics
+
+    if thread_id:
+        # Метрики ходов копились в этом процессе: они едут в лог задачи, чтобы
+        # попасть в отчет и тогда, когда его строит воркер другого процесса
+        set_metrics(log, metrics.get_metrics().session_summary(thread_id))
+    job_id = get_report_queue().submit(log, thread_id)
+    workers = start_workers_from_env()
+    if workers is not None:
+        workers.notify()
+    return job_id
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Очередь итоговых отчетов")
+    ap.add_argument("--db", default=os.getenv("REPORT_QUEUE_PATH", DEFAULT_REPORT_QUEUE_PATH))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    worker = sub.add_parser("worker", help="разбирать очередь до Ctrl+C")
+    worker.add_argument("--concurrency", type=int, default=REPORT_WORKERS)
+    sub.add_parser("list", help="последние задачи")
+    show = sub.add_parser("show", help="статус и отчет задачи (JSON)")
+    show.add_argument("job_id")
+    retry = sub.add_parser("retry", help="поставить задачу в очередь заново")
+    retry.add_argument("job_id")
+    args = ap.parse_args()
+
+    queue = ReportQueue(args.db)
+    if args.cmd == "worker":
+        pool = ReportWorkerPool(queue, args.concurrency).start()
+        print(f"[System]: {pool.concurrency} воркеров разбирают {args.db}")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pool.stop()
+    elif args.cmd == "list":
+        for j in queue.list_jobs():
+            updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(j["updated_at"]))
+            print(f"{j['job_id']}  {j['status']:<7} {j['attempts']}/{j['max_attempts']}  {updated}  {j['path'] or ''}")
+    elif args.cmd == "show":
+        job = queue.get(args.job_id)
+        if job is None:
+            raise SystemExit(f"Задача {args.job_id} не найдена")
+        print(json.dumps(job, ensure_ascii=False, indent=2))
+    elif args.cmd == "retry":
+        if not queue.requeue(args.job_id):
+            raise SystemExit(f"Задача {args.job_id} не найдена")
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
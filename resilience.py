@@ -0,0 +1,386 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+# Квота лимитера на один запрос к провайдеру: ждет ее и возвращает сверку,
+# которой передается ответ (None — запрос не дал ответа, резерв возвращается)
+Settle = Callable[[Any], None]
+Quota = Callable[[], Settle]
+AsyncQuota = Callable[[], Awaitable[Settle]]
+
+
+class LLMUnavailableError(RuntimeError):
+    """LLM не ответила: исчерпаны ретраи или открыт circuit breaker."""
+
+    def __init__(self, provider: str, message: str, attempts: int = 0) -> None:
+        super().__init__(f"LLM ({provider}) недоступна: {message}")
+        self.provider = provider
+        self.attempts = attempts
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Breaker открыт — запрос отклонен без обращения к провайдеру."""
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальная задержка с полным джиттером (attempt считается с 0)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Можно ли сейчас идти к провайдеру. В half_open пропускается один пробный запрос."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._stats["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                **self._stats,
+            }
+
+
+class LatencyWindow:
+    """Скользящее окно последних латентностей для порога хеджирования."""
+
+    def __init__(self, size: int = 200) -> None:
+        self._values: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, value: float) -> None:
+        with self._lock:
+            self._values.append(value)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._values:
+                return None
+            ordered = sorted(self._values)
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return ordered[idx]
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """Общий breaker на провайдера (один на процесс)."""
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+                recovery_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+            )
+        return _breakers[provider]
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(
+                max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "32")), thread_name_prefix="llm-hedge"
+            )
+        return _hedge_pool
+
+
+class ResilientCaller:
+    """
+    Обертка вызова провайдера: ретраи с экспоненциальной задержкой и джиттером,
+    circuit breaker на провайдера и (опционально) хеджированные запросы —
+    если ответ не пришел за p-й перцентиль латентности, уходит второй запрос,
+    берется первый успешный ответ.
+
+    quota — квота лимитера: берется на каждую попытку и на каждый хедж,
+    чтобы ретраи и дублирующие запросы не превышали RPS/TPM провайдера.
+    Отказ лимитера (LLMUnavailableError) не считается сбоем провайдера.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge_percentile: float = 0.0,
+        hedge_min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.provider = provider
+        self.max_retries = max(1, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or get_breaker(provider)
+        self.latency = LatencyWindow()
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "hedges_fired": 0, "hedges_won": 0}
+
+    @classmethod
+    def from_env(cls, provider: str) -> "ResilientCaller":
+        return cls(
+            provider,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            base_delay=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+            max_delay=float(os.getenv("LLM_BACKOFF_MAX", "8")),
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+        )
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def _hedge_after(self) -> Optional[float]:
+        if not self.hedge_percentile or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def check(self) -> None:
+        """Бросает CircuitOpenError, если breaker сейчас не пропускает запросы."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.provider, "circuit breaker открыт")
+
+    def record(self, ok: bool, elapsed: Optional[float] = None) -> None:
+        if ok:
+            self.breaker.record_success()
+            if elapsed is not None:
+                self.latency.add(elapsed)
+        else:
+            self.breaker.record_failure()
+            self._count("failures")
+
+    # --- sync ---
+
+    def _hedged(self, fn: Callable[[], T], delay: float, quota: Optional[Quota]) -> T:
+        pool = _get_hedge_pool()
+        # Контекст вызывающего (текущий вызов metrics и т.п.) — в поток каждого запроса
+        primary = pool.submit(contextvars.copy_context().run, fn)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        settle_backup: Optional[Settle] = None
+        if quota is not None:
+            try:
+                settle_backup = quota()
+            except LLMUnavailableError:
+                # Квоты на дублирующий запрос нет — ждем основной
+                return primary.result()
+            if primary.done() and primary.exception() is None:
+                settle_backup(None)
+                return primary.result()
+        self._count("hedges_fired")
+        backup = pool.submit(contextvars.copy_context().run, fn)
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    if fut.exception() is None:
+                        if fut is backup:
+                            self._count("hedges_won")
+                        for other in pending:
+                            other.cancel()
+                        result = fut.result()
+                        if settle_backup is not None:
+                            settle_backup(result)
+                            settle_backup = None
+                        return result
+                    error = fut.exception()
+        finally:
+            if settle_backup is not None:
+                settle_backup(None)
+        raise error  # type: ignore[misc]
+
+    def call(self, fn: Callable[[], T], quota: Optional[Quota] = None, admitted: bool = False) -> T:
+        """admitted=True — breaker уже пропустил этот запрос (повтор оборвавшегося потока)."""
+        self._count("calls")
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_retries):
+            # Квота — до breaker'а: отказ лимитера не должен занимать пробный запрос half_open
+            settle = quota() if quota is not None else None
+            try:
+                if not (admitted and attempt == 0):
+                    self.check()
+            except CircuitOpenError:
+                if settle is not None:
+                    settle(None)
+                raise
+            started = time.perf_counter()
+            result = None
+            try:
+                delay = self._hedge_after()
+                result = self._hedged(fn, delay, quota) if delay is not None else fn()
+            except LLMUnavailableError:
+                # Отказ лимитера на хедж или вложенный отказ — не сбой провайдера
+                raise
+            except Exception as e:
+                last_error = e
+                self.record(False)
+                print(f"Ошибка сети LLM (попытка {attempt+1}/{self.max_retries}): {e}")
+                if attempt < self.max_retries - 1:
+                    self._count("retries")
+                    metrics.note_retry()
+                    time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+                continue
+            finally:
+                if settle is not None:
+                    settle(result)
+            self.record(True, time.perf_counter() - started)
+            return result
+        raise LLMUnavailableError(self.provider, str(last_error), attempts=self.max_retries)
+
+    # --- async ---
+
+    async def _ahedged(self, fn: Callable[[], Awaitable[T]], delay: float, quota: Optional[AsyncQuota]) -> T:
+        primary = asyncio.ensure_future(fn())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        settle_backup: Optional[Settle] = None
+        if quota is not None:
+            try:
+                settle_backup = await quota()
+            except LLMUnavailableError:
+                return await primary
+            if primary.done() and primary.exception() is None:
+                settle_backup(None)
+                return primary.result()
+        self._count("hedges_fired")
+        backup = asyncio.ensure_future(fn())
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._count("hedges_won")
+                        for other in pending:
+                            other.cancel()
+                        result = task.result()
+                        if settle_backup is not None:
+                            settle_backup(result)
+                            settle_backup = None
+                        return result
+                    error = task.exception()
+        finally:
+            if settle_backup is not None:
+                settle_backup(None)
+        raise error  # type: ignore[misc]
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], quota: Optional[AsyncQuota] = None,
+                    admitted: bool = False) -> T:
+        self._count("calls")
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_retries):
+            # Квота — до breaker'а: отказ лимитера не должен занимать пробный запрос half_open
+            settle = await quota() if quota is not None else None
+            try:
+                if not (admitted and attempt == 0):
+                    self.check()
+            except CircuitOpenError:
+                if settle is not None:
+                    settle(None)
+                raise
+            started = time.perf_counter()
+            result = None
+            try:
+                delay = self._hedge_after()
+                result = await (self._ahedged(fn, delay, quota) if delay is not None else fn())
+            except LLMUnavailableError:
+                raise
+            except Exception as e:
+                last_error = e
+                self.record(False)
+                print(f"Ошибка сети LLM (попытка {attempt+1}/{self.max_retries}): {e}")
+                if attempt < self.max_retries - 1:
+                    self._count("retries")
+                    metrics.note_retry()
+                    await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+                continue
+            finally:
+                if settle is not None:
+                    settle(result)
+            self.record(True, time.perf_counter() - started)
+            return result
+        raise LLMUnavailableError(self.provider, str(last_error), attempts=self.max_retries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out["breaker"] = self.breaker.stats()
+        p50 = self.latency.percentile(50)
+        out["latency_p50"] = round(p50, 4) if p50 is not None else None
+        out["hedge_after"] = self._hedge_after()
+        return out
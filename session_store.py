@@ -0,0 +1,354 @@
+"""
+Хранилище незавершенных сессий интервью: состояние графа и рабочий лог.
+
+Бэкенд выбирается через SESSION_STORE:
+  - sqlite (по умолчанию) — файл SESSION_STORE_PATH, общий для нескольких
+    локальных процессов: любой воркер может продолжить любую сессию по thread_id;
+  - memory — словарь в памяти процесса (сессия живет, пока жив процесс).
+
+Запись хода оптимистичная: save() принимает версию, от которой считался ход,
+и бросает SessionConflictError, если другой воркер успел записать свой ход раньше.
+
+BoundedMemorySaver — чекпойнтер графа для долгоживущего процесса (ui.py): хранит
+только последний чекпойнтер сессии и выбрасывает простаивающие сессии
+(UI_CHECKPOINT_TTL, UI_CHECKPOINT_MAX_THREADS). Выброшенная сессия поднимается
+из хранилища сессий на следующем ходу.
+
+    python session_store.py list
+    python session_store.py show <thread_id>
+    python session_store.py delete <thread_id>
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+DEFAULT_SESSION_STORE_PATH = os.path.join("outputs", "sessions.sqlite3")
+
+# Поля состояния графа, которые переживают ход. Служебные поля хода
+# (user_input, system_alert, draft_response, stream_tokens) не сохраняются
+SESSION_STATE_KEYS = ("profile", "history", "memory", "turn_count", "is_finished",
+                      "ai_message", "internal_thoughts")
+
+Session = Dict[str, Any]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    thread_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    participant TEXT,
+    state TEXT NOT NULL,
+    log TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at);
+"""
+
+
+class SessionConflictError(RuntimeError):
+    """Сессию успел обновить другой воркер: ход нужно пересчитать от свежего состояния."""
+
+    def __init__(self, thread_id: str, expected: int, actual: int) -> None:
+        super().__init__(f"Сессия {thread_id}: ожидалась версия {expected}, в хранилище {actual}")
+        self.thread_id = thread_id
+        self.expected = expected
+        self.actual = actual
+
+
+def session_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Часть состояния графа, которую нужно сохранить между ходами."""
+    return {key: state[key] for key in SESSION_STATE_KEYS if key in state}
+
+
+class SessionStore(ABC):
+    """
+    Интерфейс бэкенда. version — номер записи сессии: 0 — сессии еще нет,
+    каждый успешный save() увеличивает его на 1.
+    """
+
+    @abstractmethod
+    def load(self, thread_id: str) -> Optional[Session]:
+        """Сессия с версией или None."""
+
+    @abstractmethod
+    def save(self, thread_id: str, state: Dict[str, Any], log: Dict[str, Any], expected_version: int) -> int:
+        """Записывает ход и возвращает новую версию (или бросает SessionConflictError)."""
+
+    @abstractmethod
+    def delete(self, thread_id: str) -> None:
+        """Удаляет сессию (если ее нет — ничего не делает)."""
+
+    @abstractmethod
+    def list_sessions(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Последние сессии: thread_id, version, participant, updated_at."""
+
+    def close(self) -> None:
+        pass
+
+
+_BACKENDS: Dict[str, Callable[[], SessionStore]] = {}
+
+
+def register_session_store(name: str) -> Callable[[Callable[[], SessionStore]], Callable[[], SessionStore]]:
+    def decorator(factory: Callable[[], SessionStore]) -> Callable[[], SessionStore]:
+        _BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Session] = {}
+
+    def load(self, thread_id: str) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(thread_id)
+            # Копия через JSON: вызывающий код не меняет сохраненное состояние
+            return json.loads(json.dumps(session, ensure_ascii=False)) if session else None
+
+    def save(self, thread_id: str, state: Dict[str, Any], log: Dict[str, Any], expected_version: int) -> int:
+        with self._lock:
+            current = self._sessions.get(thread_id)
+            actual = current["version"] if current else 0
+            if actual != expected_version:
+                raise SessionConflictError(thread_id, expected_version, actual)
+            self._sessions[thread_id] = json.loads(json.dumps({
+                "thread_id": thread_id,
+                "version": actual + 1,
+                "state": session_state(state),
+                "log": log,
+                "updated_at": time.time(),
+            }, ensure_ascii=False))
+            return actual + 1
+
+    def delete(self, thread_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(thread_id, None)
+
+    def list_sessions(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = sorted(self._sessions.values(), key=lambda s: s["updated_at"], reverse=True)[:limit]
+        return [{"thread_id": s["thread_id"], "version": s["version"],
+                 "participant": s["log"].get("participant_name"), "updated_at": s["updated_at"]} for s in rows]
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Несколько процессов пишут в один файл: WAL, ожидание блокировки
+    (SESSION_STORE_BUSY_TIMEOUT, мс) и сравнение версии в самом UPDATE —
+    проверка и запись атомарны без отдельной транзакции.
+    """
+
+    def __init__(self, path: str = DEFAULT_SESSION_STORE_PATH, busy_timeout_ms: int = 5000) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout_ms / 1000,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _version(self, thread_id: str) -> int:
+        row = self._conn.execute("SELECT version FROM sessions WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row["version"] if row else 0
+
+    def load(self, thread_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT thread_id, version, state, log, updated_at FROM sessions WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"thread_id": row["thread_id"], "version": row["version"], "state": json.loads(row["state"]),
+                "log": json.loads(row["log"]), "updated_at": row["updated_at"]}
+
+    def save(self, thread_id: str, state: Dict[str, Any], log: Dict[str, Any], expected_version: int) -> int:
+        state_json = json.dumps(session_state(state), ensure_ascii=False)
+        log_json = json.dumps(log, ensure_ascii=False)
+        participant = log.get("participant_name")
+        with self._lock:
+            if expected_version == 0:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO sessions (thread_id, version, participant, state, log, updated_at)"
+                    " VALUES (?, 1, ?, ?, ?, ?)",
+                    (thread_id, participant, state_json, log_json, time.time()),
+                )
+            else:
+                cur = self._conn.execute(
+                    "UPDATE sessions SET version = version + 1, participant = ?, state = ?, log = ?, updated_at = ?"
+                    " WHERE thread_id = ? AND version = ?",
+                    (participant, state_json, log_json, time.time(), thread_id, expected_version),
+                )
+            if cur.rowcount != 1:
+                raise SessionConflictError(thread_id, expected_version, self._version(thread_id))
+        return expected_version + 1
+
+    def delete(self, thread_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE thread_id = ?", (thread_id,))
+
+    def list_sessions(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, version, participant, updated_at FROM sessions ORDER BY updated_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    InMemorySaver, который не растет с длиной интервью и числом вкладок:
+    после записи чекпойнтера старые чекпойнтеры потока, их записи и неиспользуемые
+    версии каналов удаляются; потоки, к которым не обращались ttl секунд или
+    сверх max_threads (самые давние), удаляются целиком.
+    """
+
+    def __init__(self, max_threads: int = 200, ttl: float = 3600.0) -> None:
+        super().__init__()
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # thread_id -> время последнего обращения; порядок = LRU
+        self._used: "OrderedDict[str, float]" = OrderedDict()
+        # (thread_id, checkpoint_ns) -> версии каналов последнего чекпойнтера
+        self._versions: Dict[Any, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_env(cls) -> "BoundedMemorySaver":
+        return cls(
+            max_threads=int(os.getenv("UI_CHECKPOINT_MAX_THREADS", "200")),
+            ttl=float(os.getenv("UI_CHECKPOINT_TTL", "3600")),
+        )
+
+    def has_thread(self, thread_id: str) -> bool:
+        return any(self.storage.get(thread_id, {}).values())
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id not in self.storage:
+            # Базовый get_tuple заводит пустые записи под любой thread_id
+            return None
+        with self._lock:
+            self._mark(thread_id)
+        return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            self._prune(thread_id, checkpoint_ns, checkpoint["id"], checkpoint["channel_versions"])
+            self._mark(thread_id)
+            self._evict(keep=thread_id)
+        return result
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._drop(thread_id)
+
+    def _mark(self, thread_id: str) -> None:
+        self._used[thread_id] = time.time()
+        self._used.move_to_end(thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str, latest: str, versions: Dict[str, Any]) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for checkpoint_id in [c for c in checkpoints if c != latest]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        previous = self._versions.get((thread_id, checkpoint_ns), {})
+        for channel, version in previous.items():
+            if versions.get(channel) != version:
+                self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+        self._versions[(thread_id, checkpoint_ns)] = dict(versions)
+
+    def _drop(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self._used.pop(thread_id, None)
+        for key in [k for k in self._versions if k[0] == thread_id]:
+            del self._versions[key]
+
+    def _evict(self, keep: str) -> None:
+        deadline = time.time() - self.ttl
+        for thread_id, used in list(self._used.items()):
+            over = len(self._used) > self.max_threads
+            if thread_id != keep and (over or used < deadline):
+                self._drop(thread_id)
+            elif not over:
+                # Дальше по LRU только более свежие потоки
+                break
+
+
+@register_session_store("memory")
+def _memory_store() -> SessionStore:
+    return MemorySessionStore()
+
+
+@register_session_store("sqlite")
+def _sqlite_store() -> SessionStore:
+    return SQLiteSessionStore(
+        os.getenv("SESSION_STORE_PATH", DEFAULT_SESSION_STORE_PATH),
+        busy_timeout_ms=int(os.getenv("SESSION_STORE_BUSY_TIMEOUT", "5000")),
+    )
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.getenv("SESSION_STORE", "sqlite").lower()
+                factory = _BACKENDS.get(backend)
+                if factory is None:
+                    raise ValueError(f"Неизвестный SESSION_STORE: {backend}")
+                _store = factory()
+    return _store
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Незавершенные сессии интервью")
+    ap.add_argument("--db", default=os.getenv("SESSION_STORE_PATH", DEFAULT_SESSION_STORE_PATH))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="последние сессии")
+    show = sub.add_parser("show", help="состояние и лог сессии (JSON)")
+    show.add_argument("thread_id")
+    delete = sub.add_parser("delete", help="удалить сессию")
+    delete.add_argument("thread_id")
+    args = ap.parse_args()
+
+    store = SQLiteSessionStore(args.db)
+    if args.cmd == "list":
+        for s in store.list_sessions():
+            updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s["updated_at"]))
+            print(f"{s['thread_id']}  v{s['version']:<4} {updated}  {s['participant'] or ''}")
+    elif args.cmd == "show":
+        session = store.load(args.thread_id)
+        if session is None:
+            raise SystemExit(f"Сессия {args.thread_id} не найдена")
+        print(json.dumps(session, ensure_ascii=False, indent=2))
+    elif args.cmd == "delete":
+        store.delete(args.thread_id)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
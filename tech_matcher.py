@@ -0,0 +1,204 @@
+"""
+Поиск технологий в тексте кандидата за один проход (Aho-Corasick).
+
+Словарь — канонические имена технологий и их написания (алиасы):
+postgresql, постгрес -> postgres. Из всех алиасов строится один автомат,
+поэтому поиск линейный по длине текста и не зависит от размера словаря.
+Совпадение засчитывается только по границам слова: "go" не находится
+в "google", "java" — в "javascript"; из пересекающихся совпадений
+выбирается самое длинное ("spring boot", а не "spring").
+
+Словарь расширяется без правки кода: register_tech() или JSON-файл
+TECH_DICT_PATH вида {"каноническое имя": ["алиас", ...]}.
+"""
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Каноническое имя -> дополнительные написания (само имя — тоже алиас)
+TECH_ALIASES: Dict[str, List[str]] = {
+    "python": ["питон", "питоне", "питона", "пайтон", "python3"],
+    "django": ["джанго", "drf", "django rest framework"],
+    "fastapi": ["fast api"],
+    "flask": ["фласк"],
+    "celery": [],
+    "asyncio": [],
+    "java": ["джава", "джаве", "джавы"],
+    "spring": ["spring boot", "springboot", "спринг"],
+    "hibernate": [],
+    "kotlin": ["котлин"],
+    "maven": [],
+    "gradle": [],
+    "javascript": ["js", "джаваскрипт", "ecmascript"],
+    "typescript": ["ts", "тайпскрипт"],
+    "react": ["reactjs", "react.js", "реакт"],
+    "vue": ["vue.js", "vuejs"],
+    "angular": [],
+    "node": ["node.js", "nodejs", "нода"],
+    "go": ["golang", "голанг"],
+    "rust": ["раст"],
+    "c++": ["cpp"],
+    "c#": ["csharp", "c sharp", ".net", "dotnet"],
+    "php": [],
+    "sql": [],
+    "postgres": ["postgresql", "postgre", "постгрес"],
+    "mysql": [],
+    "mongodb": ["mongo", "монго"],
+    "redis": ["редис"],
+    "docker": ["докер"],
+    "kubernetes": ["k8s", "кубернетес", "кубер"],
+    "git": [],
+    "linux": ["линукс"],
+    "rabbitmq": ["rabbit"],
+    "kafka": ["кафка"],
+}
+
+# Языки: из них собирается роль "<Язык> Developer", если стек указан без роли
+LANGUAGES = ("python", "java", "kotlin", "javascript", "typescript", "go", "rust", "c++", "c#", "php")
+
+# Написание для роли, если capitalize() не подходит
+DISPLAY_NAMES = {"javascript": "JavaScript", "typescript": "TypeScript", "php": "PHP", "c++": "C++", "c#": "C#"}
+
+Match = Tuple[int, int, str]
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """Автомат для набора шаблонов (в нижнем регистре) с полезной нагрузкой."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]]) -> None:
+        # Узел: переходы, ссылка неудачи, совпадения (длина шаблона, нагрузка)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]
+        for pattern, payload in patterns:
+            self._add(pattern, payload)
+        self._link()
+
+    def _add(self, pattern: str, payload: str) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._out[node].append((len(pattern), payload))
+
+    def _link(self) -> None:
+        # Обход в ширину: ссылка неудачи узла — самый длинный собственный суффикс в боре
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child].extend(self._out[self._fail[child]])
+
+    def iter_matches(self, text: str) -> Iterable[Match]:
+        """Все вхождения (start, end, payload), включая пересекающиеся."""
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, payload in out[node]:
+                yield i - length + 1, i + 1, payload
+
+    def find(self, text: str) -> List[Match]:
+        """Совпадения по границам слова, без пересечений (самое левое, затем самое длинное)."""
+        text = text.lower()
+        found = []
+        for start, end, payload in self.iter_matches(text):
+            if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+                continue
+            if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+                continue
+            found.append((start, end, payload))
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        result: List[Match] = []
+        last_end = -1
+        for m in found:
+            if m[0] >= last_end:
+                result.append(m)
+                last_end = m[1]
+        return result
+
+
+_lock = threading.Lock()
+_matcher: Optional[AhoCorasick] = None
+_alias_index: Dict[str, str] = {}
+
+
+def register_tech(canonical: str, *aliases: str) -> None:
+    """Добавляет технологию (или новые алиасы существующей) в словарь."""
+    global _matcher
+    canonical = canonical.strip().lower()
+    with _lock:
+        known = TECH_ALIASES.setdefault(canonical, [])
+        known.extend(a.strip().lower() for a in aliases if a.strip() and a.strip().lower() not in known)
+        _matcher = None
+
+
+def _load_dict_file() -> None:
+    path = os.getenv("TECH_DICT_PATH", "")
+    if not path:
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            extra = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[DEBUG] Словарь технологий {path} не загружен: {e}")
+        return
+    for canonical, aliases in extra.items():
+        register_tech(canonical, *(aliases or []))
+
+
+def get_matcher() -> AhoCorasick:
+    global _matcher, _alias_index
+    if _matcher is None:
+        with _lock:
+            if _matcher is None:
+                index = {}
+                for canonical, aliases in TECH_ALIASES.items():
+                    index[canonical] = canonical
+                    for alias in aliases:
+                        index[alias.lower()] = canonical
+                _alias_index = index
+                _matcher = AhoCorasick(index.items())
+    return _matcher
+
+
+def find_techs(text: str) -> List[str]:
+    """Канонические имена технологий в порядке первого упоминания."""
+    if not text:
+        return []
+    return list(dict.fromkeys(payload for _, _, payload in get_matcher().find(text)))
+
+
+def canonical_tech(name: str) -> str:
+    """Каноническое имя для написания технологии (неизвестное возвращается как есть)."""
+    get_matcher()
+    key = name.strip().lower()
+    return _alias_index.get(key, key)
+
+
+def display_name(canonical: str) -> str:
+    return DISPLAY_NAMES.get(canonical, canonical.capitalize())
+
+
+_load_dict_file()
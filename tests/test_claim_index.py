@@ -0,0 +1,48 @@
+import pytest
+
+from agents.claim_index import ClaimIndex
+
+ALERT = {"alert": True, "content": "ALERT: GIL в 3.12 не убрали, нужно проверить источник."}
+
+
+def test_negated_claim_is_a_miss():
+    index = ClaimIndex()
+    index.add("GIL убрали в Python 3.12", ALERT)
+    assert index.lookup("GIL не убрали в Python 3.12") is None
+    assert index.lookup("в Python 3.12 GIL убрали") == ALERT
+
+
+def test_restricted_claim_is_a_miss():
+    index = ClaimIndex()
+    index.add("JOIN бывает только INNER", ALERT)
+    assert index.lookup("JOIN бывает не только INNER") is None
+
+
+@pytest.mark.parametrize("stored, opposite", [
+    ("В Python строки изменяемые", "В Python строки неизменяемые"),
+    ("asyncio подходит для CPU задач", "asyncio подходит для IO задач"),
+    ("HashMap потокобезопасный", "ConcurrentHashMap потокобезопасный"),
+    ("list изменяемый, а tuple неизменяемый", "list неизменяемый, а tuple изменяемый"),
+    ("GIL убрали в Python 3.12", "GIL убрали в Python 3.13"),
+])
+def test_opposite_claim_is_a_miss(stored, opposite):
+    index = ClaimIndex()
+    index.add(stored, ALERT)
+    assert index.lookup(opposite) is None
+    assert index.lookup(stored) == ALERT
+
+
+def test_inflected_claim_is_a_hit():
+    index = ClaimIndex()
+    index.add("В Python строки изменяемые", ALERT)
+    assert index.lookup("В Python строка изменяемая") == ALERT
+
+
+def test_hits_are_persisted_on_flush(tmp_path):
+    path = str(tmp_path / "claims.sqlite3")
+    index = ClaimIndex(path=path)
+    index.add("GIL убрали в Python 3.12", ALERT)
+    assert index.lookup("GIL убрали в Python 3.12") == ALERT
+    index.flush()
+    assert not index._touched
+    assert ClaimIndex(path=path).lookup("в Python 3.12 GIL убрали") == ALERT
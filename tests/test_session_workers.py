@@ -0,0 +1,62 @@
+import multiprocessing
+import uuid
+
+from benchmarks.session_workers import ANSWERS, INTAKE_TEXT, _spawn
+from session_store import SessionConflictError, SQLiteSessionStore
+
+LATENCY = "fixed:0"
+
+
+def _racer(db, thread_id, name, barrier, out):
+    store = SQLiteSessionStore(db)
+    session = store.load(thread_id)
+    # Оба процесса прочитали одну версию и пишут следующую одновременно
+    barrier.wait(timeout=30)
+    try:
+        version = store.save(thread_id, {"turn_count": 2, "ai_message": name}, session["log"], session["version"])
+    except SessionConflictError:
+        version = None
+    store.close()
+    out.put((name, version))
+
+
+def test_handoff_between_processes(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    db, thread_id = str(tmp_path / "sessions.sqlite3"), str(uuid.uuid4())
+    # Intake делает один процесс, первый ответ — другой, который сессию не начинал
+    first = _spawn(ctx, 1, db, thread_id, LATENCY, max_steps=1)
+    second = _spawn(ctx, 1, db, thread_id, LATENCY, max_steps=1)
+    assert first[0]["pid"] != second[0]["pid"]
+    assert (first[0]["committed"], second[0]["committed"]) == ([1], [2])
+
+    store = SQLiteSessionStore(db)
+    session = store.load(thread_id)
+    store.close()
+    assert session["version"] == 2
+    assert [t["user_message"] for t in session["log"]["turns"]] == ANSWERS[:1]
+    history = session["state"]["history"]
+    assert [m["role"] for m in history] == ["user", "assistant"] * 2
+    assert [m["content"] for m in history if m["role"] == "user"] == [INTAKE_TEXT, ANSWERS[0]]
+
+
+def test_version_race_has_one_winner(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    db, thread_id = str(tmp_path / "sessions.sqlite3"), str(uuid.uuid4())
+    store = SQLiteSessionStore(db)
+    store.save(thread_id, {"turn_count": 1}, {"participant_name": "race", "turns": []}, 0)
+
+    barrier, out = ctx.Barrier(2), ctx.Queue()
+    procs = [ctx.Process(target=_racer, args=(db, thread_id, name, barrier, out)) for name in ("a", "b")]
+    for p in procs:
+        p.start()
+    results = dict(out.get(timeout=60) for _ in procs)
+    for p in procs:
+        p.join(timeout=60)
+
+    winners = [name for name, version in results.items() if version is not None]
+    assert len(winners) == 1
+    assert results[winners[0]] == 2
+    session = store.load(thread_id)
+    store.close()
+    assert session["version"] == 2
+    assert session["state"]["ai_message"] == winners[0]
@@ -1,14 +1,50 @@
 import streamlit as st
 from dotenv import load_dotenv
+import time
 import uuid
 from graph import build_interview_graph
-from agents.reporter import generate_final_feedback
-from logger import start_session, add_turn, set_final_feedback, save_log
+from agents.assessor import submit_turn
+from logger import start_session, add_turn
 from utils import is_stop_command
+from llm import prewarm_from_env
+from report_jobs import REPORT_POLL_INTERVAL, get_report_queue, start_workers_from_env, submit_report
+from session_store import BoundedMemorySaver, SessionConflictError, get_session_store
+import metrics
 
 load_dotenv()
+metrics.serve_from_env()
+prewarm_from_env()
 STUDENT_NAME = "Василенко Егор Викторович"
 
+@st.cache_resource
+def get_interview_graph():
+    """
+    Граф компилируется один раз на процесс и общий для всех вкладок.
+    Состояние каждой сессии живет в чекпойнтере под ее thread_id: только
+    последний чекпойнтер, брошенные вкладки выгружаются по TTL/LRU.
+    """
+    return build_interview_graph(checkpointer=BoundedMemorySaver.from_env())
+
+store = get_session_store()
+# Воркеры отчетов стартуют один раз на процесс (или работают отдельно: report_jobs.py worker)
+start_workers_from_env()
+
+def restore_session(session):
+    """
+    Поднимает интервью из хранилища сессий: его мог вести другой воркер
+    или этот процесс до перезапуска. Граф получит состояние на следующем ходу.
+    """
+    state = session["state"]
+    st.session_state.interview_log = session["log"]
+    st.session_state.profile = state.get("profile", {})
+    st.session_state.messages = list(state.get("history", []))
+    st.session_state.last_ai_message = state.get("ai_message", "")
+    st.session_state.store_version = session["version"]
+    st.session_state.seed_state = state
+    st.session_state.resume_turn = False
+    st.session_state.interview_active = True
+    get_interview_graph().checkpointer.delete_thread(session["thread_id"])
+
 st.set_page_config(page_title="AI Interview Coach", layout="wide")
 st.title("Multi-Agent Interview Coach")
 st.markdown("---")
@@ -18,10 +54,25 @@ st.markdown("<style>.stChatMessage { font-family: 'Inter', sans-serif; }</style>
 if "messages" not in st.session_state: st.session_state.messages = []
 if "interview_log" not in st.session_state: st.session_state.interview_log = None
 if "profile" not in st.session_state: st.session_state.profile = {}
-if "app" not in st.session_state: st.session_state.app = build_interview_graph()
 if "interview_active" not in st.session_state: st.session_state.interview_active = False
-if "thread_id" not in st.session_state: st.session_state.thread_id = str(uuid.uuid4())
 if "last_ai_message" not in st.session_state: st.session_state.last_ai_message = ""
+# Ход упал после того, как сообщение уже попало в чекпойнтер: повтор без входа
+if "resume_turn" not in st.session_state: st.session_state.resume_turn = False
+if "store_version" not in st.session_state: st.session_state.store_version = 0
+if "seed_state" not in st.session_state: st.session_state.seed_state = None
+if "store_notice" not in st.session_state: st.session_state.store_notice = ""
+if "report_job" not in st.session_state: st.session_state.report_job = st.query_params.get("report")
+if "thread_id" not in st.session_state:
+    # thread_id в адресе страницы: после рестарта или на другом воркере сессия продолжается
+    st.session_state.thread_id = st.query_params.get("thread") or str(uuid.uuid4())
+    st.query_params["thread"] = st.session_state.thread_id
+    saved = store.load(st.session_state.thread_id)
+    if saved: restore_session(saved)
+
+# Сообщение с прошлого прогона (сессию обновили в другой вкладке)
+if st.session_state.store_notice:
+    st.warning(st.session_state.store_notice)
+    st.session_state.store_notice = ""
 
 with st.sidebar:
     st.header("Настройки интервью")
@@ -38,6 +89,10 @@ with st.sidebar:
         
         if start_btn and candidate_info:
             st.session_state.interview_log = start_session(STUDENT_NAME)
+            st.session_state.store_version = 0
+            st.session_state.seed_state = None
+            st.session_state.report_job = None
+            st.query_params.pop("report", None)
             
             # ВАЖНО: Пустой профиль запустит Intake Agent в графе
             st.session_state.profile = {} 
@@ -61,6 +116,25 @@ for idx, msg in enumerate(st.session_state.messages):
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
+if st.session_state.report_job and not st.session_state.interview_active:
+    # Задача отчета переживает перезагрузку страницы: id задачи хранится в адресе
+    job = get_report_queue().get(st.session_state.report_job)
+    if job is None:
+        st.error("Задача отчета не найдена")
+    elif job["status"] in ("done", "failed"):
+        with st.chat_message("assistant"):
+            if job["final_feedback"]:
+                st.markdown(job["final_feedback"])
+            if job["error"]:
+                st.error(f"Ошибка: {job['error']}")
+            if job["path"]:
+                st.success(f"Лог: {job['path']}")
+    else:
+        attempt = f" (попытка {job['attempts']}/{job['max_attempts']})" if job["attempts"] > 1 else ""
+        st.info(f"Генерация отчета...{attempt}")
+        time.sleep(REPORT_POLL_INTERVAL)
+        st.rerun()
+
 if st.session_state.interview_active:
     last_role = st.session_state.messages[-1]["role"]
     
@@ -69,51 +143,91 @@ if st.session_state.interview_active:
 
         if is_stop_command(last_user_msg):
             st.session_state.interview_active = False
-            with st.spinner("Генерация отчета..."):
-                log = st.session_state.interview_log
-                rep = generate_final_feedback(log)
-                set_final_feedback(log, rep)
-                path = save_log(log)
-                with st.chat_message("assistant"):
-                    st.markdown(rep)
-                    st.success(f"Лог: {path}")
-                st.session_state.messages.append({"role": "assistant", "content": rep})
-                st.stop()
-
-        with st.spinner("Агент думает..."):
-            try:
-                config = {"configurable": {"thread_id": st.session_state.thread_id}}
-                inputs = {
-                    "messages": st.session_state.messages,
-                    "user_input": last_user_msg,
-                    "profile": st.session_state.profile,
-                    "history": st.session_state.messages
-                }
-                
-                final_txt = ""
-                thoughts = []
-                
-                for event in st.session_state.app.stream(inputs, config=config, stream_mode="updates"):
+            # Отчет строит воркер очереди: страница сразу получает id задачи и опрашивает статус
+            job_id = submit_report(st.session_state.interview_log, st.session_state.thread_id)
+            # Лог уже в очереди, состояние графа и незавершенная сессия больше не нужны
+            get_interview_graph().checkpointer.delete_thread(st.session_state.thread_id)
+            store.delete(st.session_state.thread_id)
+            st.session_state.report_job = job_id
+            st.query_params["report"] = job_id
+            st.rerun()
+
+        try:
+            app = get_interview_graph()
+            config = {"configurable": {"thread_id": st.session_state.thread_id}}
+            # История и профиль уже в чекпойнтере: передаем только новое сообщение
+            new_msg = {"role": "user", "content": last_user_msg}
+            seed = st.session_state.seed_state
+            if not seed and st.session_state.store_version and not app.checkpointer.has_thread(st.session_state.thread_id):
+                # Поток выгружен из чекпойнтера (простой вкладки): состояние — из хранилища сессий
+                saved = store.load(st.session_state.thread_id)
+                seed = saved["state"] if saved else None
+                st.session_state.resume_turn = False
+            if st.session_state.resume_turn:
+                inputs = None
+            elif seed:
+                # Первый ход после восстановления: чекпойнтер этого процесса пуст
+                inputs = {**seed, "user_input": last_user_msg,
+                          "history": seed.get("history", []) + [new_msg], "stream_tokens": True}
+            else:
+                inputs = {"user_input": last_user_msg, "history": [new_msg], "stream_tokens": True}
+            st.session_state.resume_turn = True
+            st.session_state.seed_state = None
+            
+            turn = {"final_txt": "", "thoughts": []}
+
+            def token_stream():
+                # Текст интервьюера приходит custom-событиями, пока узел еще генерирует
+                for mode, event in app.stream(
+                    inputs, config=config, stream_mode=["updates", "custom"]
+                ):
+                    if mode == "custom":
+                        delta = event.get("interviewer_delta")
+                        if delta:
+                            yield delta
+                        continue
+
                     # Intake обновит профиль
                     if "intake" in event:
                         st.session_state.profile = event["intake"].get("profile", st.session_state.profile)
 
                     if "interviewer" in event:
                         data = event["interviewer"]
-                        final_txt = data.get("ai_message", "")
-                        if "internal_thoughts" in data: thoughts.extend(data["internal_thoughts"])
-
-                if final_txt:
-                    if st.session_state.interview_log and len(st.session_state.messages) > 1:
-                        q = st.session_state.last_ai_message or "Start"
-                        add_turn(st.session_state.interview_log, last_user_msg, thoughts, q)
-                    
-                    st.session_state.last_ai_message = final_txt
-                    st.session_state.messages.append({"role": "assistant", "content": final_txt})
-                    st.rerun()
-                    
-            except Exception as e:
-                st.error(f"Ошибка: {e}")
+                        turn["final_txt"] = data.get("ai_message", "")
+                        if "internal_thoughts" in data: turn["thoughts"].extend(data["internal_thoughts"])
+
+            with st.chat_message("assistant"):
+                st.write_stream(token_stream())
+
+            st.session_state.resume_turn = False
+            final_txt = turn["final_txt"]
+            thoughts = turn["thoughts"]
+
+            if final_txt:
+                if st.session_state.interview_log and len(st.session_state.messages) > 1:
+                    q = st.session_state.last_ai_message or "Start"
+                    add_turn(st.session_state.interview_log, last_user_msg, thoughts, q)
+                    submit_turn(st.session_state.interview_log, st.session_state.profile, st.session_state.thread_id)
+                
+                st.session_state.last_ai_message = final_txt
+                st.session_state.messages.append({"role": "assistant", "content": final_txt})
+
+                # Мысли уже в логе, в хранилище — только состояние для следующего хода
+                values = {**app.get_state(config).values, "internal_thoughts": []}
+                try:
+                    st.session_state.store_version = store.save(
+                        st.session_state.thread_id, values, st.session_state.interview_log,
+                        st.session_state.store_version
+                    )
+                except SessionConflictError:
+                    # Ход успел записать другой воркер: показываем его версию
+                    st.session_state.store_notice = "Сессию обновили в другой вкладке — показано ее последнее состояние."
+                    saved = store.load(st.session_state.thread_id)
+                    if saved: restore_session(saved)
+                st.rerun()
+                
+        except Exception as e:
+            st.error(f"Ошибка: {e}")
     else:
         if user_text := st.chat_input("Ваш ответ..."):
             st.session_state.messages.append({"role": "user", "content": user_text})
@@ -3,14 +3,10 @@ import re
 import string
 from typing import Any, Dict, List, Optional
 
-# Расширенный список для поиска по ключевым словам (если LLM не отдала стек явно)
-ALLOWED_STACK = {
-    "python", "django", "fastapi", "flask",
-    "java", "spring", "hibernate", "kotlin", "maven", "gradle",
-    "javascript", "typescript", "react", "vue", "node",
-    "sql", "postgres", "postgresql", "mysql", "mongodb",
-    "redis", "docker", "kubernetes", "git", "linux", "celery", "rabbitmq", "kafka"
-}
+from tech_matcher import TECH_ALIASES, canonical_tech, find_techs
+
+# Канонические имена технологий словаря (поиск по тексту — tech_matcher.find_techs)
+ALLOWED_STACK = set(TECH_ALIASES)
 
 # Триггеры для завершения интервью
 STOP_WORDS = {
@@ -72,15 +68,10 @@ def normalize_stack(stack: Any, raw_text: str) -> List[str]:
         items.extend([p.strip() for p in parts if p.strip()])
 
     if not items:
-        low = raw_text.lower()
-        for t in ALLOWED_STACK:
-            if t in low:
-                items.append(t)
+        items = find_techs(raw_text)
 
-    out: List[str] = []
-    for s in items:
-        s = s.replace("postgresql", "postgres")
-        out.append(s)
+    # Алиасы к каноническому имени: postgresql -> postgres, golang -> go
+    out = [canonical_tech(s) for s in items]
 
     return sorted(list(dict.fromkeys(out)))
 
@@ -129,4 +120,13 @@ def normalize_input_to_text(raw: str, obj: Optional[Dict[str, Any]]) -> str:
         f"Опыт: {str(experience).strip()}" if experience else "",
     ]
     text = " | ".join([p for p in parts if p]).strip()
-    return text if text else raw.strip()
\ No newline at end of file
+    return text if text else raw.strip()
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка числа токенов без токенизатора провайдера
+    (~3 символа на токен для смеси кириллицы и латиницы).
+    """
+    if not text:
+        return 0
+    return (len(text) + 2) // 3